@@ -0,0 +1,23 @@
+import os
+import sys
+import json
+import argparse
+from benchmarks import harness
+from benchmarks import pipeline, storage, mapview
+
+parser = argparse.ArgumentParser(prog = 'python -m benchmarks', description = 'Ground station performance benchmarks')
+parser.add_argument('-k', '--filter', default = '', help = 'only run benchmarks whose name contains this')
+parser.add_argument('-o', '--output', default = None, help = 'JSON file for the results (default benchmarks/results/<commit>.json)')
+parser.add_argument('--compare', default = None, help = 'earlier results JSON to compare against')
+parser.add_argument('--threshold', type = float, default = 0.2, help = 'relative change counted as a regression')
+args = parser.parse_args()
+
+report = harness.run(args.filter)
+output = args.output or os.path.join(harness.ROOT, 'benchmarks', 'results', (report['meta']['commit'][:10] or 'local') + '.json')
+harness.save(report, output)
+print('saved ' + output)
+if args.compare:
+    with open(args.compare) as file:
+        regressions = harness.compare(json.load(file), report, args.threshold)
+    if regressions:
+        sys.exit(1)
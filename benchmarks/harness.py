@@ -0,0 +1,168 @@
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import threading
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path: sys.path.insert(0, ROOT)
+
+registry = [] # (name, function) in definition order
+
+# benchmark can not run in this environment
+class Skip(Exception):
+    pass
+
+# register a benchmark, it returns a dict of metrics
+# metrics ending in _per_s are better when higher, everything else when lower
+def benchmark(fn):
+    registry.append((fn.__name__, fn))
+    return fn
+
+# p50/p90/p99/max of a list of seconds, in milliseconds
+def percentiles(samples, prefix):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+    return {prefix + '_p50_ms': pick(0.5), prefix + '_p90_ms': pick(0.9), prefix + '_p99_ms': pick(0.99),
+        prefix + '_max_ms': samples[-1] * 1000}
+
+# serial port stand-in fed line by line from the benchmark
+class FeedPort:
+    def __init__(self, timeout = 0.5):
+        self.timeout = timeout
+        self.buf = bytearray()
+        self.cond = threading.Condition()
+        self.cancelled = False
+        self.written = bytearray()
+    # queue bytes for the reader
+    def feed(self, data):
+        with self.cond:
+            self.buf += data
+            self.cond.notify_all()
+    @property
+    def in_waiting(self):
+        return len(self.buf)
+    def read(self, size = 1):
+        with self.cond:
+            self.cond.wait_for(lambda: self.buf or self.cancelled, self.timeout)
+            self.cancelled = False
+            data = bytes(self.buf[:size])
+            del self.buf[:size]
+            return data
+    def write(self, data):
+        self.written += data
+        return len(data)
+    def cancel_read(self):
+        with self.cond:
+            self.cancelled = True
+            self.cond.notify_all()
+    def close(self):
+        pass
+
+# +RCV= lines for a whole session: SYN, ACK, then n telemetry frames moving north
+def session(n, address = 102):
+    payloads = ['0 0 SYN', '1 1 ACK']
+    for k in range(n):
+        payloads.append(str(k + 1) + ' ' + str(k + 2) + ' ACK DRIVING 1.0 2.0 0.0 ' + str(28.6 + k * 1e-5) + ' -81.2 12.0')
+    return [('+RCV=' + str(address) + ',' + str(len(p)) + ',' + p + ',-40,9\r\n').encode('Ascii') for p in payloads]
+
+state = {}
+
+# offscreen QApplication and a ground station Window in a scratch directory, shared by all benchmarks
+def window():
+    if 'window' in state:
+        return state['app'], state['window']
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    try:
+        from PyQt5 import QtWidgets
+        import gui
+    except ImportError as e:
+        raise Skip('GUI stack unavailable: ' + str(e))
+    state['app'] = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    state['cwd'] = os.getcwd()
+    os.chdir(tempfile.mkdtemp(prefix = 'gs-bench-'))
+    state['window'] = gui.Window()
+    return state['app'], state['window']
+
+# close anything window() opened
+def cleanup():
+    if 'window' in state:
+        state['window'].station.shutdown()
+        state['window'].tileServer.stop()
+        state['window'].portMonitor.stop()
+        os.chdir(state['cwd'])
+
+# spin the Qt event loop, if there is one, until done() or timeout
+def waitFor(app, done, timeout = 30):
+    deadline = time.perf_counter() + timeout
+    while not done():
+        if time.perf_counter() > deadline:
+            raise TimeoutError('benchmark did not finish in ' + str(timeout) + ' s')
+        if app: app.processEvents()
+        time.sleep(0.0005)
+
+# headless ground station logging to a scratch directory
+def station():
+    from core import Station
+    return Station(os.path.join(tempfile.mkdtemp(prefix = 'gs-bench-'), 'telemetry.bin'))
+
+# put a station back to LISTEN with no rover sessions
+def resetStation(s):
+    s.link.reset()
+    s.sessions = {}
+    s.ready.clear()
+    s.rxCount = 0
+    s.connectionState = 'LISTEN'
+
+# environment the numbers were taken in
+def metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd = ROOT, capture_output = True, text = True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'commit': commit, 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+        'platform': platform.platform(), 'machine': platform.machine()}
+
+# run registered benchmarks whose name contains pattern
+def run(pattern = ''):
+    results = {}
+    try:
+        for name, fn in registry:
+            if pattern not in name:
+                continue
+            print(name + ' ...', end = ' ', flush = True)
+            try:
+                results[name] = fn()
+                print(', '.join(k + '=' + format(v, '.4g') for k, v in results[name].items()))
+            except Skip as e:
+                results[name] = {'skipped': str(e)}
+                print('skipped: ' + str(e))
+    finally:
+        cleanup()
+    return {'meta': metadata(), 'results': results}
+
+# save results as JSON
+def save(report, path):
+    if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok = True)
+    with open(path, 'w') as file:
+        json.dump(report, file, indent = 2)
+
+# print changes against an older report, returns the regressions beyond threshold
+def compare(old, new, threshold = 0.2):
+    regressions = []
+    for name, metrics in new['results'].items():
+        before = old['results'].get(name, {})
+        for metric, value in metrics.items():
+            if not isinstance(value, (int, float)) or not isinstance(before.get(metric), (int, float)) or not before[metric]:
+                continue
+            ratio = value / before[metric]
+            worse = ratio < 1 - threshold if metric.endswith('_per_s') else ratio > 1 + threshold
+            print(('REGRESSION ' if worse else '           ') + name + '.' + metric + ': ' + format(before[metric], '.4g') + \
+                ' -> ' + format(value, '.4g') + ' (' + format(ratio, '.2f') + 'x)')
+            if worse: regressions.append(name + '.' + metric)
+    return regressions
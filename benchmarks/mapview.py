@@ -0,0 +1,122 @@
+import time
+import random
+from math import cos, sin
+from core import geofence
+from benchmarks.harness import benchmark, percentiles, window, waitFor, Skip
+
+# rover fixes wandering north-east from the start
+def wander(n, seed = 1):
+    rng = random.Random(seed)
+    lat, long, heading = 28.6024, -81.2001, 0.0
+    points = []
+    for i in range(n):
+        heading += rng.gauss(0, 0.05)
+        lat += 1e-5 * cos(heading)
+        long += 1e-5 * sin(heading)
+        points.append([lat, long])
+    return points
+
+# online decimation and a zoom change on a long track
+@benchmark
+def trackDecimation(n = 20000):
+    try:
+        from gui import Track
+    except ImportError as e:
+        raise Skip('GUI stack unavailable: ' + str(e))
+    track = Track()
+    points = wander(n)
+    start = time.perf_counter()
+    for p in points:
+        track.add(p)
+    added = time.perf_counter() - start
+    start = time.perf_counter()
+    track.setZoom(16)
+    return {'add_us': added / n * 1e6, 'zoom_ms': (time.perf_counter() - start) * 1000, 'vertices': len(track.shown)}
+
+# updateGPS on the Python side and until QtWebEngine has run the javascript
+@benchmark
+def mapUpdate(frames = 200, perFrame = 5):
+    app, w = window()
+    points = wander(frames * perFrame + 1)
+    w.trackBuf.append((102, points[0], False))
+    w.updateGPS()
+    python, total = [], []
+    for f in range(frames):
+        for p in points[1 + f * perFrame:1 + (f + 1) * perFrame]:
+            w.trackBuf.append((102, p, True))
+        done = []
+        start = time.perf_counter()
+        w.updateGPS()
+        python.append(time.perf_counter() - start)
+        w.mapWidget.page.runJavaScript('1', lambda r: done.append(time.perf_counter())) # runs after updateGPS's script
+        waitFor(app, lambda: done)
+        total.append(done[0] - start)
+    result = percentiles(python, 'python')
+    result.update(percentiles(total, 'rendered'))
+    return result
+
+# Window construction with the map built up front and with the map deferred until after the first paint
+@benchmark
+def windowStartup(runs = 5):
+    app, w = window()
+    import gui
+    result = {}
+    for name, lazy in [('eager', False), ('lazy', True)]:
+        samples = []
+        for i in range(runs):
+            start = time.perf_counter()
+            w = gui.Window(lazy = lazy)
+            samples.append(time.perf_counter() - start)
+            w.createMap() # what the lazy window does after its first paint
+            app.processEvents()
+            w.station.shutdown()
+            w.tileServer.stop()
+            w.portMonitor.stop()
+        result.update(percentiles(samples, name))
+    return result
+
+# geofence check per fix against a site boundary and hundreds of keep-out zones
+@benchmark
+def geofenceCheck(zones = 500, fixes = 20000):
+    rng = random.Random(1)
+    fences = [geofence.Fence('site', 'boundary', [[(28.59, -81.21), (28.59, -81.19), (28.61, -81.19), (28.61, -81.21)]], None)]
+    for i in range(zones):
+        lat, long, r = 28.59 + rng.random() * 0.02, -81.21 + rng.random() * 0.02, 0.0001 + rng.random() * 0.0002
+        fences.append(geofence.Fence(str(i), 'keepout', [[(lat - r, long - r), (lat - r, long + r), (lat + r, long + r), (lat, long - r)]], None))
+    start = time.perf_counter()
+    index = geofence.Geofence(fences)
+    built = time.perf_counter() - start
+    samples = []
+    for lat, long in wander(fixes):
+        start = time.perf_counter()
+        index.check([lat - 0.0124, long + 0.0101])
+        samples.append(time.perf_counter() - start)
+    result = percentiles(samples, 'check')
+    result['build_ms'] = built * 1000
+    return result
+
+# Communication tab plot with a full ring, thinned to the plot width each frame against drawing every sample
+@benchmark
+def plotRedraw(samples = 20000, frames = 50):
+    app, w = window()
+    from PyQt5 import QtWidgets
+    now = time.monotonic()
+    w.history.extend(102, 'RSSI', [now - (samples - i) * 0.1 for i in range(samples)], [-40 - (i * 7919 % 60) for i in range(samples)])
+    w.rover = '102'
+    w.seriesList.setCurrentText('RSSI')
+    w.spanList.setCurrentText('All')
+    w.findChild(QtWidgets.QTabWidget).setCurrentIndex(1)
+    w.show()
+    app.processEvents()
+    result = {}
+    for name, draw in [('thinned', w.drawPlot), ('full', lambda: w.curve.setData(*w.history.window(102, 'RSSI')))]:
+        times = []
+        for i in range(frames):
+            start = time.perf_counter()
+            draw()
+            w.plot.repaint()
+            times.append(time.perf_counter() - start)
+        result.update(percentiles(times, name))
+    result['points'] = len(w.history.window(102, 'RSSI', None, max(100, w.plot.width()))[0]) # what a thinned frame draws
+    w.hide()
+    return result
@@ -0,0 +1,237 @@
+import time
+import threading
+from core.link import Link
+from core import linkstats, metrics
+from benchmarks.harness import benchmark, percentiles, window, waitFor, station, resetStation, session, FeedPort
+
+# bytes -> LoraMessage through the reader's framing
+@benchmark
+def parseThroughput(n = 20000):
+    link = Link()
+    port = FeedPort(timeout = 0.01)
+    data = b''.join(session(n))
+    start = time.perf_counter()
+    port.feed(data)
+    link.open(port)
+    while link.readBuf.qsize() < n + 2:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    link.close()
+    return {'lines_per_s': (n + 2) / elapsed, 'mb_per_s': len(data) / elapsed / 1e6}
+
+# text frames through the compact codec and back, and the payload bytes it saves on air
+@benchmark
+def payloadCodec(n = 5000):
+    from core import codec
+    telemetry = ['12 13 ACK DRIVING 1.25 -2.5 0.0 ' + str(28.6 + k * 1e-5) + ' -81.2001 12.0' for k in range(n)]
+    commands = ['40 41 CMD MAN1 1.5 -3.25 0.0 True False True False False', '40 41 CMD BD 28.6024 -81.2001',
+        '40 41 CMD MAN2 0.5 0.0 0.25 0.0']
+    start = time.perf_counter()
+    packed = [codec.encode(t) for t in telemetry]
+    encoded = time.perf_counter() - start
+    start = time.perf_counter()
+    for p in packed:
+        codec.fields(p)
+    decoded = time.perf_counter() - start
+    return {'encode_per_s': n / encoded, 'decode_per_s': n / decoded,
+        'telemetry_size_ratio': sum(map(len, packed)) / sum(map(len, telemetry)),
+        'command_size_ratio': sum(len(codec.encode(c)) for c in commands) / sum(map(len, commands))}
+
+# LoraMessage -> seq/ack handling and logging in the headless connection state machine
+@benchmark
+def stateMachine(n = 5000):
+    s = station()
+    resetStation(s)
+    s.connected = True
+    for line in session(n):
+        s.link.frame(line.decode('Ascii').rstrip('\r\n'))
+    connection = threading.Thread(target = s.connection, args = [None], daemon = True)
+    start = time.perf_counter()
+    connection.start()
+    while s.rxCount < n + 2:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    s.connected = False
+    connection.join()
+    s.shutdown()
+    return {'transitions_per_s': (n + 2) / elapsed}
+
+# the same with a fleet of rovers interleaved on one radio, routed by address to their sessions
+@benchmark
+def fleetStateMachine(n = 500, rovers = 16):
+    s = station()
+    resetStation(s)
+    s.connected = True
+    for lines in zip(*[session(n, 102 + r) for r in range(rovers)]):
+        for line in lines:
+            s.link.frame(line.decode('Ascii').rstrip('\r\n'))
+    total = (n + 2) * rovers
+    connection = threading.Thread(target = s.connection, args = [None], daemon = True)
+    start = time.perf_counter()
+    connection.start()
+    while s.rxCount < total:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    s.connected = False
+    connection.join()
+    s.shutdown()
+    return {'transitions_per_s': total / elapsed, 'sessions': len(s.sessions)}
+
+# commands delivered to a simulated rover over a 20 ms airtime link, stop-and-wait against a sliding window
+@benchmark
+def commandWindow(n = 30):
+    from core import simulator
+    result = {}
+    for window in [1, 4]:
+        sim = simulator.Simulator(airtime = 0.02, delay = 0.01, window = window, seed = 1)
+        s = station()
+        s.settings['window'] = str(window)
+        s.openSerial(sim.start(), False)
+        waitFor(None, lambda: s.session(102) and s.session(102).connectionState == 'ESTABLISHED')
+        start = time.perf_counter()
+        for i in range(n): # MAN1 goals, a newer MAN2 or BD would replace the ones still queued
+            s.createTx(str(i) + ' 0 0 False False False False False', 2)
+        waitFor(None, lambda: len(sim.rover.commands) >= n)
+        result['window' + str(window) + '_commands_per_s'] = n / (time.perf_counter() - start)
+        s.shutdown()
+        sim.stop()
+    return result
+
+# link statistics per message on the connection thread, and a summary over the sliding window and the whole session
+@benchmark
+def linkStats(n = 100000):
+    quality = linkstats.LinkStats()
+    start = time.perf_counter()
+    for i in range(n):
+        now = i * 0.05
+        quality.sent(now)
+        quality.received(now, -40 - i % 60, 5 + i % 8)
+        quality.delivered(now, 1)
+        quality.roundTrip(now, 0.05 + (i % 100) * 0.001)
+    added = time.perf_counter() - start
+    samples = []
+    for span in [60, 600, None]:
+        start = time.perf_counter()
+        quality.summary(n * 0.05, span)
+        samples.append(time.perf_counter() - start)
+    return {'message_us': added / n * 1e6, 'minute_ms': samples[0] * 1000, 'window_ms': samples[1] * 1000,
+        'session_ms': samples[2] * 1000}
+
+# cost of counting into the metrics registry, and of a scrape and a snapshot of everything registered
+@benchmark
+def metricsRegistry(n = 200000):
+    registry = metrics.Registry()
+    count = registry.counter('bench_total', 'benchmark counter', ['kind'])
+    latency = registry.histogram('bench_seconds', 'benchmark histogram', metrics.exponential(1e-6, 2, 14))
+    start = time.perf_counter()
+    for i in range(n):
+        count.inc(1, 'a')
+    counted = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(n):
+        latency.observe(i * 1e-9)
+    observed = time.perf_counter() - start
+    s = station() # registers its queue gauges
+    start = time.perf_counter()
+    text = metrics.REGISTRY.text()
+    scraped = time.perf_counter() - start
+    start = time.perf_counter()
+    metrics.REGISTRY.snapshot()
+    snapshot = time.perf_counter() - start
+    s.shutdown()
+    return {'inc_us': counted / n * 1e6, 'observe_us': observed / n * 1e6, 'scrape_ms': scraped * 1000,
+        'snapshot_ms': snapshot * 1000, 'scrape_bytes': len(text)}
+
+# AT commands to the simulated modem: how long open() holds the caller, until LoRa answered, and a pipelined LoRa Info
+@benchmark
+def atCommands(runs = 20):
+    from core import simulator
+    sim = simulator.Simulator(seed = 1)
+    port = sim.start()
+    s = station()
+    info = []
+    s.listen(lambda event, *args: info.append(time.perf_counter()) if event == 'lora' and args[0] == 'LoRa Info' else None)
+    opened, ready, answered = [], [], []
+    for r in range(runs):
+        start = time.perf_counter()
+        future = s.openSerial(port, False)
+        opened.append(time.perf_counter() - start)
+        future.result()
+        ready.append(time.perf_counter() - start)
+        info.clear()
+        start = time.perf_counter()
+        s.loraTest()
+        waitFor(None, lambda: info)
+        answered.append(info[0] - start)
+        s.stop()
+    s.shutdown()
+    sim.stop()
+    result = percentiles(opened, 'open')
+    result.update(percentiles(ready, 'ready'))
+    result.update(percentiles(answered, 'info'))
+    return result
+
+# time until a shutdown queued behind a backlog of drive commands reaches a stop-and-wait rover
+@benchmark
+def safetyLatency(backlog = 20, runs = 5):
+    from core import simulator
+    sim = simulator.Simulator(airtime = 0.02, delay = 0.01, seed = 1)
+    s = station()
+    s.openSerial(sim.start(), False)
+    waitFor(None, lambda: s.session(102) and s.session(102).connectionState == 'ESTABLISHED')
+    samples = []
+    for r in range(runs):
+        for i in range(backlog):
+            s.createTx(str(i) + ' 0 0 False False False False False', 2)
+        start = time.perf_counter()
+        s.createTx('0 0 0 False False True False False', 2)
+        waitFor(None, lambda: any('True' in c for c in sim.rover.commands))
+        samples.append(time.perf_counter() - start)
+        sim.rover.commands = []
+    result = percentiles(samples, 'safety')
+    result['dropped'] = s.session(102).commandBuf.dropped
+    s.shutdown()
+    sim.stop()
+    return result
+
+# time from a +RCV= line reaching the serial port to the javascript that moves the rover marker
+@benchmark
+def endToEndLatency(n = 300, rate = 50):
+    app, w = window()
+    s = w.station
+    port = FeedPort(timeout = 0.01)
+    resetStation(s)
+    w.bus.clear()
+    w.trackBuf.clear()
+    sent = {} # latitude -> time its line was fed
+    seen = []
+    run = w.map.runJavaScript
+    def spy(js):
+        if 102 in w.rovers and w.rovers[102].marker.jsName + '.setLatLng' in js:
+            now = time.perf_counter()
+            lat = w.rovers[102].coordinate[0]
+            for key in [k for k in sent if k <= lat]:
+                seen.append(now - sent.pop(key))
+        run(js)
+    w.map.runJavaScript = spy
+    s.connected = True
+    s.link.open(port)
+    connection = threading.Thread(target = s.connection, args = [port], daemon = True)
+    connection.start()
+    lines = session(n)
+    try:
+        for i, line in enumerate(lines):
+            if i >= 2:
+                sent[28.6 + (i - 2) * 1e-5] = time.perf_counter()
+            port.feed(line)
+            deadline = time.perf_counter() + 1 / rate
+            while time.perf_counter() < deadline:
+                app.processEvents()
+                time.sleep(0.0005)
+        waitFor(app, lambda: not sent, 10)
+    finally:
+        s.connected = False
+        connection.join()
+        s.link.close()
+        w.map.runJavaScript = run
+    return percentiles(seen, 'latency')
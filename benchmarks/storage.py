@@ -0,0 +1,82 @@
+import os
+import time
+import tempfile
+from core import recorder, analytics
+from benchmarks.harness import benchmark, Skip
+
+# records queued and flushed to disk by the telemetry recorder
+@benchmark
+def recorderThroughput(n = 50000):
+    directory = tempfile.mkdtemp(prefix = 'gs-bench-')
+    path = os.path.join(directory, 'telemetry.bin')
+    payload = '12 13 ACK DRIVING 1.0 2.0 0.0 28.6024 -81.2001 12.0'
+    log = recorder.Recorder(path)
+    start = time.perf_counter()
+    for i in range(n):
+        log.record(recorder.RX, 102, payload, -40, 9)
+    queued = time.perf_counter() - start
+    log.close()
+    elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    count = sum(1 for r in recorder.read(path))
+    scanned = time.perf_counter() - start
+    return {'record_us': queued / n * 1e6, 'records_per_s': n / elapsed, 'read_per_s': count / scanned}
+
+# time-range slice of a large recording through the sparse index
+@benchmark
+def recorderSlice(n = 200000):
+    directory = tempfile.mkdtemp(prefix = 'gs-bench-')
+    path = os.path.join(directory, 'telemetry.bin')
+    log = recorder.Recorder(path)
+    middle = 0
+    for i in range(n):
+        log.record(recorder.RX, 102, '1 2 ACK', -40, 9)
+        if i == n // 2: middle = log.clock.now()
+    log.close()
+    start = time.perf_counter()
+    count = sum(1 for r in recorder.read(path, middle, middle + 10 ** 7))
+    return {'slice_ms': (time.perf_counter() - start) * 1000, 'slice_records': count}
+
+# track statistics per fix as telemetry arrives, and over a whole recorded track at once with numpy
+@benchmark
+def trackAnalytics(n = 1000000, live = 100000):
+    directory = tempfile.mkdtemp(prefix = 'gs-bench-')
+    path = os.path.join(directory, 'telemetry.bin')
+    log = recorder.Recorder(path)
+    lat, long = 28.6024, -81.2001
+    for i in range(n):
+        log.record(recorder.RX, 102, '1 2 ACK DRIVING 1.0 2.0 0.0 ' + str(round(lat + i * 1e-6, 7)) + ' ' + str(long) + ' 12.0', -40, 9)
+    log.close()
+    track = analytics.TrackStats()
+    start = time.perf_counter()
+    for i in range(live):
+        track.add(i * 0.1, [lat + i * 1e-6, long], 12.0)
+    added = time.perf_counter() - start
+    try:
+        start = time.perf_counter()
+        fixes = analytics.load(path, 102)
+        loaded = time.perf_counter() - start
+        result = analytics.batch(*fixes)
+    except ImportError as e:
+        raise Skip(str(e))
+    batched = time.perf_counter() - start - loaded
+    return {'add_us': added / live * 1e6, 'load_ms': loaded * 1000, 'batch_ms': batched * 1000, 'fixes': len(result['length'])}
+
+# telemetry samples into a full ring and the min/max thinned window a plot frame reads
+@benchmark
+def telemetrySeries(n = 200000, width = 1000):
+    try:
+        from core import series
+    except ImportError as e:
+        raise Skip(str(e))
+    store = series.Store()
+    start = time.perf_counter()
+    for i in range(n):
+        store.append(102, 'RSSI', i * 0.1, -40 - i % 60)
+    added = time.perf_counter() - start
+    samples = []
+    for i in range(20):
+        start = time.perf_counter()
+        t, v = store.window(102, 'RSSI', None, width)
+        samples.append(time.perf_counter() - start)
+    return {'append_us': added / n * 1e6, 'window_ms': min(samples) * 1000, 'points': len(t), 'bytes': store.nbytes()}
@@ -0,0 +1,3 @@
+# Qt-free ground station: LoRa link, connection state machines, command queues and telemetry log
+from core.link import Link, LoraMessage, SendDone
+from core.station import Session, Station
@@ -0,0 +1,167 @@
+import sys
+import time
+import argparse
+import threading
+from core import airtime, geofence, linkstats, metrics
+from core.station import Station, DEFAULTS
+
+HELP = '''commands:
+  bd LAT LONG                                      blind drive to a destination
+  man1 X Y Z START CANCEL SHUTDOWN RC POSE         manual 1 (booleans as True/False)
+  man2 FORWARD REVERSE LEFT RIGHT                  manual 2
+  mission LAT LONG [LAT LONG ...]                  upload a waypoint route in chunks
+  resume                                           resume an interrupted mission upload
+  at COMMAND                                       raw AT command to the modem, e.g. at AT+VER?
+  info                                             LoRa info
+  rover ADDRESS                                    send the commands above to this rover
+  rovers                                           list connected rovers with round trip times, queues and track stats
+  link [SECONDS]                                   link statistics of each rover over the last SECONDS, or the whole session
+  close [ADDRESS]                                  close the connection with one rover, or all of them
+  airtime                                          predicted and measured airtime, radio utilisation
+  quit                                             exit'''
+
+# rover address as a line prefix
+def tag(session):
+    return '[' + str(session.address) + '] ' if session else ''
+
+# print station events, one line each
+def show(event, *args):
+    if event in ('state', 'status'):
+        print(tag(args[0]) + event + ': ' + args[1])
+    elif event == 'received':
+        print(tag(args[0]) + 'rx: ' + args[1].payload + ' (RSSI ' + str(args[1].rssi) + ' dBm, SNR ' + str(args[1].snr) + ')')
+    elif event in ('message', 'lora'):
+        print(args[0].strip() + (': ' if args[0].strip() else '') + args[1].strip())
+    elif event == 'response':
+        print('LoRa: ' + args[0])
+    elif event == 'mission':
+        print(tag(args[0]) + 'mission ' + str(args[1].id) + ': ' + str(len(args[1].acked)) + '/' + str(len(args[1].chunks)) + \
+            ' chunks acknowledged')
+    elif event == 'fence':
+        print(tag(args[0]) + 'geofence: ' + (', '.join(args[1]) if args[1] else 'clear'))
+
+# run commands from stdin, returns True on quit and False at end of input
+def commands(station):
+    for line in sys.stdin:
+        words = line.split()
+        if not words:
+            continue
+        c = words[0].lower()
+        if c == 'bd' and len(words) == 3:
+            station.createTx(' '.join(words[1:]), 1)
+        elif c == 'man1' and len(words) == 9:
+            station.createTx(' '.join(words[1:]), 2)
+        elif c == 'man2' and len(words) == 5:
+            station.createTx(' '.join(words[1:]), 3)
+        elif c == 'mission' and len(words) > 1 and len(words) % 2 == 1:
+            try:
+                plan = station.uploadMission([[float(words[i]), float(words[i + 1])] for i in range(1, len(words), 2)])
+            except ValueError:
+                plan = None
+                print('waypoints must be numbers')
+            if plan:
+                print('mission ' + str(plan.id) + ': ' + str(len(plan.waypoints)) + ' waypoints in ' + str(len(plan.chunks)) + \
+                    ' chunks, ' + format(plan.airtime(station.settings), '.2f') + ' s airtime')
+        elif c == 'resume':
+            station.resumeMission()
+        elif c == 'at' and len(words) > 1:
+            station.sendCustomCommand(' '.join(words[1:]) + '\r\n')
+        elif c == 'info':
+            station.loraTest()
+        elif c == 'rover' and len(words) == 2 and words[1].isdigit():
+            station.settings['roverAddress'] = words[1]
+        elif c == 'rovers':
+            for session in list(station.sessions.values()):
+                rtt = 'NA' if session.srtt is None else str(round(session.srtt * 1000)) + ' ms'
+                print(tag(session) + session.connectionState + ' ' + str(session.coordinate) + ' rtt ' + rtt + ' rto ' + \
+                    str(round(session.rto * 1000)) + ' ms, ' + str(session.retransmits) + ' retransmits, ' + str(session.timeouts) + ' timeouts, ' + \
+                    str(session.commandBuf.qsize()) + ' queued (oldest ' + format(session.commandBuf.age(), '.1f') + ' s), ' + \
+                    str(session.commandBuf.superseded) + ' superseded, ' + str(session.commandBuf.dropped) + ' dropped')
+                track = session.track
+                eta = track.eta()
+                print(tag(session) + 'path ' + str(round(track.length, 1)) + ' m, speed ' + \
+                    ('NA' if track.speed is None else format(track.speed, '.2f') + ' m/s') + ', heading ' + \
+                    ('NA' if track.heading is None else str(round(track.heading)) + ' deg') + ', climb ' + \
+                    ('NA' if track.climb is None else format(track.climb, '.2f') + ' m/s') + ', ETA ' + \
+                    ('NA' if eta is None else str(round(eta)) + ' s'))
+        elif c == 'link' and (len(words) == 1 or len(words) == 2 and words[1].isdigit()):
+            for session in list(station.sessions.values()):
+                print(tag(session) + linkstats.text(session.quality.summary(time.monotonic(), int(words[1]) if len(words) == 2 else None,
+                    len(session.inflight))))
+        elif c == 'airtime':
+            s = station.scheduler
+            print(str(s.frames) + ' frames, ' + str(round(s.predicted, 3)) + ' s predicted, ' + str(round(s.measured, 3)) + \
+                ' s measured for ' + str(s.answered) + ' answered, last ' + str(round(s.last[0] * 1000)) + '/' + \
+                str(round(s.last[1] * 1000)) + ' ms, utilisation ' + format(s.utilisation(time.monotonic()) * 100, '.2f') + \
+                '% of ' + format(airtime.dutyCycle(station.settings) * 100, '.3g') + '%')
+        elif c == 'close' and (len(words) == 1 or len(words) == 2 and words[1].isdigit()):
+            station.close(words[1] if len(words) == 2 else None)
+        elif c == 'quit':
+            return True
+        else:
+            print(HELP)
+    return False
+
+parser = argparse.ArgumentParser(prog = 'python -m core', description = 'Headless ground station: LoRa link, logging and command queue')
+source = parser.add_mutually_exclusive_group(required = True)
+source.add_argument('--port', help = 'serial port of the LoRa modem')
+source.add_argument('--simulate', action = 'store_true', help = 'use a simulated modem and rovers on a pty')
+source.add_argument('--replay', metavar = 'RECORDING', help = 'play a recording back through the state machine')
+parser.add_argument('--rovers', type = int, default = 1, help = 'number of simulated rovers')
+parser.add_argument('--speed', type = float, default = 1.0, help = 'replay speed, 0 is as fast as possible')
+parser.add_argument('--log', default = 'logs/telemetry.bin', help = 'telemetry recording')
+parser.add_argument('--no-configure', action = 'store_true', help = 'do not send the LoRa settings on connect')
+parser.add_argument('--fences', metavar = 'GEOJSON', help = 'keep-out zones and operating boundaries, see --fenceAction')
+parser.add_argument('--metrics', metavar = 'PORT', type = int, help = 'serve Prometheus metrics on 127.0.0.1:PORT/metrics')
+parser.add_argument('--metrics-file', metavar = 'JSON', help = 'write a metrics snapshot to this file every 10 s')
+for name, value in DEFAULTS.items():
+    parser.add_argument('--' + name, default = value, help = 'default ' + value)
+parser.add_argument('-q', '--quiet', action = 'store_true', help = 'do not print events')
+args = parser.parse_args()
+
+fences = None
+if args.fences:
+    try:
+        fences = geofence.load(args.fences)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+station = Station(args.log)
+for name in DEFAULTS:
+    station.settings[name] = getattr(args, name)
+if not args.quiet: station.listen(show)
+exporters = []
+if args.metrics is not None:
+    exporters.append(metrics.MetricsServer(port = args.metrics))
+if args.metrics_file:
+    exporters.append(metrics.Snapshot(args.metrics_file))
+for exporter in exporters:
+    exporter.start()
+if args.metrics is not None: print('metrics on ' + exporters[0].url())
+if fences: station.geofence = fences
+if args.simulate:
+    from core import simulator
+    sim = simulator.Simulator(rover = int(args.roverAddress), rovers = args.rovers, window = int(args.window),
+        codec = int(args.codec))
+    args.port = sim.start()
+    print('simulated modem on ' + args.port)
+if args.replay:
+    opened = station.openReplay(args.replay, args.speed)
+else:
+    opened = station.openSerial(args.port, not args.no_configure)
+if not opened.result(): # the AT check times out on its own
+    station.shutdown()
+    sys.exit(1)
+try:
+    if args.replay:
+        while station.rxCount < station.replayTotal:
+            time.sleep(0.1)
+        elapsed = time.perf_counter() - station.rxStart
+        print('replayed ' + str(station.rxCount) + ' messages in ' + str(round(elapsed, 3)) + ' s (' + \
+            str(round(station.rxCount / max(elapsed, 1e-9), 1)) + ' msg/s)')
+    elif not commands(station):
+        threading.Event().wait() # stdin closed, keep the link up until interrupted
+except KeyboardInterrupt:
+    pass
+station.shutdown()
+for exporter in exporters:
+    exporter.stop()
@@ -0,0 +1,92 @@
+import time
+import collections
+from math import ceil
+
+BANDWIDTHS = [7800, 10400, 15600, 20800, 31250, 41700, 62500, 125000, 250000, 500000] # AT+PARAMETER bandwidth index -> Hz
+PERIOD = 3600.0 # seconds the duty cycle is averaged over
+
+# seconds on air of a LoRa packet with an explicit header and CRC, as the RYLR896 sends them (Semtech AN1200.13)
+# sf 7-12, bw in Hz, cr 1-4 for 4/5-4/8, preamble in symbols
+def timeOnAir(length, sf, bw, cr, preamble):
+    symbol = (1 << sf) / bw
+    lowRate = 1 if symbol > 0.016 else 0 # low data rate optimisation is forced on above 16 ms symbols
+    payload = 8 + max(0, ceil((8 * length - 4 * sf + 28 + 16) / (4 * (sf - 2 * lowRate)))) * (cr + 4)
+    return (preamble + 4.25 + payload) * symbol
+
+# time on air of a payload with the LoRa settings of the Settings tab, 0 while they do not parse
+def frameTime(settings, length):
+    try:
+        return timeOnAir(length, int(settings['spreadingFactor']), BANDWIDTHS[int(settings['bandwidth'])],
+            int(settings['codingRate']), int(settings['preamble']))
+    except (ValueError, IndexError, ZeroDivisionError):
+        return 0.0
+
+# regulatory duty cycle of a carrier frequency in Hz, EU 863-870 MHz is 1% except the 10% sub-band at 869.4-869.65 MHz
+def bandDutyCycle(band):
+    if 869.4e6 <= band <= 869.65e6 or 433.05e6 <= band <= 434.79e6:
+        return 0.1
+    if 863e6 <= band < 870e6:
+        return 0.01
+    return 1.0
+
+# duty cycle limit as a fraction, the Duty Cycle setting in percent or the limit of the band for 'auto'
+def dutyCycle(settings):
+    try:
+        if settings['dutyCycle'] == 'auto':
+            return bandDutyCycle(int(settings['band']))
+        return min(1.0, max(0.0, float(settings['dutyCycle']) / 100))
+    except ValueError:
+        return 1.0
+
+# paces AT+SEND frames: one frame on the air at a time, and the airtime of the last PERIOD within the duty cycle
+# predicted airtime comes from the LoRa settings, measured airtime from AT+SEND until the modem answers
+class Scheduler:
+    def __init__(self, period = PERIOD):
+        self.period = period
+        self.history = collections.deque() # (start, predicted airtime) of frames in the last period
+        self.used = 0.0 # predicted airtime in history
+        self.onAir = None # (start, predicted airtime) of the frame the modem has not answered yet
+        self.started = time.monotonic()
+        self.frames = 0
+        self.predicted = 0.0 # totals since started
+        self.measured = 0.0
+        self.answered = 0 # frames with a measured airtime
+        self.last = (0.0, 0.0) # predicted and measured airtime of the latest answered frame
+    # seconds before a frame of airtime t may go out at duty cycle duty
+    def wait(self, t, duty, now):
+        if self.onAir:
+            start, predicted = self.onAir
+            guard = start + 2 * predicted + 1 - now # no answer from the modem, assume the frame is gone after this
+            if guard > 0:
+                return guard
+            self.onAir = None
+        while self.history and self.history[0][0] <= now - self.period:
+            self.used -= self.history.popleft()[1]
+        excess = self.used + t - duty * self.period
+        if duty >= 1 or excess <= 0:
+            return 0
+        for start, used in self.history: # wait until enough of the oldest frames age out of the period
+            excess -= used
+            if excess <= 0:
+                return start + self.period - now
+        return self.history[-1][0] + self.period - now if self.history else 0
+    # a frame of predicted airtime t was handed to the modem
+    def sent(self, t, now):
+        self.onAir = (now, t)
+        self.history.append((now, t))
+        self.used += t
+        self.frames += 1
+        self.predicted += t
+    # the modem answered the frame on the air after measured seconds
+    def done(self, measured):
+        if self.onAir is None:
+            return
+        self.last = (self.onAir[1], measured)
+        self.measured += measured
+        self.answered += 1
+        self.onAir = None
+    # fraction of the time since started, at most the last period, that the radio was transmitting
+    def utilisation(self, now):
+        while self.history and self.history[0][0] <= now - self.period:
+            self.used -= self.history.popleft()[1]
+        return self.used / max(1e-9, min(self.period, now - self.started))
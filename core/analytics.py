@@ -0,0 +1,118 @@
+import os
+from math import sin, cos, asin, atan2, sqrt, pi, degrees, radians
+from core import recorder
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+RADIUS = 6371000.0 # mean earth radius, metres
+SMOOTHING = 0.25 # weight of the newest segment in the average speed the ETA uses
+
+# great-circle distance in metres between two [lat, long], haversine so legs of a few centimetres do not round to zero
+def distance(start, current):
+    p = pi / 180
+    a = sin((current[0] - start[0]) * p / 2) ** 2 + cos(start[0] * p) * cos(current[0] * p) * sin((current[1] - start[1]) * p / 2) ** 2
+    return 2 * RADIUS * asin(min(1.0, sqrt(a)))
+
+# initial bearing in degrees from north, 0-360, from one [lat, long] to another
+def bearing(start, current):
+    lat1, lat2, dLong = radians(start[0]), radians(current[0]), radians(current[1] - start[1])
+    return degrees(atan2(sin(dLong) * cos(lat2), cos(lat1) * sin(lat2) - sin(lat1) * cos(lat2) * cos(dLong))) % 360
+
+# running statistics of one rover's track, each fix is O(1)
+# speed, heading and vertical rate are over the latest segment, the ETA uses a smoothed speed
+class TrackStats:
+    def __init__(self):
+        self.origin = None # [lat, long] of the first fix
+        self.last = None # (time, [lat, long], alt) of the latest fix
+        self.fixes = 0
+        self.length = 0.0 # metres along the track
+        self.speed = None # metres per second
+        self.average = None # smoothed speed
+        self.heading = None # degrees from north
+        self.climb = None # vertical rate, metres per second
+        self.destination = None # [lat, long] of the blind drive target
+    # add a fix at t seconds
+    def add(self, t, point, alt):
+        point = [point[0], point[1]]
+        if self.last is None:
+            self.origin = point
+        else:
+            then, previous, previousAlt = self.last
+            step = distance(previous, point)
+            self.length += step
+            if step > 0: # a rover standing still keeps its last heading
+                self.heading = bearing(previous, point)
+            dt = t - then
+            if dt > 0:
+                self.speed = step / dt
+                self.average = self.speed if self.average is None else self.average + SMOOTHING * (self.speed - self.average)
+                self.climb = (alt - previousAlt) / dt
+        self.last = (t, point, alt)
+        self.fixes += 1
+    # straight line distance from the first fix
+    def fromOrigin(self):
+        return 0.0 if self.last is None else distance(self.origin, self.last[1])
+    # metres left to the destination, None without one
+    def remaining(self):
+        if self.destination is None or self.last is None:
+            return None
+        return distance(self.last[1], self.destination)
+    # seconds to the destination at the smoothed speed, None without a destination or while stopped
+    def eta(self):
+        remaining = self.remaining()
+        if remaining is None or not self.average or self.average < 0.05:
+            return None
+        return remaining / self.average
+
+# recording layout for numpy, the same fields as recorder.RECORD
+if numpy is not None:
+    RECORD = numpy.dtype([('time', '<i8'), ('direction', 'u1'), ('kind', 'u1'), ('address', '<u2'), ('seq', '<u4'),
+        ('ack', '<u4'), ('rssi', '<i2'), ('snr', '<i2'), ('lat', '<f8'), ('long', '<f8'), ('alt', '<f4'), ('x', '<f4'),
+        ('y', '<f4'), ('z', '<f4'), ('state', 'S16'), ('payload', 'S240')])
+
+# time in seconds, lat, long and alt arrays of every fix a rover sent in a recording, read without a Python loop
+def load(path, address = None):
+    if numpy is None:
+        raise ImportError('track analytics over recordings need numpy')
+    recorder.checkHeader(path)
+    count = (os.path.getsize(path) - recorder.HEADER.size) // RECORD.itemsize
+    if not count:
+        return tuple(numpy.zeros(0) for i in range(4))
+    records = numpy.memmap(path, RECORD, 'r', recorder.HEADER.size, (count,))
+    keep = (records['direction'] == recorder.RX) & (records['kind'] == 2) & ~numpy.isnan(records['lat'])
+    if address is not None:
+        keep &= records['address'] == address
+    fixes = records[keep]
+    return fixes['time'] / 1e9, fixes['lat'].copy(), fixes['long'].copy(), fixes['alt'].astype(float)
+
+# TrackStats over a whole track at once: per fix arrays of length, speed, heading and climb, nan where TrackStats has None
+def batch(t, lat, long, alt):
+    if numpy is None:
+        raise ImportError('batch track analytics need numpy')
+    t, lat, long, alt = (numpy.asarray(a, dtype = float) for a in (t, lat, long, alt))
+    if not len(t):
+        return {'length': t, 'speed': t, 'heading': t, 'climb': t}
+    p = pi / 180
+    a = numpy.sin((lat[1:] - lat[:-1]) * p / 2) ** 2 + numpy.cos(lat[:-1] * p) * numpy.cos(lat[1:] * p) * \
+        numpy.sin((long[1:] - long[:-1]) * p / 2) ** 2
+    step = 2 * RADIUS * numpy.arcsin(numpy.minimum(1.0, numpy.sqrt(a)))
+    lat1, lat2, dLong = numpy.radians(lat[:-1]), numpy.radians(lat[1:]), numpy.radians(long[1:] - long[:-1])
+    heading = numpy.degrees(numpy.arctan2(numpy.sin(dLong) * numpy.cos(lat2),
+        numpy.cos(lat1) * numpy.sin(lat2) - numpy.sin(lat1) * numpy.cos(lat2) * numpy.cos(dLong))) % 360
+    heading = numpy.where(step > 0, heading, numpy.nan)[hold(step > 0)] # held while standing still, like TrackStats
+    dt = t[1:] - t[:-1]
+    with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+        speed = numpy.where(dt > 0, step / dt, numpy.nan)
+        climb = numpy.where(dt > 0, (alt[1:] - alt[:-1]) / dt, numpy.nan)
+    speed = speed[hold(dt > 0)] # like TrackStats, a repeated timestamp keeps the last rate
+    climb = climb[hold(dt > 0)]
+    nan = numpy.array([numpy.nan])
+    return {'length': numpy.concatenate([[0.0], numpy.cumsum(step)]), 'speed': numpy.concatenate([nan, speed]),
+        'heading': numpy.concatenate([nan, heading]), 'climb': numpy.concatenate([nan, climb])}
+
+# index of the latest True at or before each position, 0 before the first one (whose value has to be nan then)
+def hold(mask):
+    index = numpy.where(mask, numpy.arange(len(mask)), 0)
+    return numpy.maximum.accumulate(index) if len(index) else index
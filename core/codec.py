@@ -0,0 +1,173 @@
+import math
+import base64
+import struct
+
+# compact payloads for the SYN/ACK/FIN protocol, used once both ends offer '+C<version>' in the SYN exchange
+# the modem only carries ASCII, so the binary frame goes out as ':' + base85 (no spaces, no CR/LF)
+# first byte: version (2 bits) | body, +W, +S flags (3 bits) | kind (3 bits), then varint seq and ack
+#   ACK body: state, x y z (cm), lat long (1e-7 deg, int32), alt (cm)
+#   CMD body: BD lat long | MAN1 x y z (cm) + 5 packed booleans | MAN2 forward reverse left right (1/100)
+#             | WP varint mission, chunk, chunks, points + lat long per point
+# decode() gives back the same fields the text format splits into, so the protocol code reads both alike
+VERSION = 1
+MARKER = ':'
+KINDS = ['', 'SYN', 'ACK', 'FIN', 'CMD']
+COMMANDS = ['', 'BD', 'MAN1', 'MAN2', 'WP']
+STATES = ['', 'IDLE', 'DRIVING', 'MANUAL', 'BLIND', 'ARRIVED', 'STOPPED', 'ERROR'] # state names sent as one byte
+BODY, WINDOW, SACK = 0x08, 0x10, 0x20
+
+# unsigned LEB128
+def varint(n):
+    if n < 0:
+        raise ValueError('negative varint')
+    out = bytearray()
+    while n > 0x7F:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+# zigzag so small negative numbers stay short
+def svarint(n):
+    return varint(n << 1 if n >= 0 else (-n << 1) - 1)
+
+# fixed point value of a text number, ValueError for inf and nan
+def fixed(text, scale):
+    v = float(text) * scale
+    if not math.isfinite(v):
+        raise ValueError('not a finite number: ' + text)
+    return int(round(v))
+
+# little-endian int32, ValueError if n does not fit
+def int32(n):
+    if not -2 ** 31 <= n < 2 ** 31:
+        raise ValueError('out of int32 range: ' + str(n))
+    return struct.pack('<i', n)
+
+# reads varints and fixed fields from a frame
+class Reader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+    def byte(self):
+        self.pos += 1
+        return self.data[self.pos - 1]
+    def varint(self):
+        n, shift = 0, 0
+        while True:
+            b = self.byte()
+            n |= (b & 0x7F) << shift
+            shift += 7
+            if not b & 0x80:
+                return n
+    def svarint(self):
+        n = self.varint()
+        return n >> 1 if not n & 1 else -((n + 1) >> 1)
+    def int32(self):
+        self.pos += 4
+        return struct.unpack_from('<i', self.data, self.pos - 4)[0]
+    def text(self):
+        n = self.byte()
+        self.pos += n
+        return self.data[self.pos - n:self.pos].decode('Ascii')
+
+# text frame 'seq ack KIND ...' -> compact payload, raises ValueError for anything the codec can not carry
+def encode(text):
+    data = text.split(' ')
+    opts = {}
+    while data and data[-1][:1] == '+':
+        token = data.pop()
+        opts[token[1:2]] = token[2:]
+    if len(data) < 3 or data[2] not in KINDS[1:] or set(opts) - {'W', 'S'}:
+        raise ValueError('not a codec frame: ' + text)
+    kind = KINDS.index(data[2])
+    body = b''
+    if kind == 2 and len(data) > 3:
+        if len(data) != 10:
+            raise ValueError('telemetry needs 7 fields: ' + text)
+        state = data[3].encode('Ascii')
+        body = bytes([STATES.index(data[3])]) if data[3] in STATES[1:] else b'\x00' + bytes([len(state)]) + state
+        body += svarint(fixed(data[4], 100)) + svarint(fixed(data[5], 100)) + svarint(fixed(data[6], 100))
+        body += int32(fixed(data[7], 1e7)) + int32(fixed(data[8], 1e7)) + svarint(fixed(data[9], 100))
+    elif kind == 4:
+        if len(data) < 4 or data[3] not in COMMANDS[1:]:
+            raise ValueError('unknown command: ' + text)
+        command = COMMANDS.index(data[3])
+        args = data[4:]
+        body = bytes([command])
+        if command == 1 and len(args) == 2:
+            body += int32(fixed(args[0], 1e7)) + int32(fixed(args[1], 1e7))
+        elif command == 2 and len(args) == 8 and all(a in ('True', 'False') for a in args[3:]):
+            body += b''.join(svarint(fixed(a, 100)) for a in args[:3])
+            body += bytes([sum(1 << i for i, a in enumerate(args[3:]) if a == 'True')])
+        elif command == 3 and len(args) == 4:
+            body += b''.join(svarint(fixed(a, 100)) for a in args)
+        elif command == 4 and len(args) >= 5 and len(args) % 2 == 1:
+            body += varint(int(args[0])) + varint(int(args[1])) + varint(int(args[2])) + varint((len(args) - 3) // 2)
+            body += b''.join(int32(fixed(a, 1e7)) for a in args[3:])
+        else:
+            raise ValueError('bad arguments: ' + text)
+    elif len(data) > 3:
+        raise ValueError('unexpected fields: ' + text)
+    flags = (BODY if body else 0) | (WINDOW if 'W' in opts else 0) | (SACK if 'S' in opts else 0)
+    frame = bytes([VERSION << 6 | flags | kind]) + varint(int(data[0])) + varint(int(data[1])) + body
+    if 'W' in opts:
+        frame += varint(int(opts['W']))
+    if 'S' in opts:
+        sacked = [int(s) for s in opts['S'].split(',') if s]
+        frame += varint(len(sacked)) + b''.join(varint(s - p) for s, p in zip(sacked, [0] + sacked)) # ascending, as deltas
+    return MARKER + base64.b85encode(frame).decode('Ascii')
+
+# compact payload -> the fields of the equivalent text frame, raises ValueError if it is malformed
+def decode(payload):
+    try:
+        r = Reader(base64.b85decode(payload[1:]))
+        head = r.byte()
+        if head >> 6 != VERSION or not 0 < head & 0x07 < len(KINDS):
+            raise ValueError('unsupported frame header ' + hex(head))
+        kind = head & 0x07
+        data = [str(r.varint()), str(r.varint()), KINDS[kind]]
+        if head & BODY and kind == 2:
+            state = r.byte()
+            data.append(STATES[state] if state else r.text())
+            data += [str(r.svarint() / 100) for i in range(3)]
+            data += [str(r.int32() / 1e7), str(r.int32() / 1e7), str(r.svarint() / 100)]
+        elif head & BODY and kind == 4:
+            command = COMMANDS[r.byte()]
+            data.append(command)
+            if command == 'BD':
+                data += [str(r.int32() / 1e7), str(r.int32() / 1e7)]
+            elif command == 'MAN1':
+                data += [str(r.svarint() / 100) for i in range(3)]
+                flags = r.byte()
+                data += [str(bool(flags >> i & 1)) for i in range(5)]
+            elif command == 'WP':
+                data += [str(r.varint()) for i in range(3)]
+                data += [str(r.int32() / 1e7) for i in range(2 * r.varint())]
+            else:
+                data += [str(r.svarint() / 100) for i in range(4)]
+        if head & WINDOW:
+            data.append('+W' + str(r.varint()))
+        if head & SACK:
+            sacked = [0]
+            for i in range(r.varint()):
+                sacked.append(sacked[-1] + r.varint())
+            data.append('+S' + ','.join(str(s) for s in sacked[1:]))
+        return data
+    except (IndexError, struct.error) as e:
+        raise ValueError('truncated frame: ' + str(e))
+
+# payload on the air for a text frame, text stays text when the codec is off or can not carry it
+def pack(text, version):
+    if version:
+        try:
+            return encode(text)
+        except (ValueError, struct.error, OverflowError): # encode raises ValueError, the others must not kill the caller
+            pass
+    return text
+
+# fields of a received payload in either format
+def fields(payload):
+    if payload[:1] == MARKER:
+        return decode(payload)
+    return payload.split(' ')
@@ -0,0 +1,85 @@
+import time
+import threading
+import collections
+
+# priority classes, sent in this order: cancel/shutdown, then RC/pose preempt, then everything that drives the rover
+SAFETY, PREEMPT, DRIVE = 0, 1, 2
+CLASSES = ['safety', 'preempt', 'drive']
+SUPERSEDED = ['BD', 'MAN2'] # a newer one of these replaces an older one still waiting, only the latest target matters
+
+# priority class of a command 'CMD KIND args', MAN1 args are x y z start cancel shutdown rc pose
+def priority(msg):
+    data = msg.split(' ')
+    if len(data) == 10 and data[1] == 'MAN1':
+        if 'True' in (data[6], data[7]):
+            return SAFETY
+        if 'True' in (data[8], data[9]):
+            return PREEMPT
+    return DRIVE
+
+# a command waiting for the radio
+class Entry:
+    def __init__(self, msg):
+        self.msg = msg
+        self.kind = msg.split(' ')[1] if ' ' in msg else ''
+        self.priority = priority(msg)
+        self.time = time.monotonic()
+
+# per rover command queue, filled from the GUI or CLI and drained by the connection thread
+# commands go out by priority class, first in first out within a class; a newer BD or MAN2 replaces an unsent one of the
+# same kind, and a cancel or shutdown drops the drive commands still waiting so the rover does not start moving again
+class CommandQueue:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queues = [collections.deque() for c in CLASSES]
+        self.superseded = 0 # commands replaced by a newer one before they were sent
+        self.dropped = 0 # drive commands dropped by a cancel or shutdown
+    # queue a command
+    def put(self, msg):
+        entry = Entry(msg)
+        with self.lock:
+            drive = self.queues[DRIVE]
+            if entry.kind in SUPERSEDED:
+                kept = collections.deque(e for e in drive if e.kind != entry.kind)
+                self.superseded += len(drive) - len(kept)
+                self.queues[DRIVE] = drive = kept
+            if entry.priority == SAFETY:
+                self.dropped += len(drive)
+                drive.clear()
+            self.queues[entry.priority].append(entry)
+    # remove the waiting drive commands of a kind, returns how many there were
+    def drop(self, kind):
+        with self.lock:
+            drive = self.queues[DRIVE]
+            kept = collections.deque(e for e in drive if e.kind != kind)
+            self.queues[DRIVE] = kept
+            return len(drive) - len(kept)
+    # remove every waiting command, returns how many there were
+    def clear(self):
+        with self.lock:
+            n = sum(len(q) for q in self.queues)
+            for q in self.queues:
+                q.clear()
+            return n
+    # next command to send, None if there is none
+    def get(self):
+        with self.lock:
+            for q in self.queues:
+                if q:
+                    return q.popleft().msg
+        return None
+    # nothing waiting
+    def empty(self):
+        return not any(self.queues)
+    # commands waiting
+    def qsize(self):
+        return sum(len(q) for q in self.queues)
+    # seconds the oldest waiting command has been queued, 0 if there is none
+    def age(self, now = None):
+        with self.lock:
+            oldest = min((q[0].time for q in self.queues if q), default = None)
+        return 0.0 if oldest is None else (now or time.monotonic()) - oldest
+    # commands waiting per priority class
+    def counts(self):
+        with self.lock:
+            return [len(q) for q in self.queues]
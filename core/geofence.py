@@ -0,0 +1,112 @@
+import json
+from math import sqrt
+
+KINDS = ['keepout', 'boundary'] # a rover must stay out of a keep-out zone and inside an operating boundary
+ACTIONS = ['none', 'cancel', 'shutdown'] # what the station sends a rover that breaches a fence
+
+# even-odd test of a point against a ring of (lat, long), the closing vertex may be left out
+def inRing(ring, lat, long):
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        ai, aj = ring[i], ring[j]
+        if (ai[0] > lat) != (aj[0] > lat) and long < (aj[1] - ai[1]) * (lat - ai[0]) / (aj[0] - ai[0]) + ai[1]:
+            inside = not inside
+        j = i
+    return inside
+
+# one polygon with its holes, from a GeoJSON Polygon or one part of a MultiPolygon
+class Fence:
+    def __init__(self, name, kind, rings, geometry):
+        self.name = name
+        self.kind = kind
+        self.rings = rings # outer ring then holes, each [(lat, long), ...]
+        self.geometry = geometry # GeoJSON the map draws
+        lats = [p[0] for p in rings[0]]
+        longs = [p[1] for p in rings[0]]
+        self.box = (min(lats), min(longs), max(lats), max(longs)) # south, west, north, east
+    # point inside the polygon and outside its holes
+    def contains(self, lat, long):
+        south, west, north, east = self.box
+        if not (south <= lat <= north and west <= long <= east):
+            return False
+        if not inRing(self.rings[0], lat, long):
+            return False
+        return not any(inRing(hole, lat, long) for hole in self.rings[1:])
+
+# keep-out zones and operating boundaries in a uniform grid, a query only tests the fences overlapping the point's cell
+# the cell size follows the median fence size so a cell holds a few fences however many a site has
+class Geofence:
+    def __init__(self, fences = ()):
+        self.fences = list(fences)
+        self.boundaries = any(f.kind == 'boundary' for f in self.fences)
+        self.cell = 1.0 # degrees
+        self.grid = {} # (row, column) -> fences overlapping that cell
+        if self.fences:
+            sizes = sorted(max(f.box[2] - f.box[0], f.box[3] - f.box[1]) for f in self.fences)
+            self.cell = max(1e-6, sizes[len(sizes) // 2])
+            for f in self.fences:
+                south, west, north, east = f.box
+                cells = (int(north // self.cell) - int(south // self.cell) + 1) * (int(east // self.cell) - int(west // self.cell) + 1)
+                if cells > 100000: # a fence far bigger than the rest, e.g. the site boundary, gets a coarser cell
+                    self.cell *= sqrt(cells / 100000)
+            for f in self.fences:
+                south, west, north, east = f.box
+                for row in range(int(south // self.cell), int(north // self.cell) + 1):
+                    for column in range(int(west // self.cell), int(east // self.cell) + 1):
+                        self.grid.setdefault((row, column), []).append(f)
+    # fences whose cell holds a point
+    def candidates(self, lat, long):
+        return self.grid.get((int(lat // self.cell), int(long // self.cell)), ())
+    # fences a point breaches: keep-out zones it is in, and every boundary if there are boundaries and it is in none
+    def check(self, point):
+        lat, long = point[0], point[1]
+        breached = []
+        inBoundary = False
+        for f in self.candidates(lat, long):
+            if f.contains(lat, long):
+                if f.kind == 'keepout':
+                    breached.append(f)
+                else:
+                    inBoundary = True
+        if self.boundaries and not inBoundary:
+            breached += [f for f in self.fences if f.kind == 'boundary']
+        return breached
+    # GeoJSON FeatureCollection of every fence, for the map
+    def geojson(self):
+        return {'type': 'FeatureCollection', 'features': [{'type': 'Feature', 'geometry': f.geometry,
+            'properties': {'name': f.name, 'kind': f.kind}} for f in self.fences]}
+
+# Geofence of a GeoJSON file, Polygon and MultiPolygon features with an optional 'kind' (default keepout) and 'name'
+# raises ValueError for anything else
+def load(path):
+    with open(path) as file:
+        data = json.load(file)
+    try:
+        return Geofence(fences(data))
+    except (KeyError, TypeError, IndexError, AttributeError) as e:
+        raise ValueError(path + ' is not a GeoJSON polygon file: ' + repr(e))
+
+# Fence per polygon of parsed GeoJSON
+def fences(data):
+    features = data['features'] if data.get('type') == 'FeatureCollection' else [data]
+    found = []
+    for n, feature in enumerate(features):
+        properties = feature.get('properties') or {}
+        geometry = feature.get('geometry', feature)
+        kind = str(properties.get('kind', 'keepout')).lower().replace('-', '').replace('_', '')
+        if kind not in KINDS:
+            raise ValueError('fence ' + str(n) + ': kind must be one of ' + ', '.join(KINDS))
+        name = str(properties.get('name', kind + ' ' + str(n)))
+        if geometry.get('type') == 'Polygon':
+            polygons = [geometry['coordinates']]
+        elif geometry.get('type') == 'MultiPolygon':
+            polygons = geometry['coordinates']
+        else:
+            raise ValueError('fence ' + str(n) + ': ' + str(geometry.get('type')) + ' is not a polygon')
+        for polygon in polygons:
+            rings = [[(float(p[1]), float(p[0])) for p in ring] for ring in polygon] # GeoJSON is long, lat
+            if not rings or len(rings[0]) < 3:
+                raise ValueError('fence ' + str(n) + ': a polygon needs at least 3 points')
+            found.append(Fence(name, kind, rings, {'type': 'Polygon', 'coordinates': polygon}))
+    return found
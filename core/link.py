@@ -0,0 +1,210 @@
+import time
+import queue
+import threading
+import collections
+import concurrent.futures
+import serial
+from core import metrics
+
+SERIAL_BYTES = metrics.counter('gs_serial_bytes_total', 'Bytes through the modem serial port', ['direction'])
+PARSE = metrics.histogram('gs_parse_seconds', 'Time to frame and route the lines of one serial read', metrics.exponential(1e-6, 2, 14))
+
+# parsed +RCV= message from LoRa
+LoraMessage = collections.namedtuple('LoraMessage', ['address', 'length', 'payload', 'rssi', 'snr'])
+# the modem's answer to an AT+SEND, seconds from writing it to the answer
+SendDone = collections.namedtuple('SendDone', ['response', 'airtime'])
+# a problem on the link for the station to report
+LinkError = collections.namedtuple('LinkError', ['text'])
+
+# whether a line from the modem can be its answer to command: +ERR= answers any command, a setting or AT+SEND (anything
+# with '=', its payload may end in '?') gets +OK, a query AT+NAME? gets +NAME..., e.g. AT+VER? gets +VERSION=, and a
+# bare AT or AT+NAME like AT+RESET gets +OK or +NAME
+def answers(command, line):
+    if line[:5] == '+ERR=':
+        return True
+    name = command.strip()[3:].upper()
+    if '=' in name:
+        return line == '+OK'
+    if name[-1:] == '?':
+        return line[:1] == '+' and line[1:].startswith(name[:-1])
+    return line == '+OK' or name != '' and line[:1] == '+' and line[1:].startswith(name)
+
+# an AT command waiting for the modem, its future gets the answer line or TimeoutError after timeout seconds from the write
+class Request:
+    def __init__(self, command, timeout):
+        self.command = command
+        self.timeout = timeout
+        self.future = concurrent.futures.Future()
+        self.timer = None
+    # written to the port, the timeout starts
+    def written(self):
+        if self.future.done():
+            return
+        self.timer = threading.Timer(self.timeout, self.expire)
+        self.timer.daemon = True
+        self.timer.start()
+    # the modem answered, an answer after the timeout is dropped and False
+    def answer(self, line):
+        if self.timer: self.timer.cancel()
+        try:
+            self.future.set_result(line)
+        except concurrent.futures.InvalidStateError:
+            return False
+        return True
+    # no answer in time
+    def expire(self):
+        try:
+            self.future.set_exception(TimeoutError('No answer to ' + self.command.strip() + ' after ' + str(self.timeout) + ' s'))
+        except concurrent.futures.InvalidStateError:
+            pass
+    # the link closed before the answer
+    def cancel(self):
+        if self.timer: self.timer.cancel()
+        self.future.cancel()
+
+# serial connection to the LoRa modem with a framing reader thread and a coalescing writer thread
+# AT commands from command() are pipelined, the modem answers in order so a line is matched to the oldest command it can
+# answer, the commands before that one lost their answers and a line no command waits for is reported
+class Link:
+    def __init__(self):
+        self.port = None
+        self.running = False
+        self.readThread = threading.Thread()
+        self.writeThread = threading.Thread()
+        self.reset()
+        metrics.gauge('gs_write_queue_depth', 'Commands waiting for the serial writer', fn = lambda: self.writeBuf.qsize())
+    # fresh queues and statistics
+    def reset(self):
+        self.writeBuf = queue.Queue() # write buffer
+        self.readBuf = queue.Queue() # parsed +RCV= messages, SendDone for answered AT+SEND and LinkError
+        self.pending = collections.deque() # per command written and not answered: (command, write time of an AT+SEND, Request or None)
+        self.responseBuf = queue.Queue() # responses to AT commands
+        self.writeStats = {'depth': 0, 'bytes': 0, 'writes': 0, 'latency': 0.0} # writer statistics
+    # start reading/writing an open serial port
+    def open(self, port):
+        self.port = port
+        self.reset()
+        self.running = True
+        self.readThread = threading.Thread(target = self.read, args = [port], daemon = True)
+        self.writeThread = threading.Thread(target = self.write, args = [port], daemon = True)
+        self.writeThread.start()
+        self.readThread.start()
+    # stop the threads and close the port
+    def close(self):
+        self.running = False
+        self.writeBuf.put(None) # sentinel stops the writer
+        if self.writeThread.ident: self.writeThread.join()
+        if self.port:
+            self.port.cancel_read() # wake the reader from a blocking read
+            if self.readThread.ident: self.readThread.join()
+            self.port.close()
+        requests = [sent for command, sent in self.pending]
+        while not self.writeBuf.empty():
+            requests.append(self.writeBuf.get_nowait())
+        for request in requests:
+            if isinstance(request, Request): request.cancel()
+    # queue a command for the modem
+    def send(self, c):
+        self.writeBuf.put(c)
+    # queue an AT command, returns the future of its answer line
+    def command(self, c, timeout = 5.0):
+        request = Request(c, timeout)
+        self.writeBuf.put(request)
+        return request.future
+    # next +RCV= message or SendDone, None after timeout
+    def receive(self, timeout):
+        try:
+            return self.readBuf.get(timeout = timeout)
+        except queue.Empty:
+            return None
+    # next AT response or None after timeout
+    def response(self, timeout):
+        try:
+            return self.responseBuf.get(timeout = timeout)
+        except queue.Empty:
+            return None
+    # write to serial port
+    def write(self, ser):
+        running = True
+        while running:
+            batch = [self.writeBuf.get()] # block until something is queued
+            while True: # coalesce everything else already queued
+                try:
+                    batch.append(self.writeBuf.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch: # sentinel, write what came before it and stop
+                batch = batch[:batch.index(None)]
+                running = False
+            if not batch:
+                continue
+            data = ''.join(c.command if isinstance(c, Request) else c for c in batch).encode('Ascii')
+            now = time.monotonic()
+            for c in batch: # before the answers can arrive
+                if isinstance(c, Request): self.pending.append((c.command, c))
+                else: self.pending.append((c, now if c[:8] == 'AT+SEND=' else None))
+            start = time.perf_counter()
+            try:
+                ser.write(data)
+            except (serial.SerialException, OSError) as e: # the port went away, stop like the reader does
+                for c in batch:
+                    if isinstance(c, Request): c.cancel()
+                self.readBuf.put(LinkError('Serial write failed: ' + str(e)))
+                break
+            self.writeStats['latency'] = time.perf_counter() - start
+            SERIAL_BYTES.inc(len(data), 'out')
+            self.writeStats['bytes'] += len(data)
+            self.writeStats['writes'] += 1
+            self.writeStats['depth'] = self.writeBuf.qsize()
+            for c in batch:
+                if isinstance(c, Request): c.written()
+    # read from serial port
+    def read(self, ser):
+        buf = bytearray() # reused for the whole session, partial lines stay in it between reads
+        while self.running:
+            try:
+                data = ser.read(max(1, ser.in_waiting)) # blocks until data arrives or timeout
+            except serial.SerialException:
+                break
+            buf += data
+            SERIAL_BYTES.inc(len(data), 'in')
+            t = time.perf_counter() # one timing per read, a read usually holds one line and a burst pays for one
+            start = 0
+            end = buf.find(b'\r\n')
+            while end != -1:
+                self.frame(buf[start:end].decode('Ascii', 'replace'))
+                start = end + 2
+                end = buf.find(b'\r\n', start)
+            del buf[:start]
+            if start: PARSE.observe(time.perf_counter() - t)
+    # route a complete line from LoRa
+    def frame(self, line):
+        if line[:5] == '+RCV=':
+            # payload may contain commas so it is cut out by its length
+            try:
+                address, length, rest = line[5:].split(',', 2)
+                length = int(length)
+                rssi, snr = rest[length + 1:].split(',')
+                self.readBuf.put(LoraMessage(int(address), length, rest[:length], int(rssi), int(snr)))
+            except ValueError:
+                self.readBuf.put(LinkError('Malformed message: ' + line))
+        elif line:
+            # a request that timed out is skipped, its answer is taken as lost, answers to AT+SEND only time the frame
+            # the writer only appends, so the pending commands are walked by index
+            for i in range(len(self.pending)):
+                command, sent = self.pending[i]
+                if not (isinstance(sent, Request) and sent.future.done()) and answers(command, line):
+                    break
+            else:
+                self.readBuf.put(LinkError('Unexpected line: ' + line))
+                return
+            for lost in range(i):
+                command, skipped = self.pending.popleft()
+                if isinstance(skipped, Request): skipped.expire()
+            self.pending.popleft()
+            if isinstance(sent, Request):
+                if not sent.answer(line): self.readBuf.put(LinkError('Late answer to ' + sent.command.strip() + ': ' + line))
+            elif sent is None:
+                self.responseBuf.put(line)
+            else:
+                self.readBuf.put(SendDone(line, time.monotonic() - sent))
@@ -0,0 +1,179 @@
+import math
+import threading
+
+SLOT = 10 # seconds of link statistics one slot holds
+SLOTS = 60 # slots kept, the longest sliding window is SLOT * SLOTS seconds
+
+# HDR style histogram, log buckets keep every value to within step of itself (step is relative) and linear buckets to
+# within step, counts are a dict so only buckets that were hit take memory and never more than the bucket count
+class Histogram:
+    def __init__(self, low, high, step, log = False):
+        self.low = low
+        self.high = high
+        self.step = step
+        self.log = log
+        self.growth = math.log1p(step) # log of the ratio between log buckets
+        self.clear()
+    # forget every value
+    def clear(self):
+        self.counts = {} # bucket -> values in it
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+    # bucket of a value, values out of range go in the first or last bucket
+    def bucket(self, v):
+        if v < self.low: v = self.low
+        elif v > self.high: v = self.high
+        if self.log:
+            return int(math.log(v / self.low) / self.growth)
+        return int((v - self.low) // self.step)
+    # value a bucket stands for, the middle of a log bucket and the bottom of a linear one so integers come back whole
+    def value(self, i):
+        if self.log:
+            return self.low * (1 + self.step) ** (i + 0.5)
+        return self.low + i * self.step
+    # add one value
+    def add(self, v):
+        i = self.bucket(v)
+        self.counts[i] = self.counts.get(i, 0) + 1
+        self.count += 1
+        self.sum += v
+        if self.min is None or v < self.min: self.min = v
+        if self.max is None or v > self.max: self.max = v
+    # add the values of another histogram with the same buckets
+    def merge(self, other):
+        for i, n in other.counts.items():
+            self.counts[i] = self.counts.get(i, 0) + n
+        self.count += other.count
+        self.sum += other.sum
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+    # value below which a fraction q of the values fall, None if empty
+    def percentile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i in sorted(self.counts):
+            seen += self.counts[i]
+            if seen >= rank:
+                return min(max(self.value(i), self.min), self.max)
+        return self.max
+    # average, None if empty
+    def mean(self):
+        return self.sum / self.count if self.count else None
+
+# link counters and distributions of one stretch of time
+class Slot:
+    def __init__(self, index = None):
+        self.index = index # time // SLOT of the slot, None for a total
+        self.sent = 0 # frames transmitted for the first time
+        self.retransmits = 0
+        self.delivered = 0 # frames the rover acknowledged
+        self.timeouts = 0
+        self.received = 0 # messages from the rover
+        self.rtt = Histogram(0.001, 600.0, 0.02, log = True) # seconds, to within 2%
+        self.rssi = Histogram(-164, 0, 1) # dBm
+        self.snr = Histogram(-32, 32, 1) # dB
+    # add the counts of another slot
+    def merge(self, other):
+        self.sent += other.sent
+        self.retransmits += other.retransmits
+        self.delivered += other.delivered
+        self.timeouts += other.timeouts
+        self.received += other.received
+        self.rtt.merge(other.rtt)
+        self.rssi.merge(other.rssi)
+        self.snr.merge(other.snr)
+
+# streaming link quality of one rover in constant memory: a ring of SLOT second slots for the sliding windows and a
+# total for the whole mission, fed by the station on the connection thread and read from any thread
+class LinkStats:
+    def __init__(self, slot = SLOT, slots = SLOTS):
+        self.slot = slot
+        self.ring = [None] * slots
+        self.total = Slot()
+        self.last = Slot(-1) # slot the latest event went in
+        self.lock = threading.Lock()
+    # slot for time now, reusing the one that fell out of the window, called with the lock held
+    def current(self, now):
+        index = int(now // self.slot)
+        if index != self.last.index:
+            s = self.ring[index % len(self.ring)]
+            if s is None or s.index != index:
+                s = self.ring[index % len(self.ring)] = Slot(index)
+            self.last = s
+        return self.last
+    # a frame went out for the first time
+    def sent(self, now):
+        with self.lock:
+            self.current(now).sent += 1
+            self.total.sent += 1
+    # a frame went out again
+    def retransmitted(self, now):
+        with self.lock:
+            self.current(now).retransmits += 1
+            self.total.retransmits += 1
+    # the rover acknowledged n frames
+    def delivered(self, now, n):
+        with self.lock:
+            self.current(now).delivered += n
+            self.total.delivered += n
+    # a round trip in seconds was measured
+    def roundTrip(self, now, rtt):
+        with self.lock:
+            self.current(now).rtt.add(rtt)
+            self.total.rtt.add(rtt)
+    # a frame timer ran out
+    def timedOut(self, now):
+        with self.lock:
+            self.current(now).timeouts += 1
+            self.total.timeouts += 1
+    # a message came in with its signal strength and signal to noise ratio
+    def received(self, now, rssi, snr):
+        with self.lock:
+            s = self.current(now)
+            s.received += 1
+            s.rssi.add(rssi)
+            s.snr.add(snr)
+            self.total.received += 1
+            self.total.rssi.add(rssi)
+            self.total.snr.add(snr)
+    # counts and distributions of the last span seconds, or of the whole mission for None
+    # pending frames are still waiting for their acknowledgement, one transmission of each is not counted as lost yet
+    def summary(self, now, span = None, pending = 0):
+        if span is None:
+            merged = Slot()
+            with self.lock:
+                merged.merge(self.total)
+        else:
+            oldest = int(now // self.slot) - max(1, math.ceil(span / self.slot)) # slots newer than this are in the window
+            merged = Slot()
+            with self.lock:
+                for s in self.ring:
+                    if s is not None and oldest < s.index <= now // self.slot:
+                        merged.merge(s)
+        transmissions = merged.sent + merged.retransmits
+        settled = max(merged.delivered, transmissions - pending)
+        return {'span': span, 'sent': merged.sent, 'retransmits': merged.retransmits, 'delivered': merged.delivered,
+            'timeouts': merged.timeouts, 'received': merged.received,
+            'delivery': min(1.0, merged.delivered / settled) if settled else None, # acknowledged per transmission
+            'retransmitRate': merged.retransmits / transmissions if transmissions else None,
+            'rtt': {'p50': merged.rtt.percentile(0.5), 'p90': merged.rtt.percentile(0.9), 'p99': merged.rtt.percentile(0.99),
+                'max': merged.rtt.max},
+            'rssi': {'mean': merged.rssi.mean(), 'p10': merged.rssi.percentile(0.1), 'p50': merged.rssi.percentile(0.5),
+                'p90': merged.rssi.percentile(0.9)},
+            'snr': {'mean': merged.snr.mean(), 'p10': merged.snr.percentile(0.1), 'p50': merged.snr.percentile(0.5),
+                'p90': merged.snr.percentile(0.9)}}
+
+# one line of a summary: delivery, retransmissions, RTT and signal percentiles
+def text(summary):
+    def number(v, unit, scale = 1, digits = 0):
+        return 'NA' if v is None else format(v * scale, '.' + str(digits) + 'f') + unit
+    rtt, rssi, snr = summary['rtt'], summary['rssi'], summary['snr']
+    return 'Delivery: ' + number(summary['delivery'], '%', 100, 1) + '  Retransmits: ' + \
+        number(summary['retransmitRate'], '%', 100, 1) + '  RTT p50/p90/p99: ' + '/'.join(number(rtt[p], '', 1000)
+        for p in ('p50', 'p90', 'p99')) + ' ms  RSSI p10/p50/p90: ' + '/'.join(number(rssi[p], '') for p in ('p10', 'p50', 'p90')) + \
+        ' dBm  SNR p10/p50/p90: ' + '/'.join(number(snr[p], '') for p in ('p10', 'p50', 'p90')) + ' dB'
@@ -0,0 +1,222 @@
+import os
+import json
+import time
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# metrics cost a locked add where they are counted, gauges of queue depths are read by a function only when a scrape or
+# snapshot asks for them, and the Prometheus text is only built for a request
+
+# bucket bounds growing by factor from start
+def exponential(start, factor, count):
+    return [start * factor ** i for i in range(count)]
+
+# number that only goes up, per combination of label values
+class Counter:
+    kind = 'counter'
+    def __init__(self, name, help, labels = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {} # label values -> value
+        self.lock = threading.Lock()
+    # add n
+    def inc(self, n = 1, *labels):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + n
+    # (label values, value) pairs
+    def samples(self):
+        with self.lock:
+            return list(self.values.items())
+
+# number that goes up and down, set directly or read from fn when collected, fn returns a number or a dict of label
+# values -> number
+class Gauge(Counter):
+    kind = 'gauge'
+    def __init__(self, name, help, labels = (), fn = None):
+        super().__init__(name, help, labels)
+        self.fn = fn
+    # set the value
+    def set(self, v, *labels):
+        with self.lock:
+            self.values[labels] = v
+    # (label values, value) pairs
+    def samples(self):
+        if self.fn is None:
+            return super().samples()
+        v = self.fn()
+        return list(v.items()) if isinstance(v, dict) else [((), v)]
+
+# counts of values at or below each bucket bound, with their sum
+class Histogram:
+    kind = 'histogram'
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.labels = ()
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # per bucket, the last one is above every bound
+        self.sum = 0.0
+        self.lock = threading.Lock()
+    # add one value
+    def observe(self, v):
+        i = bisect.bisect_left(self.buckets, v)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += v
+    # cumulative counts per bound with +Inf last, the sum and the count
+    def samples(self):
+        with self.lock:
+            counts, total = list(self.counts), self.sum
+        cumulative = []
+        seen = 0
+        for bound, n in zip(self.buckets + [float('inf')], counts):
+            seen += n
+            cumulative.append((bound, seen))
+        return cumulative, total, seen
+
+# metrics by name, asking for a name again returns the metric already registered so modules can declare them at import
+class Registry:
+    def __init__(self):
+        self.metrics = {} # name -> metric
+        self.lock = threading.Lock()
+    # metric of a name, created by make if there is none
+    def get(self, name, make):
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = make()
+            return self.metrics[name]
+    # counter of a name
+    def counter(self, name, help, labels = ()):
+        return self.get(name, lambda: Counter(name, help, labels))
+    # gauge of a name, a new fn replaces the old one, e.g. for the queues of a new Station
+    def gauge(self, name, help, labels = (), fn = None):
+        metric = self.get(name, lambda: Gauge(name, help, labels, fn))
+        if fn is not None: metric.fn = fn
+        return metric
+    # histogram of a name
+    def histogram(self, name, help, buckets):
+        return self.get(name, lambda: Histogram(name, help, buckets))
+    # Prometheus text exposition of every metric
+    def text(self):
+        lines = []
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key = lambda m: m.name)
+        for m in metrics:
+            lines.append('# HELP ' + m.name + ' ' + m.help)
+            lines.append('# TYPE ' + m.name + ' ' + m.kind)
+            if m.kind == 'histogram':
+                cumulative, total, count = m.samples()
+                for bound, n in cumulative:
+                    lines.append(m.name + '_bucket{le="' + ('+Inf' if bound == float('inf') else repr(bound)) + '"} ' + str(n))
+                lines.append(m.name + '_sum ' + repr(total))
+                lines.append(m.name + '_count ' + str(count))
+            else:
+                for labels, v in m.samples():
+                    lines.append(m.name + labelText(m.labels, labels) + ' ' + repr(v))
+        return '\n'.join(lines) + '\n'
+    # every metric as a dict for JSON
+    def snapshot(self):
+        found = {}
+        with self.lock:
+            metrics = list(self.metrics.values())
+        for m in metrics:
+            entry = {'type': m.kind, 'help': m.help}
+            if m.kind == 'histogram':
+                cumulative, total, count = m.samples()
+                entry.update({'buckets': [['+Inf' if b == float('inf') else b, n] for b, n in cumulative], 'sum': total,
+                    'count': count})
+            else:
+                entry['values'] = [{'labels': dict(zip(m.labels, labels)), 'value': v} for labels, v in m.samples()]
+            found[m.name] = entry
+        return {'time': time.time(), 'metrics': found}
+
+# '{name="value",...}' of label values, empty without labels
+def labelText(names, values):
+    if not values:
+        return ''
+    escape = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(n + '="' + escape(v) + '"' for n, v in zip(names, values)) + '}'
+
+REGISTRY = Registry() # the station, link, recorder and GUI count into this one
+
+# counter of a name in REGISTRY
+def counter(name, help, labels = ()):
+    return REGISTRY.counter(name, help, labels)
+
+# gauge of a name in REGISTRY
+def gauge(name, help, labels = (), fn = None):
+    return REGISTRY.gauge(name, help, labels, fn)
+
+# histogram of a name in REGISTRY
+def histogram(name, help, buckets):
+    return REGISTRY.histogram(name, help, buckets)
+
+# Prometheus scrape endpoint on a local port, /metrics in the text format
+class MetricsServer:
+    def __init__(self, registry = REGISTRY, host = '127.0.0.1', port = 0):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.server = None
+        self.thread = threading.Thread()
+    # scrape url
+    def url(self):
+        return 'http://' + self.host + ':' + str(self.port) + '/metrics'
+    # serve in a background thread
+    def start(self):
+        registry = self.registry
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                data = registry.text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            def log_message(self, format, *args):
+                pass
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target = self.server.serve_forever, daemon = True)
+        self.thread.start()
+    # stop serving
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+# JSON snapshot of the metrics written every interval seconds, replaced whole so a reader never sees half a file
+class Snapshot:
+    def __init__(self, path, registry = REGISTRY, interval = 10.0):
+        self.path = path
+        self.registry = registry
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread()
+    # start writing
+    def start(self):
+        if os.path.dirname(self.path): os.makedirs(os.path.dirname(self.path), exist_ok = True)
+        self.stopped.clear()
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+    # stop writing, after a last snapshot
+    def stop(self):
+        self.stopped.set()
+        if self.thread.ident: self.thread.join()
+    # write one snapshot
+    def write(self):
+        with open(self.path + '.tmp', 'w') as file:
+            json.dump(self.registry.snapshot(), file, indent = 1)
+        os.replace(self.path + '.tmp', self.path)
+    # snapshot thread
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+        self.write()
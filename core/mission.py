@@ -0,0 +1,57 @@
+import time
+from core import codec
+from core import airtime
+
+PAYLOAD = 240 # bytes the RYLR896 carries in one AT+SEND
+HEADER = '99999 99999 CMD ' # room for the seq and ack the station puts in front of a chunk
+
+# waypoint route for one rover, uploaded as 'WP id index count lat long lat long ...' commands that each fit one frame
+# the transport acknowledges every chunk, so an interrupted upload resumes with the chunks the rover has not got
+class Mission:
+    def __init__(self, waypoints, id = None):
+        self.waypoints = [[float(p[0]), float(p[1])] for p in waypoints]
+        self.id = int(time.time()) % 65536 if id is None else id # the rover tells a new mission from a resumed one by it
+        self.version = None # codec version the chunks were packed for
+        self.chunks = [] # command per chunk
+        self.acked = set() # chunk indexes the rover acknowledged
+        self.started = None # when the upload was first queued
+    # split the waypoints into chunks that fit the payload limit in a codec version, acknowledgements are kept if the
+    # chunks come out the same
+    def pack(self, version, limit = PAYLOAD):
+        if version == self.version:
+            return self.chunks
+        points = [format(p[0], '.7f') + ' ' + format(p[1], '.7f') for p in self.waypoints]
+        count = str(len(points)) # at least as wide as the real chunk count
+        groups = []
+        while points:
+            n = 1
+            while n < len(points) and fits(self.id, len(groups), count, points[:n + 1], version, limit):
+                n += 1
+            groups.append(points[:n])
+            points = points[n:]
+        chunks = ['WP ' + str(self.id) + ' ' + str(i) + ' ' + str(len(groups)) + ' ' + ' '.join(g) for i, g in enumerate(groups)]
+        if chunks != self.chunks:
+            self.acked = set()
+        self.version = version
+        self.chunks = chunks
+        return chunks
+    # every chunk acknowledged
+    def done(self):
+        return bool(self.chunks) and len(self.acked) == len(self.chunks)
+    # a chunk command was acknowledged, False if it is not one of this mission's
+    def ack(self, command):
+        data = command.split(' ')
+        if len(data) < 4 or data[0] != 'WP' or data[1] != str(self.id):
+            return False
+        self.acked.add(int(data[2]))
+        return True
+    # chunk commands the rover has not acknowledged yet
+    def pending(self):
+        return [c for i, c in enumerate(self.chunks) if i not in self.acked]
+    # predicted seconds on air of the chunks still to send, with the LoRa settings
+    def airtime(self, settings):
+        return sum(airtime.frameTime(settings, len(codec.pack(HEADER + c, self.version))) for c in self.pending())
+
+# a chunk of points fits in one frame
+def fits(id, index, count, points, version, limit):
+    return len(codec.pack(HEADER + 'WP ' + str(id) + ' ' + str(index) + ' ' + count + ' ' + ' '.join(points), version)) <= limit
@@ -0,0 +1,68 @@
+import threading
+import serial.tools.list_ports
+try:
+    import pyudev
+except ImportError:
+    pyudev = None
+
+# serial ports that appeared and disappeared between two comports() lists, as (added entries, removed port names)
+def diff(old, new):
+    before = {port for port, desc, hwid in old}
+    after = {port for port, desc, hwid in new}
+    return [entry for entry in new if entry[0] not in before], sorted(before - after)
+
+# watches for serial ports being plugged in and removed, callback(found) gets the sorted comports() list on the monitor
+# thread, once at start and then after every change
+# udev tty events wake it on Linux when pyudev is installed, otherwise, or if the netlink socket can not be opened,
+# it polls comports() every interval seconds
+class PortMonitor:
+    def __init__(self, callback, interval = 1.0, settle = 0.2):
+        self.callback = callback
+        self.interval = interval
+        self.settle = settle # a USB modem comes up as several udev events, they are collected for this long
+        self.ports = []
+        self.mode = 'poll'
+        self.stopped = threading.Event()
+        self.thread = threading.Thread()
+    # start watching
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target = self.watch, daemon = True)
+        self.thread.start()
+    # stop watching, with udev this waits at most interval for the thread
+    def stop(self):
+        self.stopped.set()
+        if self.thread.ident: self.thread.join()
+    # list ports and call back if the list changed
+    def scan(self):
+        found = [tuple(entry) for entry in sorted(serial.tools.list_ports.comports())]
+        if found != self.ports:
+            self.ports = found
+            self.callback(found)
+    # netlink monitor for tty devices, None if udev is not available
+    def udev(self):
+        if pyudev is None:
+            return None
+        try:
+            monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+            monitor.filter_by('tty')
+            monitor.start()
+            return monitor
+        except (OSError, ValueError, ImportError):
+            return None
+    # monitor thread
+    def watch(self):
+        monitor = self.udev()
+        self.mode = 'poll' if monitor is None else 'udev'
+        self.ports = [tuple(entry) for entry in sorted(serial.tools.list_ports.comports())]
+        self.callback(self.ports)
+        while not self.stopped.is_set():
+            if monitor is None:
+                self.stopped.wait(self.interval)
+            else:
+                if monitor.poll(timeout = self.interval) is None:
+                    continue
+                while monitor.poll(timeout = self.settle) is not None: # drain the rest of the burst
+                    pass
+            if not self.stopped.is_set():
+                self.scan()
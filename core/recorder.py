@@ -0,0 +1,182 @@
+import os
+import time
+import json
+import struct
+import bisect
+import threading
+import queue
+import collections
+from core import codec
+from core import metrics
+
+HEADER = struct.Struct('<8sI4x') # magic, record size
+MAGIC = b'GSREC\x00\x00\x01'
+# time, direction, kind, address, seq, ack, rssi, snr, lat, long, alt, x, y, z, state, payload
+RECORD = struct.Struct('<qBBHIIhhddffff16s240s')
+INDEX = struct.Struct('<qQ') # time, record number
+RX, TX = 0, 1
+KINDS = ['', 'SYN', 'ACK', 'FIN', 'CMD']
+NAN = float('nan')
+
+FLUSH = metrics.histogram('gs_log_flush_seconds', 'Time to write and flush one batch of the telemetry log', metrics.exponential(1e-5, 2, 16))
+RECORDS = metrics.counter('gs_log_records_total', 'Records written to the telemetry log')
+
+Record = collections.namedtuple('Record', ['time', 'direction', 'kind', 'address', 'seq', 'ack', 'rssi', 'snr',
+    'lat', 'long', 'alt', 'x', 'y', 'z', 'state', 'payload'])
+
+# nanoseconds since the epoch that never go backwards within a session
+class Clock:
+    def __init__(self):
+        self.wall = time.time_ns()
+        self.mono = time.monotonic_ns()
+    def now(self):
+        return self.wall + time.monotonic_ns() - self.mono
+
+# parse a payload 'seq ack KIND [state x y z lat long alt]', text or codec, into record fields
+def payloadFields(payload):
+    try:
+        data = codec.fields(payload)
+    except ValueError:
+        data = []
+    fields = [0, 0, 0, '', NAN, NAN, NAN, NAN, NAN, NAN] # seq, ack, kind, state, lat, long, alt, x, y, z
+    try:
+        fields[0] = int(data[0])
+        fields[1] = int(data[1])
+        fields[2] = KINDS.index(data[2]) if data[2] in KINDS else 0
+        if fields[2] == 2 and len(data) > 9:
+            fields[3] = data[3]
+            fields[7:10] = [float(data[4]), float(data[5]), float(data[6])]
+            fields[4:7] = [float(data[7]), float(data[8]), float(data[9])]
+    except (IndexError, ValueError):
+        pass
+    return fields
+
+# append-only binary log written in batches from a background thread, with a sparse time index and a JSON lines file
+# of notes about the mission such as link statistics
+class Recorder:
+    def __init__(self, path, interval = 0.5, every = 256):
+        self.path = path
+        self.indexPath = path + '.idx'
+        self.notesPath = path + '.notes'
+        self.interval = interval # seconds between flushes
+        self.every = every # records between index entries
+        self.clock = Clock()
+        self.buf = queue.Queue()
+        self.stats = {'records': 0, 'flushes': 0, 'latency': 0.0}
+        if os.path.dirname(path): os.makedirs(os.path.dirname(path), exist_ok = True)
+        self.count = 0
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            checkHeader(path)
+            self.count = (os.path.getsize(path) - HEADER.size) // RECORD.size
+            os.truncate(path, HEADER.size + self.count * RECORD.size) # drop a record torn by a crash
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(HEADER.pack(MAGIC, RECORD.size))
+        self.indexFile = open(self.indexPath, 'ab')
+        self.notesFile = open(self.notesPath, 'a')
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+    # queue one record
+    def record(self, direction, address, payload, rssi = 0, snr = 0):
+        seq, ack, kind, state, lat, long, alt, x, y, z = payloadFields(payload)
+        address = int(address) if str(address).isdigit() else 0
+        self.buf.put(RECORD.pack(self.clock.now(), direction, kind, address & 0xFFFF, seq & 0xFFFFFFFF, ack & 0xFFFFFFFF,
+            rssi, snr, lat, long, alt, x, y, z, state.encode('Ascii', 'replace')[:16], payload.encode('Ascii', 'replace')[:240]))
+    # queue a note, a dict stored with the time and kind
+    def note(self, kind, data):
+        self.buf.put(json.dumps(dict(data, time = self.clock.now(), kind = kind)) + '\n')
+    # write queued records in batches until the sentinel arrives
+    def run(self):
+        running = True
+        while running:
+            batch = [self.buf.get()]
+            deadline = time.monotonic() + self.interval
+            while batch[-1] is not None:
+                try:
+                    batch.append(self.buf.get(timeout = max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                batch.pop()
+                running = False
+            notes = [item for item in batch if isinstance(item, str)]
+            if notes:
+                batch = [item for item in batch if not isinstance(item, str)]
+                self.notesFile.write(''.join(notes))
+                self.notesFile.flush()
+            if not batch:
+                continue
+            start = time.perf_counter()
+            index = b''
+            for i, record in enumerate(batch):
+                if (self.count + i) % self.every == 0:
+                    index += INDEX.pack(RECORD.unpack_from(record)[0], self.count + i)
+            self.file.write(b''.join(batch))
+            self.file.flush()
+            if index:
+                self.indexFile.write(index)
+                self.indexFile.flush()
+            self.count += len(batch)
+            self.stats['records'] = self.count
+            self.stats['flushes'] += 1
+            self.stats['latency'] = time.perf_counter() - start
+            FLUSH.observe(self.stats['latency'])
+            RECORDS.inc(len(batch))
+    # flush everything and close the files
+    def close(self):
+        self.buf.put(None)
+        self.thread.join()
+        self.file.close()
+        self.indexFile.close()
+        self.notesFile.close()
+
+# make sure a file is a recording this version can read
+def checkHeader(path):
+    with open(path, 'rb') as file:
+        magic, size = HEADER.unpack(file.read(HEADER.size))
+    if magic != MAGIC or size != RECORD.size:
+        raise ValueError(path + ' is not a ground station recording')
+
+# decode one packed record
+def unpack(data, offset = 0):
+    r = list(RECORD.unpack_from(data, offset))
+    r[14] = r[14].rstrip(b'\x00').decode('Ascii', 'replace')
+    r[15] = r[15].rstrip(b'\x00').decode('Ascii', 'replace')
+    return Record(*r)
+
+# records with start <= time < end, seeking through the index instead of scanning the whole file
+def read(path, start = None, end = None, chunk = 4096):
+    checkHeader(path)
+    first = 0
+    if start is not None and os.path.exists(path + '.idx'):
+        with open(path + '.idx', 'rb') as file:
+            data = file.read()
+        entries = [INDEX.unpack_from(data, i) for i in range(0, len(data) - INDEX.size + 1, INDEX.size)]
+        i = bisect.bisect_right([e[0] for e in entries], start) - 1
+        if i >= 0: first = entries[i][1]
+    with open(path, 'rb') as file:
+        file.seek(HEADER.size + first * RECORD.size)
+        while True:
+            data = file.read(RECORD.size * chunk)
+            if len(data) < RECORD.size:
+                return
+            for offset in range(0, len(data) - RECORD.size + 1, RECORD.size):
+                t = RECORD.unpack_from(data, offset)[0]
+                if start is not None and t < start:
+                    continue
+                if end is not None and t >= end:
+                    return
+                yield unpack(data, offset)
+
+# notes of a recording, oldest first, optionally only those of one kind
+def notes(path, kind = None):
+    if not os.path.exists(path + '.notes'):
+        return
+    with open(path + '.notes') as file:
+        for line in file:
+            try:
+                note = json.loads(line)
+            except ValueError: # torn by a crash
+                continue
+            if kind is None or note.get('kind') == kind:
+                yield note
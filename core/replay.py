@@ -0,0 +1,74 @@
+import time
+import threading
+from core import recorder
+
+# +RCV= line for a received record
+def rcvLine(r):
+    return ('+RCV=' + str(r.address) + ',' + str(len(r.payload)) + ',' + r.payload + ',' + str(r.rssi) + ',' + \
+        str(r.snr) + '\r\n').encode('Ascii')
+
+# serial port stand-in that plays back the +RCV= lines of a recording
+# speed is a multiple of real time, 0 plays as fast as the station reads
+class ReplayPort:
+    def __init__(self, path, speed = 1.0, start = None, end = None, timeout = 2):
+        records = [r for r in recorder.read(path, start, end) if r.direction == recorder.RX and r.payload]
+        self.lines = [rcvLine(r) for r in records]
+        self.times = [r.time for r in records]
+        self.speed = speed
+        self.timeout = timeout
+        self.port = 'replay:' + path
+        self.is_open = True
+        self.fed = 0 # lines handed to the reader so far
+        self.written = 0 # bytes the station sent
+        self.buf = bytearray()
+        self.cancelled = False
+        self.cond = threading.Condition()
+        self.closed = threading.Event()
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        self.thread.start()
+    # feed lines on the recorded schedule
+    def run(self):
+        start = time.monotonic()
+        for i, line in enumerate(self.lines):
+            if self.speed > 0:
+                delay = (self.times[i] - self.times[0]) / 1e9 / self.speed - (time.monotonic() - start)
+                if delay > 0 and self.closed.wait(delay):
+                    return
+            if self.closed.is_set():
+                return
+            with self.cond:
+                self.buf += line
+                self.fed += 1
+                self.cond.notify_all()
+    # bytes ready to read
+    @property
+    def in_waiting(self):
+        return len(self.buf)
+    # same blocking behaviour as serial.Serial.read
+    def read(self, size = 1):
+        with self.cond:
+            self.cond.wait_for(lambda: self.buf or self.cancelled or not self.is_open, self.timeout)
+            self.cancelled = False
+            data = bytes(self.buf[:size])
+            del self.buf[:size]
+            return data
+    # answer every AT command with +OK, like a modem that accepts everything
+    def write(self, data):
+        self.written += len(data)
+        replies = b''.join(b'+OK\r\n' for line in data.split(b'\r\n') if line.startswith(b'AT'))
+        if replies:
+            with self.cond:
+                self.buf += replies
+                self.cond.notify_all()
+        return len(data)
+    # wake a blocked read
+    def cancel_read(self):
+        with self.cond:
+            self.cancelled = True
+            self.cond.notify_all()
+    # stop playback
+    def close(self):
+        self.closed.set()
+        with self.cond:
+            self.is_open = False
+            self.cond.notify_all()
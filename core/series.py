@@ -0,0 +1,110 @@
+import threading
+import numpy
+
+CAPACITY = 20000 # samples kept per series, the oldest are overwritten so memory stays fixed at 12 bytes a sample
+
+# fixed size circular buffer of (time, value) samples in preallocated arrays, times are float64 seconds and values float32
+class Ring:
+    def __init__(self, capacity = CAPACITY):
+        self.t = numpy.zeros(capacity)
+        self.v = numpy.zeros(capacity, numpy.float32)
+        self.head = 0 # slot the next sample goes in
+        self.count = 0 # samples held
+        self.total = 0 # samples ever added
+    # add one sample
+    def append(self, t, v):
+        self.t[self.head] = t
+        self.v[self.head] = v
+        self.head = (self.head + 1) % len(self.t)
+        self.count = min(self.count + 1, len(self.t))
+        self.total += 1
+    # add many samples at once, e.g. from a recording
+    def extend(self, t, v):
+        added = len(t)
+        if added > len(self.t): # only the newest samples fit, they go where they would have after a wrap
+            self.head = (self.head + added - len(self.t)) % len(self.t)
+        t, v = numpy.asarray(t, dtype = float)[-len(self.t):], numpy.asarray(v, dtype = numpy.float32)[-len(self.t):]
+        n = len(t)
+        first = min(n, len(self.t) - self.head) # up to the end of the arrays, the rest wraps to the start
+        self.t[self.head:self.head + first], self.v[self.head:self.head + first] = t[:first], v[:first]
+        self.t[:n - first], self.v[:n - first] = t[first:], v[first:]
+        self.head = (self.head + n) % len(self.t)
+        self.count = min(self.count + n, len(self.t))
+        self.total += added
+    # copies of the samples from time start on, oldest first
+    def arrays(self, start = None):
+        if self.count < len(self.t):
+            t, v = self.t[:self.count].copy(), self.v[:self.count].copy()
+        else:
+            t = numpy.concatenate((self.t[self.head:], self.t[:self.head]))
+            v = numpy.concatenate((self.v[self.head:], self.v[:self.head]))
+        if start is not None:
+            i = numpy.searchsorted(t, start)
+            t, v = t[i:], v[i:]
+        return t, v
+
+# at most 2 * buckets points that keep the lowest and highest sample of each time bucket, so spikes stay visible
+def downsample(t, v, buckets):
+    if len(t) <= 2 * buckets:
+        return t, v
+    span = t[-1] - t[0]
+    if span > 0:
+        bucket = numpy.minimum(((t - t[0]) * (buckets / span)).astype(int), buckets - 1)
+    else:
+        bucket = numpy.arange(len(t)) * buckets // len(t)
+    starts = numpy.flatnonzero(numpy.diff(bucket, prepend = -1))
+    ends = numpy.append(starts[1:], len(t)) - 1
+    ts = numpy.empty(2 * len(starts))
+    vs = numpy.empty(2 * len(starts), v.dtype)
+    ts[0::2], ts[1::2] = t[starts], t[ends]
+    vs[0::2], vs[1::2] = numpy.minimum.reduceat(v, starts), numpy.maximum.reduceat(v, starts)
+    return ts, vs
+
+# telemetry history per rover, one Ring per (address, name), written by the connection thread and read for plots
+# categorical values like the rover state are stored as their index in labels, kept under the same lock
+class Store:
+    def __init__(self, capacity = CAPACITY):
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.rings = {} # (address, name) -> Ring
+        self.labels = [] # names of categorical values such as rover states, a series of them holds the index
+    # add a sample to a series, created on first use
+    def append(self, address, name, t, v):
+        with self.lock:
+            ring = self.rings.get((address, name))
+            if ring is None:
+                ring = self.rings[(address, name)] = Ring(self.capacity)
+            ring.append(t, v)
+    # add many samples to a series
+    def extend(self, address, name, t, v):
+        with self.lock:
+            ring = self.rings.get((address, name))
+            if ring is None:
+                ring = self.rings[(address, name)] = Ring(self.capacity)
+            ring.extend(t, v)
+    # samples of a series from time start on, reduced to about 2 * buckets points if buckets is given
+    def window(self, address, name, start = None, buckets = None):
+        with self.lock:
+            ring = self.rings.get((address, name))
+            if ring is None:
+                return numpy.zeros(0), numpy.zeros(0)
+            t, v = ring.arrays(start)
+        return (t, v) if buckets is None else downsample(t, v, buckets)
+    # index of a categorical value, added on first use
+    def label(self, text):
+        with self.lock:
+            if text not in self.labels: self.labels.append(text)
+            return self.labels.index(text)
+    # (index, name) of every categorical value, for axis ticks
+    def ticks(self):
+        with self.lock:
+            return list(enumerate(self.labels))
+    # forget every series
+    def clear(self):
+        with self.lock:
+            self.rings = {}
+            self.labels = []
+    # bytes held by the buffers
+    def nbytes(self):
+        with self.lock:
+            return sum(ring.t.nbytes + ring.v.nbytes for ring in self.rings.values())
@@ -0,0 +1,278 @@
+import os
+import tty
+import time
+import heapq
+import random
+import select
+import argparse
+import threading
+from math import cos, sin, pi
+from core import codec
+from core import airtime as lora
+
+# simulated RYLR896 on a pseudo-terminal with scripted rovers on the other end of the link
+class Simulator:
+    def __init__(self, airtime = None, loss = 0.0, reorder = 0.0, rssi = (-80, -30), snr = (5, 12), seed = None,
+            rover = 102, origin = (28.6024, -81.2001), speed = 1.0, delay = 0.05, rovers = 1, window = 1,
+            codec = 0):
+        self.airtime = airtime # seconds on air per frame, None for the LoRa time on air with the modem's parameters
+        self.loss = loss # probability a frame is lost
+        self.reorder = reorder # probability a frame is held back behind later ones
+        self.rssi = rssi
+        self.snr = snr
+        self.random = random.Random(seed)
+        self.delay = delay # rover processing time
+        self.settings = {'BAND': '915000000', 'NETWORKID': '5', 'ADDRESS': '101', 'PARAMETER': '12,7,1,4', 'IPR': '115200'}
+        # rovers at consecutive addresses, each circling its own point 200 m north of the previous one
+        self.rovers = {rover + i: Rover(self, rover + i, (origin[0] + i * 200 / 111320.0, origin[1]), speed, window, codec) for i in range(rovers)}
+        self.rover = self.rovers[rover]
+        self.events = [] # (time, order, callback)
+        self.order = 0
+        self.busy = {} # sender -> time its radio is free
+        self.cond = threading.Condition()
+        self.running = False
+        self.stats = {'sent': 0, 'lost': 0, 'delivered': 0}
+        self.answered = 0 # time the answer to the last command goes out
+    # open the pty and start the modem, returns the device path
+    def start(self):
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False) # a station that is not reading must not stall the simulation
+        self.port = os.ttyname(self.slave)
+        self.running = True
+        self.threads = [threading.Thread(target = self.modem, daemon = True), threading.Thread(target = self.schedule, daemon = True)]
+        for t in self.threads: t.start()
+        for r in self.rovers.values(): r.start()
+        return self.port
+    # stop and close the pty
+    def stop(self):
+        self.running = False
+        with self.cond:
+            self.cond.notify_all()
+        for t in self.threads: t.join()
+        os.close(self.master)
+        os.close(self.slave)
+    # run callback after delay seconds
+    def at(self, delay, callback):
+        self.when(time.monotonic() + delay, callback)
+    # run callback at time t of time.monotonic(), callbacks for the same time run in the order they were added
+    def when(self, t, callback):
+        with self.cond:
+            self.order += 1
+            heapq.heappush(self.events, (t, self.order, callback))
+            self.cond.notify_all()
+    # event loop for timed deliveries
+    def schedule(self):
+        while self.running:
+            with self.cond:
+                while self.running and (not self.events or self.events[0][0] > time.monotonic()):
+                    self.cond.wait(self.events[0][0] - time.monotonic() if self.events else None)
+                if not self.running:
+                    return
+                callback = heapq.heappop(self.events)[2]
+            callback()
+    # seconds on air for a payload
+    def frameTime(self, data):
+        if self.airtime is not None:
+            return self.airtime
+        try:
+            sf, bw, cr, preamble = (int(v) for v in self.settings['PARAMETER'].split(','))
+            return lora.timeOnAir(len(data), sf, lora.BANDWIDTHS[bw], cr, preamble)
+        except (ValueError, IndexError, ZeroDivisionError): # parameters the real modem would have refused
+            return 0.1
+    # put a frame on the air, sender's radio is busy until it finishes
+    def transmit(self, sender, data, deliver):
+        onAir = self.frameTime(data)
+        with self.cond:
+            now = time.monotonic()
+            start = max(now, self.busy.get(sender, now))
+            self.busy[sender] = start + onAir
+            self.stats['sent'] += 1
+            if self.random.random() < self.loss:
+                self.stats['lost'] += 1
+                return
+            delay = start + onAir - now
+            if self.random.random() < self.reorder:
+                delay += onAir * self.random.uniform(1, 3)
+        def arrive():
+            self.stats['delivered'] += 1
+            deliver()
+        self.at(delay, arrive)
+    # bytes to the ground station
+    def reply(self, text):
+        try:
+            os.write(self.master, (text + '\r\n').encode('Ascii'))
+        except OSError:
+            pass
+    # frame from the rover reaches the ground station modem
+    def receive(self, address, data):
+        self.reply('+RCV=' + str(address) + ',' + str(len(data)) + ',' + data + ',' + str(self.random.randint(*self.rssi)) + ',' + \
+            str(self.random.randint(*self.snr)))
+    # read AT commands from the pty
+    def modem(self):
+        buf = bytearray()
+        while self.running:
+            if not select.select([self.master], [], [], 0.2)[0]:
+                continue
+            try:
+                buf += os.read(self.master, 1024)
+            except OSError:
+                return
+            end = buf.find(b'\r\n')
+            while end != -1:
+                self.command(buf[:end].decode('Ascii', 'replace'))
+                del buf[:end + 2]
+                end = buf.find(b'\r\n')
+    # answer a command after delay seconds, the modem works through commands one at a time so never before the answers to
+    # the commands before it
+    def answer(self, text, delay = 0):
+        with self.cond:
+            self.answered = max(time.monotonic() + delay, self.answered)
+            self.when(self.answered, lambda: self.reply(text))
+    # answer one AT command
+    def command(self, c):
+        if c == 'AT':
+            self.answer('+OK')
+        elif c == 'AT+VER?':
+            self.answer('+VERSION=RYLR89C_V1.2.7')
+        elif c == 'AT+UID?':
+            self.answer('+UID=000000000000000000000000')
+        elif c[:3] == 'AT+' and c[-1] == '?' and c[3:-1] in self.settings:
+            self.answer('+' + c[3:-1] + '=' + self.settings[c[3:-1]])
+        elif c[:8] == 'AT+SEND=':
+            try:
+                address, length, data = c[8:].split(',', 2)
+                data = data[:int(length)]
+            except ValueError:
+                self.answer('+ERR=5')
+                return
+            for r in self.rovers.values():
+                if int(address) in (0, r.address):
+                    self.transmit('station', data, lambda r = r: r.receive(data))
+            with self.cond:
+                done = self.busy.get('station', 0) - time.monotonic()
+            self.answer('+OK', done) # the modem answers once the frame is off the air
+        elif c[:3] == 'AT+' and '=' in c and c[3:c.index('=')] in self.settings:
+            self.settings[c[3:c.index('=')]] = c[c.index('=') + 1:]
+            self.answer('+OK')
+        else:
+            self.answer('+ERR=4')
+
+# rover side of the SYN/ACK/FIN exchange, answers each frame with seq = its ack and ack = its seq + 1
+# offered a window > 1 it asks for a sliding window in its SYN, and if the station agrees it numbers its own frames
+# and answers with a cumulative ack plus +S for frames held beyond a gap
+class Rover:
+    def __init__(self, sim, address, origin, speed, window = 1, codec = 0):
+        self.sim = sim
+        self.address = address
+        self.origin = origin
+        self.speed = speed # metres per second around a 50 m circle
+        self.last = None # last frame sent, resent if the station goes quiet
+        self.lastTime = 0
+        self.started = time.monotonic()
+        self.commands = [] # commands received from the station
+        self.closing = False # FIN sent, waiting for the last ACK
+        self.window = window # offered in the SYN
+        self.agreed = 1 # window the station answered with
+        self.seq = 0 # next own seq, sliding window only
+        self.expected = 0 # next station seq
+        self.held = {} # station seq -> command (or None) received beyond a gap, delivered once the gap fills
+        self.codec = codec # compact payload version offered in the SYN
+        self.version = 0 # compact payload version the station answered with
+    # open the connection
+    def start(self):
+        self.send('0 0 SYN' + (' +W' + str(self.window) if self.window > 1 else '') + (' +C' + str(self.codec) if self.codec else ''))
+        self.sim.at(0, self.watchdog)
+    # send a frame to the station
+    def send(self, data):
+        self.last = data
+        self.lastTime = time.monotonic()
+        self.sim.transmit(self.address, data, lambda: self.sim.receive(self.address, data))
+    # resend the last frame when the station has not answered within a few airtimes
+    def watchdog(self):
+        if not self.sim.running:
+            return
+        wait = 4 * self.sim.frameTime(self.last or '') + 1
+        if self.last and time.monotonic() - self.lastTime > wait:
+            self.send(self.last)
+        self.sim.at(wait / 2, self.watchdog)
+    # telemetry 'state x y z lat long alt' for the current time
+    def telemetry(self):
+        t = time.monotonic() - self.started
+        a = t * self.speed / 50
+        x, y = 50 * cos(a), 50 * sin(a)
+        lat = self.origin[0] + y / 111320.0
+        long = self.origin[1] + x / (111320.0 * cos(self.origin[0] * pi / 180))
+        return 'DRIVING ' + str(round(x, 2)) + ' ' + str(round(y, 2)) + ' 0.0 ' + str(round(lat, 7)) + ' ' + str(round(long, 7)) + ' 12.0'
+    # frame from the station
+    def receive(self, data):
+        try:
+            fields = codec.fields(data)
+        except ValueError:
+            return
+        opts = {}
+        while fields and fields[-1][:1] == '+':
+            token = fields.pop()
+            opts[token[1:2]] = token[2:]
+        try:
+            seq, ack = int(fields[0]), int(fields[1])
+        except (IndexError, ValueError):
+            return
+        kind = fields[2] if len(fields) > 2 else ''
+        command = ' '.join(fields[3:]) if kind == 'CMD' else None
+        if command and self.agreed == 1:
+            self.commands.append(command)
+        if self.closing:
+            self.closing = False
+            self.last = None # connection closed, stay quiet
+            return
+        if kind == 'SYN':
+            reply = 'ACK'
+        elif kind == 'FIN':
+            reply = 'FIN'
+            self.closing = True
+        else:
+            reply = 'ACK ' + self.telemetry()
+        if kind == 'SYN':
+            self.agreed = int(opts.get('W', 1))
+            self.version = int(opts.get('C', 0))
+            self.seq = ack
+            self.expected = seq + 1
+            self.held = {}
+        elif self.agreed > 1:
+            if seq == self.expected:
+                self.held[seq] = command
+                while self.expected in self.held: # deliver in order
+                    command = self.held.pop(self.expected)
+                    if command: self.commands.append(command)
+                    self.expected += 1
+            elif seq > self.expected:
+                self.held[seq] = command
+        if self.agreed > 1:
+            response = str(self.seq) + ' ' + str(self.expected) + ' ' + reply + \
+                (' +S' + ','.join(str(s) for s in sorted(self.held)) if self.held else '')
+            self.seq += 1
+        else:
+            response = str(ack) + ' ' + str(seq + 1) + ' ' + reply
+        response = codec.pack(response, self.version)
+        self.sim.at(self.sim.delay, lambda: self.send(response))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Simulated RYLR896 LoRa modem with a scripted rover')
+    parser.add_argument('--airtime', type = float, default = None, help = 'seconds on air per frame (default: from the LoRa parameters)')
+    parser.add_argument('--loss', type = float, default = 0.0, help = 'probability a frame is lost')
+    parser.add_argument('--reorder', type = float, default = 0.0, help = 'probability a frame is delayed behind later ones')
+    parser.add_argument('--seed', type = int, default = None, help = 'random seed')
+    parser.add_argument('--rover', type = int, default = 102, help = 'rover address')
+    parser.add_argument('--rovers', type = int, default = 1, help = 'number of rovers, at consecutive addresses')
+    parser.add_argument('--window', type = int, default = 1, help = 'sliding window the rovers offer, 1 is stop-and-wait')
+    parser.add_argument('--codec', type = int, default = 0, help = 'compact payload version the rovers offer, 0 is text only')
+    args = parser.parse_args()
+    sim = Simulator(args.airtime, args.loss, args.reorder, seed = args.seed, rover = args.rover, rovers = args.rovers,
+        window = args.window, codec = args.codec)
+    print(sim.start(), flush = True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        sim.stop()
@@ -0,0 +1,660 @@
+import os
+import time
+import threading
+import concurrent.futures
+import collections
+import serial
+from core import recorder
+from core import replay
+from core import codec
+from core import airtime
+from core import commands
+from core import analytics
+from core import geofence
+from core import mission
+from core import linkstats
+from core import metrics
+from core.link import Link, LoraMessage, SendDone, LinkError
+
+# settings as typed into the Settings tab, AT commands are built from these strings
+DEFAULTS = {
+    'baudrate': '115200', # serial port
+    'bytesize': '8',
+    'timeout': '2',
+    'spreadingFactor': '12', # LoRa
+    'bandwidth': '7',
+    'codingRate': '2',
+    'preamble': '5',
+    'gsAddress': '101',
+    'roverAddress': '102',
+    'networkID': '5',
+    'band': '915000000',
+    'uart': '115200',
+    'window': '1', # frames in flight per rover, 1 is stop-and-wait
+    'rto': '3', # retransmission timeout in seconds until a round trip has been measured
+    'retries': '5', # retransmissions of one frame before the rover is given up
+    'codec': '1', # compact payload version to offer, 0 keeps every frame in text
+    'dutyCycle': 'auto', # percent of the time the radio may transmit, auto is the limit of the band
+    'fenceAction': 'cancel', # none, cancel or shutdown, queued for a rover that breaches a geofence
+}
+
+CLOSED = 'Link closed' # reply text of a command the link was closed before it was answered
+
+# (ok, text) reply of a finished AT request: the answer without its '+', or why there is none
+def reply(future):
+    if future.cancelled():
+        return False, CLOSED
+    if future.exception():
+        return False, 'No response'
+    line = future.result()
+    if line[:5] == '+ERR=':
+        return False, line[1:]
+    if line[:1] != '+':
+        return False, 'Invalid response ' + line
+    return True, line[1:]
+
+# call done with the replies of several AT requests once all of them finished
+def gather(futures, done):
+    replies = [None] * len(futures)
+    left = [len(futures)]
+    lock = threading.Lock()
+    def finished(i, future):
+        replies[i] = reply(future)
+        with lock:
+            left[0] -= 1
+            last = left[0] == 0
+        if last: done(replies)
+    for i, future in enumerate(futures):
+        future.add_done_callback(lambda future, i = i: finished(i, future))
+
+MIN_RTO = 0.2 # seconds
+MAX_RTO = 60.0
+SNAPSHOT = 10.0 # seconds between link statistics notes in the recording
+
+TRANSITIONS = metrics.counter('gs_state_transitions_total', 'Session and link state changes by new state', ['state'])
+RETRANSMITS = metrics.counter('gs_retransmits_total', 'Frames sent again by reason', ['reason'])
+
+# trailing '+X<value>' tokens are options: +W window size and +C codec version in a SYN, +S selective acks in an ACK
+# they are taken off data, rovers that do not know about them never send any
+def options(data):
+    opts = {}
+    while data and data[-1][:1] == '+':
+        token = data.pop()
+        opts[token[1:2]] = token[2:]
+    return opts
+
+# decimal digits only, what int() of a seq, ack or numeric option needs
+def number(text):
+    return text.isascii() and text.isdigit()
+
+# seq, ack and the numeric options of a received frame can be read, a frame failing this is dropped like one the codec
+# can not decode so a malformed frame from one rover can not take the connection thread down
+def wellFormed(data, opts):
+    return number(data[0]) and number(data[1]) and all(number(opts[k]) for k in 'WC' if k in opts) and \
+        all(number(seq) for seq in opts.get('S', '').split(',') if seq)
+
+# a frame waiting for its acknowledgement
+class Frame:
+    def __init__(self, msg, rto):
+        self.msg = msg
+        self.sent = time.monotonic()
+        self.deadline = self.sent + rto
+        self.tries = 0 # retransmissions, a resent frame gives no RTT sample (Karn)
+        self.command = '' # 'CMD ...' the frame carries, or SYN/ACK/FIN
+
+# one rover on the shared radio: its SYN/ACK/FIN state, sequence numbers, command queue and position
+class Session:
+    def __init__(self, address, rto = 3.0):
+        self.address = address
+        self.connectionState = 'LISTEN'
+        self.seqNum = 0
+        self.ackNum = 0
+        self.commandBuf = commands.CommandQueue() # commands by priority, stale drive commands replaced
+        self.outbox = collections.deque() # frames waiting for the radio
+        self.lastMsg = '' # last msg sent to this rover
+        self.closeFlag = 0
+        self.message = LoraMessage('NA', 'NA', 'NA', 'NA', 'NA') # last message from this rover
+        self.coordinate = [0, 0]
+        self.originalCoordinate = [0, 0]
+        self.window = 1 # frames in flight, agreed in the SYN exchange
+        self.codec = 0 # compact payload version, agreed in the SYN exchange
+        self.inflight = {} # seq -> Frame not acknowledged yet, at most one outside the sliding window
+        self.srtt = None # smoothed round trip time, seconds
+        self.rttvar = 0.0 # round trip time variation
+        self.rto = rto # retransmission timeout
+        self.retransmits = 0
+        self.timeouts = 0
+        self.track = analytics.TrackStats() # path length, speed, heading, climb and ETA from the fixes
+        self.fences = [] # names of the geofences the rover is breaching
+        self.quality = linkstats.LinkStats() # delivery, retransmissions, RTT and signal over sliding windows
+
+# ground station without a GUI: LoRa link, a SYN/ACK/FIN session per rover address, command queues and telemetry log
+# listeners are called as fn(event, *args), from the connection thread for protocol events:
+#   'session' (new Session)               'state' (Session or None for the link, state, style class)
+#   'sent' (Session, AT+SEND string)      'received' (Session or None, LoraMessage)
+#   'status' (Session, text, style class) 'telemetry' (Session, payload fields)
+#   'position' (Session, False for the first fix)                'lock' (Session)
+#   'closed' (Session)                    'timing' (Session, after its RTT, RTO or retransmits changed)
+#   'queue' (Session, after a command was queued or sent)
+#   'message' (title, text, 'OK'/'ERROR') 'response' (answer to a custom AT command)
+#   'lora' (title, text, 'OK'/'ERROR' result of AT commands, from the link's threads)
+#   'ready' (True if LoRa answered after open)
+#   'airtime' (Scheduler, after the modem answered an AT+SEND)
+#   'fence' (Session, names of the geofences it breaches, empty once it is clear of them)
+#   'mission' (Session, Mission, after a mission was queued or the rover acknowledged one of its chunks)
+class Station:
+    def __init__(self, logPath = 'logs/telemetry.bin'):
+        self.settings = dict(DEFAULTS)
+        self.link = Link()
+        self.listeners = []
+        self.connectionThread = threading.Thread()
+        self.sessions = {} # rover address -> Session
+        self.ready = collections.deque() # sessions with frames waiting, in turn order
+        self.scheduler = airtime.Scheduler() # paces AT+SEND by airtime and duty cycle
+        self.geofence = geofence.Geofence() # keep-out zones and operating boundaries, checked on every fix
+        self.missions = {} # rover address -> Mission being uploaded or uploaded last, kept across reconnects
+        self.connectionState = 'CLOSED' # of the link, each rover has its own in its session
+        self.loraCommands = ['AT\r\n', 'AT+VER?\r\n', 'AT+UID?\r\n', 'AT+BAND?\r\n', 'AT+NETWORKID?\r\n',
+            'AT+ADDRESS?\r\n', 'AT+PARAMETER?\r\n', 'AT+IPR?\r\n']
+        self.connected = False # serial connection state
+        if os.path.dirname(logPath) and not os.path.exists(os.path.dirname(logPath)): os.makedirs(os.path.dirname(logPath))
+        self.logPath = logPath
+        self.telemetryLog = recorder.Recorder(logPath) # binary log of everything sent and received
+        self.liveLog = self.telemetryLog
+        self.replaying = False # port is a ReplayPort
+        self.replayTotal = 0
+        self.rxCount = 0 # messages handled this session
+        self.rxStart = 0 # when this session started
+        self.snapshotTime = 0 # when link statistics were last noted in the recording
+        metrics.gauge('gs_sessions', 'Rovers with a session', fn = lambda: len(self.sessions))
+        metrics.gauge('gs_command_queue_depth', 'Commands waiting per rover', ['rover'],
+            lambda: {(str(address),): session.commandBuf.qsize() for address, session in list(self.sessions.items())})
+    # register an event listener
+    def listen(self, fn):
+        self.listeners.append(fn)
+    # notify listeners
+    def emit(self, event, *args):
+        for fn in self.listeners:
+            fn(event, *args)
+    # open a serial port by name and connect
+    def openSerial(self, name, configure = True):
+        port = serial.Serial(port = name, baudrate = int(self.settings['baudrate']), bytesize = int(self.settings['bytesize']), \
+            timeout = int(self.settings['timeout']), stopbits = serial.STOPBITS_ONE)
+        return self.open(port, configure)
+    # play a recording back through the state machine, speed 0 is as fast as possible
+    def openReplay(self, path, speed = 1.0):
+        port = replay.ReplayPort(path, speed)
+        self.telemetryLog = recorder.Recorder(os.path.join(os.path.dirname(self.logPath), 'replay.bin')) # keep the mission log clean
+        self.replaying = True
+        self.replayTotal = len(port.lines)
+        return self.open(port, False)
+    # start the link and state machine on an open port, returns a future that is True once LoRa answered (see initLora)
+    def open(self, port, configure = True):
+        self.connectionThread = threading.Thread(target = self.connection, args = [port], daemon = True)
+        self.rxCount = 0
+        self.rxStart = time.perf_counter()
+        self.sessions = {}
+        self.ready.clear()
+        self.scheduler = airtime.Scheduler()
+        self.changeState(None, 'LISTEN', 'warning')
+        self.connected = True
+        self.link.open(port)
+        self.connectionThread.start()
+        return self.initLora(configure)
+    # stop the state machine and link
+    def stop(self):
+        self.connected = False
+        if self.connectionThread.ident: self.connectionThread.join()
+        self.link.close()
+        for session in self.sessions.values():
+            self.noteQuality(session)
+        if self.replaying:
+            self.telemetryLog.close()
+            self.telemetryLog = self.liveLog
+            self.replaying = False
+        for session in self.sessions.values():
+            self.changeState(session, 'CLOSED', 'danger')
+        self.sessions = {}
+        self.ready.clear()
+        self.changeState(None, 'CLOSED', 'danger')
+    # stop everything and close the log
+    def shutdown(self):
+        if self.connected: self.stop()
+        self.telemetryLog.close()
+    # check that LoRa answers, emits 'ready' and configures it if asked, returns a future that is True if it answered
+    def initLora(self, configure = False):
+        result = concurrent.futures.Future()
+        def checked(replies):
+            ok, text = replies[0]
+            if not ok and text != CLOSED:
+                self.emit('lora', 'ERROR', 'ERROR: LoRa did not answer AT: ' + text, 'ERROR')
+            if text != CLOSED:
+                self.emit('ready', ok)
+            if ok and configure:
+                self.setAll()
+            result.set_result(ok)
+        self.commands([self.loraCommands[0]], checked)
+        return result
+    # request information about LoRa
+    def loraTest(self):
+        if self.connected == False:
+            self.emit('lora', 'ERROR', 'ERROR: Serial connection not established.', 'ERROR')
+            return
+        def answered(replies):
+            if any(text == CLOSED for ok, text in replies):
+                return
+            text = '\n'.join(text if ok else c.strip() + ': ' + text for c, (ok, text) in zip(self.loraCommands[1:], replies[1:]))
+            self.emit('lora', 'LoRa Info', text, 'OK' if all(ok for ok, text in replies) else 'ERROR')
+        self.commands(self.loraCommands, answered)
+    # set LoRa parameters
+    def setParams(self):
+        cs = ['AT+PARAMETER=' + self.settings['spreadingFactor'] + ',' + self.settings['bandwidth'] + ',' + \
+            self.settings['codingRate'] + ',' + self.settings['preamble'] + '\r\n']
+        if self.connected == False:
+            self.emit('lora', 'ERROR', 'ERROR: Serial connection not established.', 'ERROR')
+            return
+        self.commands(cs, lambda replies: self.report(cs, replies, 'Parameters set'))
+    # set all LoRa settings, pipelined in this order
+    def setAll(self):
+        cs = ['AT+PARAMETER=' + self.settings['spreadingFactor'] + ',' + self.settings['bandwidth'] + ',' + \
+            self.settings['codingRate'] + ',' + self.settings['preamble'] + '\r\n', 'AT+IPR=' + self.settings['uart'] + '\r\n',
+            'AT+BAND=' + self.settings['band'] + '\r\n', 'AT+NETWORKID=' + self.settings['networkID'] + '\r\n',
+            'AT+ADDRESS=' + self.settings['gsAddress'] + '\r\n']
+        if self.connected == False:
+            self.emit('lora', 'ERROR', 'ERROR: Serial connection not established.', 'ERROR')
+            return
+        self.commands(cs, lambda replies: self.report(cs, replies, 'Everything set'))
+    # one 'lora' event for the replies to pipelined commands
+    def report(self, cs, replies, success):
+        failed = [c.strip() + ': ' + text for c, (ok, text) in zip(cs, replies) if not ok]
+        if any(text == CLOSED for ok, text in replies):
+            return
+        elif failed:
+            self.emit('lora', 'ERROR', 'ERROR: ' + '\n'.join(failed), 'ERROR')
+        else:
+            self.emit('lora', ' ', success, 'OK')
+    # send command to LoRa
+    def sendCommand(self, c):
+        self.link.send(c)
+    # send an AT command without waiting, returns the future of the modem's answer line
+    def command(self, c, timeout = 5.0):
+        return self.link.command(c, timeout)
+    # pipeline AT commands, done gets their (ok, text) replies in order once all were answered or timed out
+    # it runs on the link's reader or a timeout thread, so it must only emit events or queue more commands
+    def commands(self, cs, done, timeout = 5.0):
+        gather([self.command(c, timeout) for c in cs], done)
+    # send custom command to LoRa, the answer comes as a 'response' event
+    def sendCustomCommand(self, c):
+        if self.connected == False:
+            self.emit('lora', 'ERROR', 'ERROR: Serial connection not established.', 'ERROR')
+            return
+        self.commands([c], lambda replies: self.emit('response', replies[0][1]) if replies[0][1] != CLOSED else None)
+    # session for a rover address, the Rover Address setting if none is given
+    def session(self, address = None):
+        return self.sessions.get(int(self.settings['roverAddress'] if address is None else address))
+    # create tx msg, option 1 is BD, 2 MAN1 and 3 MAN2, False if it was refused and not queued
+    def createTx(self, data, option, address = None):
+        if option not in (1, 2, 3):
+            raise ValueError('unknown command option: ' + str(option))
+        session = self.session(address)
+        if session is None:
+            self.emit('message', 'ERROR', 'ERROR: No connection with rover ' + \
+                str(self.settings['roverAddress'] if address is None else address) + '.', 'ERROR')
+            return False
+        if option == 1:
+            msg = 'CMD BD ' + data
+            try:
+                breached = self.geofence.check([float(d) for d in data.split(' ')])
+            except (ValueError, IndexError):
+                breached = []
+            if breached:
+                self.emit('message', 'ERROR', 'ERROR: Destination breaches geofence ' + \
+                    ', '.join(sorted({f.name for f in breached})) + '.', 'ERROR')
+                return False
+            try:
+                session.track.destination = [float(d) for d in data.split(' ')]
+            except ValueError:
+                session.track.destination = None
+        elif option == 2:
+            msg = 'CMD MAN1 ' + data
+            session.track.destination = None
+        elif option == 3:
+            msg = 'CMD MAN2 ' + data
+            session.track.destination = None
+        session.commandBuf.put(msg)
+        self.emit('queue', session)
+        return True
+    # command tx format
+    def cmdTx(self, session):
+        self.msgTx(session, session.commandBuf.get())
+        self.emit('queue', session)
+    # msg tx format
+    def msgTx(self, session, c):
+        msg = codec.pack(str(session.seqNum) + ' ' + str(session.ackNum) + ' ' + c, session.codec)
+        self.telemetryLog.record(recorder.TX, session.address, msg)
+        msg = 'AT+SEND=' + str(session.address) + ',' + str(len(msg)) + ',' + msg + '\r\n'
+        session.lastMsg = msg
+        self.emit('sent', session, msg)
+        self.queueTx(session, msg)
+        session.inflight[session.seqNum] = Frame(msg, session.rto)
+        session.inflight[session.seqNum].command = c
+        session.quality.sent(time.monotonic())
+        if session.window > 1: # every frame takes a seq and stays in flight until acknowledged
+            session.seqNum += 1
+    # put a frame back on the air, its timer restarts with the current RTO
+    def resend(self, session, frame, reason):
+        frame.tries += 1
+        frame.deadline = time.monotonic() + session.rto
+        session.retransmits += 1
+        session.quality.retransmitted(time.monotonic())
+        RETRANSMITS.inc(1, reason)
+        self.emit('sent', session, frame.msg)
+        self.emit('status', session, reason + ': Retransmitting', 'danger')
+        self.telemetryLog.record(recorder.TX, session.address, frame.msg.split(',', 2)[2][:-2])
+        self.queueTx(session, frame.msg)
+        self.emit('timing', session)
+    # a frame was acknowledged by the reply to it, update the RTT estimate (Jacobson) unless it was resent (Karn)
+    def acked(self, session, frame):
+        if frame.tries:
+            return
+        r = time.monotonic() - frame.sent
+        session.quality.roundTrip(time.monotonic(), r)
+        if session.srtt is None:
+            session.srtt = r
+            session.rttvar = r / 2
+        else:
+            session.rttvar = 0.75 * session.rttvar + 0.25 * abs(session.srtt - r)
+            session.srtt = 0.875 * session.srtt + 0.125 * r
+        session.rto = min(MAX_RTO, max(MIN_RTO, session.srtt + 4 * session.rttvar))
+        self.emit('timing', session)
+    # the rover answered everything in flight
+    def ackAll(self, session):
+        if session.inflight:
+            self.acked(session, session.inflight[max(session.inflight)])
+            self.delivered(session, session.inflight.values())
+            session.inflight.clear()
+    # frames the rover acknowledged, mission chunks among them count towards the upload
+    def delivered(self, session, frames):
+        frames = list(frames)
+        session.quality.delivered(time.monotonic(), len(frames))
+        plan = self.missions.get(session.address)
+        if plan is None:
+            return
+        chunks = [frame.command[4:] for frame in frames if frame.command[:7] == 'CMD WP ']
+        if [c for c in chunks if plan.ack(c)]: # every chunk is marked before the event
+            self.emit('mission', session, plan)
+    # resend frames whose timer ran out, the RTO doubles on each timeout and a rover that stays silent is dropped
+    def expire(self):
+        now = time.monotonic()
+        for session in list(self.sessions.values()):
+            expired = [frame for frame in session.inflight.values() if frame.deadline <= now]
+            if not expired:
+                continue
+            if max(frame.tries for frame in expired) >= int(self.settings['retries']):
+                self.emit('status', session, 'No response: Connection lost', 'danger')
+                self.changeState(session, 'CLOSED', 'danger')
+                del self.sessions[session.address]
+                self.noteQuality(session)
+                self.purge(session)
+                self.emit('closed', session)
+                continue
+            session.timeouts += 1
+            session.quality.timedOut(now)
+            session.rto = min(MAX_RTO, session.rto * 2)
+            for frame in expired:
+                self.resend(session, frame, 'Timeout')
+    # forget the queued frames and commands of a rover the station gave up on, so nothing more goes on the air for it
+    def purge(self, session):
+        if session in self.ready: self.ready.remove(session)
+        session.outbox.clear()
+        session.inflight.clear()
+        session.commandBuf.clear()
+        self.emit('queue', session)
+    # seconds until the next frame timer runs out or the radio is free for the next queued frame,
+    # at most 0.5 so the loop still checks self.connected
+    def wait(self):
+        now = time.monotonic()
+        deadline = min((frame.deadline for session in self.sessions.values() for frame in session.inflight.values()),
+            default = float('inf'))
+        if self.ready:
+            deadline = min(deadline, now + self.holdoff(self.ready[0].outbox[0], now))
+        return max(0, min(0.5, deadline - now))
+    # queue a frame for a rover, sessions with frames waiting take turns on the radio
+    def queueTx(self, session, msg):
+        if not session.outbox:
+            self.ready.append(session)
+        session.outbox.append(msg)
+    # predicted airtime of a queued AT+SEND
+    def frameTime(self, msg):
+        return airtime.frameTime(self.settings, int(msg.split(',', 2)[1]))
+    # seconds before the modem may take a queued AT+SEND
+    def holdoff(self, msg, now):
+        return self.scheduler.wait(self.frameTime(msg), airtime.dutyCycle(self.settings), now)
+    # hand the next queued frame to the modem once the last one is off the air and the duty cycle allows it,
+    # one per session per turn so a busy rover can not starve the others
+    def transmit(self):
+        now = time.monotonic()
+        if not self.ready or self.holdoff(self.ready[0].outbox[0], now) > 0:
+            return
+        session = self.ready.popleft()
+        msg = session.outbox.popleft()
+        self.scheduler.sent(self.frameTime(msg), now)
+        self.sendCommand(msg)
+        if session.outbox:
+            self.ready.append(session)
+    # the modem answered an AT+SEND, the radio is free again
+    def sendDone(self, done):
+        self.scheduler.done(done.airtime)
+        if done.response != '+OK':
+            self.emit('response', 'AT+SEND: ' + done.response)
+        self.emit('airtime', self.scheduler)
+    # msg rx format
+    def msgRx(self, msg):
+        self.telemetryLog.record(recorder.RX, msg.address, msg.payload, msg.rssi, msg.snr)
+        self.rxCount += 1
+        return msg.payload
+    # route a received message to the session of its source address, a SYN from a new address opens one
+    def dispatch(self, msg):
+        try:
+            data = codec.fields(self.msgRx(msg))
+        except ValueError:
+            data = []
+        opts = options(data)
+        if len(data) > 2 and not wellFormed(data, opts):
+            data = []
+        session = self.sessions.get(msg.address)
+        if session is None and len(data) > 2 and data[2] == 'SYN':
+            session = self.sessions[msg.address] = Session(msg.address, float(self.settings['rto']))
+            self.emit('session', session)
+        if session:
+            session.message = msg
+            session.quality.received(time.monotonic(), msg.rssi, msg.snr)
+        self.emit('received', session, msg)
+        if session and len(data) > 2:
+            self.step(session, data, opts)
+    # change state of a session, or of the link for None
+    def changeState(self, session, s, c):
+        if session is None:
+            self.connectionState = s
+        else:
+            session.connectionState = s
+        TRANSITIONS.inc(1, s)
+        self.emit('state', session, s, c)
+    # communication loop: route everything received, then give the radio to the sessions in turn
+    def connection(self, ser):
+        while self.connected:
+            msg = self.link.receive(self.wait())
+            while msg:
+                if isinstance(msg, SendDone):
+                    self.sendDone(msg)
+                elif isinstance(msg, LinkError):
+                    self.emit('lora', 'ERROR', 'ERROR: ' + msg.text, 'ERROR')
+                else:
+                    self.dispatch(msg)
+                msg = self.link.receive(0)
+            self.expire()
+            self.transmit()
+            if time.monotonic() - self.snapshotTime >= SNAPSHOT:
+                self.snapshotTime = time.monotonic()
+                for session in list(self.sessions.values()):
+                    self.noteQuality(session)
+    # link statistics of a rover into the recording, for the last minute and the whole session
+    def noteQuality(self, session):
+        now = time.monotonic()
+        self.telemetryLog.note('link', {'address': session.address, 'state': session.connectionState,
+            'minute': session.quality.summary(now, 60, len(session.inflight)),
+            'session': session.quality.summary(now, None, len(session.inflight))})
+    # per rover state machine, one step for each message from it
+    def step(self, session, data, opts):
+        if session.connectionState == 'LISTEN':
+            if data[2] == 'SYN':
+                session.ackNum = int(data[0]) + 1
+                session.window = max(1, min(int(self.settings['window']), int(opts.get('W', 1)))) # rover offers +W to use a window
+                version = min(int(self.settings['codec']), int(opts.get('C', 0))) # rover offers +C to use the codec
+                self.emit('lock', session)
+                self.msgTx(session, 'SYN' + (' +W' + str(session.window) if session.window > 1 else '') + \
+                    (' +C' + str(version) if version else ''))
+                session.codec = version # the SYN itself stays text
+                self.changeState(session, 'SYN-RECEIVED', 'warning')
+        elif session.connectionState == 'SYN-RECEIVED':
+            if data[2] == 'ACK':
+                session.seqNum = int(data[1])
+                self.ackAll(session)
+                self.msgTx(session, 'ACK')
+                self.changeState(session, 'ESTABLISHED', 'success')
+                plan = self.missions.get(session.address)
+                if plan and not plan.done(): self.resumeMission(session.address) # the link dropped during an upload
+        elif session.connectionState == 'ESTABLISHED':
+            if data[2] == 'ACK' and session.window > 1:
+                self.windowAck(session, data, opts)
+            elif data[2] == 'ACK':
+                if int(data[0]) < session.ackNum: # a second reply to a frame sent again too early, already handled
+                    return
+                if int(data[0]) > session.ackNum:
+                    for frame in list(session.inflight.values()):
+                        self.resend(session, frame, 'Sequence Error')
+                else:
+                    self.ackAll(session)
+                    self.emit('status', session, 'Message sent successfully', 'success')
+                    session.seqNum = int(data[1])
+                    self.telemetry(session, data)
+                    if session.closeFlag:
+                        self.msgTx(session, 'FIN')
+                        self.changeState(session, 'FIN-WAIT', 'warning')
+                        session.closeFlag = 0
+                    elif not session.commandBuf.empty():
+                        session.ackNum = int(data[0]) + 1
+                        self.cmdTx(session)
+                    else:
+                        session.ackNum = int(data[0]) + 1
+                        self.msgTx(session, 'ACK')
+        elif session.connectionState == 'FIN-WAIT':
+            if data[2] == 'FIN':
+                self.ackAll(session)
+                session.seqNum = int(data[1])
+                session.ackNum = int(data[0]) + 1
+                self.changeState(session, 'TIME-WAIT', 'warning')
+                self.msgTx(session, 'ACK')
+                self.changeState(session, 'CLOSED', 'danger')
+                del self.sessions[session.address] # a late FIN from it is dropped, a new SYN opens a new session
+                self.noteQuality(session)
+                self.emit('closed', session)
+    # sliding window ESTABLISHED step: the ack field is cumulative (next seq the rover expects), +S lists seqs it holds
+    # beyond a gap; commands are sent while the window has room and an ACK only when nothing else is in flight
+    def windowAck(self, session, data, opts):
+        session.ackNum = max(session.ackNum, int(data[0]) + 1) # an older reply that arrives late does not move it back
+        ack = int(data[1])
+        sacked = [int(seq) for seq in opts.get('S', '').split(',') if seq]
+        newest = None
+        delivered = []
+        for seq in sorted(session.inflight):
+            if seq < ack or seq in sacked:
+                newest = session.inflight.pop(seq)
+                delivered.append(newest)
+        if newest: self.acked(session, newest) # the reply is to the newest frame it acknowledges
+        self.delivered(session, delivered)
+        for seq, frame in session.inflight.items():
+            if sacked and seq < max(sacked) and not frame.tries: # a later frame got through, this one was lost
+                self.resend(session, frame, 'Selective Ack')
+        self.emit('status', session, 'Message sent successfully', 'success')
+        self.telemetry(session, data)
+        if session.closeFlag:
+            if not session.inflight:
+                self.msgTx(session, 'FIN')
+                self.changeState(session, 'FIN-WAIT', 'warning')
+                session.closeFlag = 0
+            return
+        while len(session.inflight) < session.window and not session.commandBuf.empty():
+            self.cmdTx(session)
+        if not session.inflight:
+            self.msgTx(session, 'ACK')
+    # position and telemetry fields of an ACK that carries them
+    def telemetry(self, session, data):
+        if len(data) > 3:
+            try:
+                coordinate, alt = [float(data[7]), float(data[8])], float(data[9])
+            except (IndexError, ValueError): # the ACK itself counts, the fix is dropped
+                return
+            session.coordinate = coordinate
+            session.track.add(time.monotonic(), session.coordinate, alt)
+            self.checkFences(session)
+            self.emit('telemetry', session, data)
+            if session.originalCoordinate == [0,0]:
+                session.originalCoordinate = [float(data[7]), float(data[8])]
+                self.emit('position', session, False)
+            else :
+                self.emit('position', session, True)
+    # compare a rover's position with the geofences, on a new breach queue the fence action as a safety command
+    def checkFences(self, session):
+        names = sorted({f.name for f in self.geofence.check(session.coordinate)})
+        if names == session.fences:
+            return
+        session.fences = names
+        self.emit('fence', session, names)
+        if not names:
+            return
+        self.emit('status', session, 'Geofence breached: ' + ', '.join(names), 'danger')
+        action = self.settings['fenceAction']
+        if action in ('cancel', 'shutdown'): # MAN1 x y z start cancel shutdown rc pose
+            self.createTx('0 0 0 False ' + ('True False' if action == 'cancel' else 'False True') + ' False False', 2, session.address)
+    # queue a waypoint route for a rover in chunks that fit a frame, replacing a mission still being uploaded to it
+    def uploadMission(self, waypoints, address = None):
+        session = self.session(address)
+        if session is None:
+            self.emit('message', 'ERROR', 'ERROR: No connection with rover ' + \
+                str(self.settings['roverAddress'] if address is None else address) + '.', 'ERROR')
+            return None
+        if not waypoints:
+            return None
+        breached = sorted({f.name for p in waypoints for f in self.geofence.check(p)})
+        if breached:
+            self.emit('message', 'ERROR', 'ERROR: Mission breaches geofence ' + ', '.join(breached) + '.', 'ERROR')
+            return None
+        self.missions[session.address] = mission.Mission(waypoints)
+        self.resumeMission(session.address)
+        return self.missions[session.address]
+    # queue the chunks of a rover's mission it has not acknowledged, after an upload was interrupted
+    def resumeMission(self, address = None):
+        session = self.session(address)
+        plan = self.missions.get(session.address) if session else None
+        if plan is None:
+            return
+        session.commandBuf.drop('WP')
+        plan.pack(session.codec) # a new session may have agreed on another codec, then every chunk goes again
+        if plan.started is None: plan.started = time.monotonic()
+        sending = {frame.command for frame in session.inflight.values()}
+        for chunk in plan.pending():
+            if 'CMD ' + chunk not in sending: session.commandBuf.put('CMD ' + chunk)
+        session.track.destination = plan.waypoints[-1]
+        self.emit('mission', session, plan)
+        self.emit('queue', session)
+    # load keep-out zones and operating boundaries from a GeoJSON file, raises OSError or ValueError
+    def loadFences(self, path):
+        self.geofence = geofence.load(path)
+        for session in list(self.sessions.values()):
+            session.fences = []
+    # close the connection with one rover, or with all of them
+    def close(self, address = None):
+        for session in list(self.sessions.values()):
+            if address is None or session.address == int(address):
+                session.closeFlag = 1
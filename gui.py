@@ -1,57 +1,265 @@
+import time
+STARTED = time.perf_counter() # the startup profile counts from here, before the Qt imports
 from PyQt5 import QtCore, QtGui, QtWidgets
-from qt_material import apply_stylesheet
 from pyqtlet import L, MapWidget
-from math import cos, asin, sqrt, pi
-from datetime import datetime
+import pyqtgraph
+from math import cos, pi, hypot
 import os
-import time
+import json
 import threading
-import queue
+import collections
 import serial
 import serial.tools.list_ports
+import tiles
+import theme
+from core import Station, airtime, ports, analytics, geofence, mission, series, linkstats, metrics
+
+PLOTS = ['RSSI', 'SNR', 'Altitude', 'Pos X', 'Pos Y', 'Pos Z', 'State'] # telemetry the Communication tab can plot
+SPANS = {'1 min': 60, '10 min': 600, '1 h': 3600, 'All': None} # seconds of history the plot shows
+JAVASCRIPT = metrics.counter('gs_javascript_calls_total', 'runJavaScript calls on the map page')
+
+# rover path: every fix is kept here, the map only gets a decimated copy with a bounded vertex count
+class Track:
+    def __init__(self, maxPoints = 2000, pixels = 2):
+        self.maxPoints = maxPoints # most vertices the map may hold
+        self.pixels = pixels # allowed deviation on screen
+        self.tolerance = 0.5 # allowed deviation in metres at the current zoom
+        self.clear()
+    # forget the whole path
+    def clear(self):
+        self.points = [] # full resolution [lat, long]
+        self.shown = [] # vertices on the map
+        self.run = [] # points folded into the last vertex since the one before it
+        self.synced = 0 # leading vertices the map already has
+        self.flushed = 0 # vertices the map had after the last flush
+        self.scale = 111320.0 # metres per degree of longitude, set by the first point
+    # metres east/north of the equator/prime meridian
+    def project(self, point):
+        return (point[1] * self.scale, point[0] * 111320.0)
+    # distance from p to segment a-b in metres
+    def deviation(self, p, a, b):
+        p, a, b = self.project(p), self.project(a), self.project(b)
+        dx, dy = b[0] - a[0], b[1] - a[1]
+        d = dx * dx + dy * dy
+        t = 0 if d == 0 else max(0, min(1, ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / d))
+        return hypot(p[0] - a[0] - t * dx, p[1] - a[1] - t * dy)
+    # add a fix, the last vertex follows the rover until the path bends by more than the tolerance
+    def add(self, point):
+        if not self.points:
+            self.scale = 111320.0 * cos(point[0] * pi / 180)
+        self.points.append(point)
+        if len(self.shown) < 2:
+            self.shown.append(point)
+            return
+        anchor = self.shown[-2]
+        if len(self.run) < 100 and all(self.deviation(p, anchor, point) <= self.tolerance for p in self.run + [self.shown[-1]]):
+            self.run.append(self.shown[-1])
+            self.shown[-1] = point
+            self.synced = min(self.synced, len(self.shown) - 1)
+        else:
+            self.run = []
+            self.shown.append(point)
+        if len(self.shown) > self.maxPoints:
+            self.setTolerance(self.tolerance * 2)
+    # Douglas-Peucker over the full resolution path
+    def simplify(self, tolerance):
+        n = len(self.points)
+        if n < 3:
+            return list(self.points)
+        keep = [False] * n
+        keep[0] = keep[-1] = True
+        stack = [(0, n - 1)]
+        while stack:
+            i, j = stack.pop()
+            dmax, index = 0, 0
+            for k in range(i + 1, j):
+                d = self.deviation(self.points[k], self.points[i], self.points[j])
+                if d > dmax:
+                    dmax, index = d, k
+            if dmax > tolerance:
+                keep[index] = True
+                stack.append((i, index))
+                stack.append((index, j))
+        return [p for p, k in zip(self.points, keep) if k]
+    # rebuild the map copy for a new tolerance, raising it until the vertex cap holds
+    def setTolerance(self, tolerance):
+        self.tolerance = tolerance
+        self.shown = self.simplify(tolerance)
+        while len(self.shown) > self.maxPoints:
+            self.tolerance *= 2
+            self.shown = self.simplify(self.tolerance)
+        self.run = []
+        self.synced = 0
+    # level of detail for a Leaflet zoom level
+    def setZoom(self, zoom):
+        metresPerPixel = 156543.03 * self.scale / 111320.0 / 2 ** zoom
+        self.setTolerance(self.pixels * metresPerPixel)
+    # javascript bringing the map polyline up to date, empty if nothing changed
+    def flush(self, name):
+        vertices = ['[' + str(p[0]) + ',' + str(p[1]) + ']' for p in self.shown[self.synced:]]
+        if self.synced == self.flushed: # only appended since the last flush
+            js = ''.join(name + '.addLatLng(' + v + ');' for v in vertices)
+        elif self.synced == 0:
+            js = name + '.setLatLngs([' + ','.join(vertices) + ']);'
+        else:
+            js = name + '.setLatLngs(' + name + '.getLatLngs().slice(0, ' + str(self.synced) + ').concat([' + ','.join(vertices) + ']));'
+        self.synced = self.flushed = len(self.shown)
+        return js
+
+# one rover on the map: starting and current position markers and its decimated path
+class RoverMap:
+    colors = ['#0077ff', '#ff7700', '#00cc66', '#cc33cc', '#ffcc00', '#00cccc', '#ff3366', '#9966ff']
+    def __init__(self, address, color):
+        self.address = address
+        self.color = color
+        self.track = Track()
+        self.origin = [0, 0]
+        self.coordinate = [0, 0]
+        self.line = 'polyline' + str(address) # javascript name of the path
+        self.start = L.marker([0, 0])
+        self.marker = L.marker([0, 0])
+    # javascript adding the markers and path to the map
+    def create(self, map, group):
+        name = 'Rover ' + str(self.address)
+        return group + '.addLayer(' + self.start.jsName + ').addLayer(' + self.marker.jsName + ');' + \
+            self.start.jsName + '.setIcon(markerIcon);' + self.marker.jsName + '.setIcon(markerIcon2);' + \
+            self.start.jsName + '.bindTooltip(\"' + name + ' Starting Position\");' + \
+            self.marker.jsName + '.bindTooltip(\"' + name + ' Current Position\");' + \
+            'var ' + self.line + " = L.polyline([], {color: '" + self.color + "'}).addTo(" + map + ');' + \
+            self.line + '.bindTooltip(\"' + name + '\'s Path\");'
+    # javascript moving the start marker and beginning a new path
+    def restart(self, point):
+        self.origin = point
+        self.track.clear()
+        self.track.add(point)
+        return self.start.jsName + '.setLatLng(' + str(point) + ');' + self.line + '.setLatLngs([]);'
+    # javascript bringing the path and current marker up to date
+    def flush(self):
+        return self.track.flush(self.line) + self.marker.jsName + '.setLatLng(' + str(self.coordinate) + ');'
+
+# collects GUI updates from other threads and applies the latest one per key on a timer
+class UpdateBus(QtCore.QObject):
+    def __init__(self, rate = 20):
+        super().__init__()
+        self.pending = {} # key -> latest update
+        self.lock = threading.Lock()
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.apply)
+        self.setRate(rate)
+        self.timer.start()
+    # set frame rate in Hz
+    def setRate(self, rate):
+        self.rate = rate
+        self.timer.setInterval(int(1000 / max(1, rate)))
+    # queue an update, replacing any unapplied update with the same key
+    def post(self, key, update):
+        with self.lock:
+            self.pending[key] = update
+    # queue a setText for a widget
+    def setText(self, widget, text):
+        self.post(widget, lambda: widget.setText(text))
+    # drop unapplied updates
+    def clear(self):
+        with self.lock:
+            self.pending = {}
+    # apply queued updates on the GUI thread
+    def apply(self):
+        with self.lock:
+            pending = self.pending
+            self.pending = {}
+        for update in pending.values():
+            update()
+
+# time spent in each startup phase, from STARTED to the window's first paint and the map after it
+class StartupProfile:
+    def __init__(self, start = STARTED):
+        self.start = start
+        self.last = start
+        self.phases = [] # (name, seconds)
+    # end a phase
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+    # one line per phase with the time since start
+    def report(self):
+        lines = ['Startup:']
+        total = 0
+        for name, seconds in self.phases:
+            total += seconds
+            lines.append('  ' + name.ljust(20) + format(seconds * 1000, '8.1f') + ' ms' + format(total * 1000, '10.1f') + ' ms')
+        return '\n'.join(lines)
 
+# lazy defers the map and its QtWebEngine page until after the first paint and lists serial ports in the background
+# startup is the profile of what ran before the window, e.g. the stylesheet, it goes on with the window's phases
 class Window(QtWidgets.QWidget):
-    def __init__(self):
+    def __init__(self, lazy = False, startup = None):
         super().__init__()
-        # Connection and Write threads
-        self.connectionThread = threading.Thread()
-        self.writeThread = threading.Thread()
-        self.writeBuf = queue.Queue() # write buffer
-        self.commandBuf = queue.Queue() # command buffer
-        self.lastMsg = ''; # last msg sent to rover
-        self.connectionState = 'CLOSED'
-        self.readState = 0
-        self.closeFlag = 0
-        self.seqNum = 0
-        self.ackNum = 0
-        self.loraCommands = ['AT\r\n', 'AT+VER?\r\n', 'AT+UID?\r\n', 'AT+BAND?\r\n', 'AT+NETWORKID?\r\n',
-            'AT+ADDRESS?\r\n', 'AT+PARAMETER?\r\n', 'AT+IPR?\r\n']
-        self.message = ['NA','NA','NA','NA','NA'] # LoRa message structure
+        if startup is None:
+            startup = StartupProfile()
+            startup.mark('imports')
+        self.startup = startup
+        self.lazy = lazy
+        self.painted = False
+        self.report = False # print the startup profile once the map is up
+        self.map = None # created by createMap
+        self.station = Station() # link, protocol and telemetry log, the window only displays its events
+        self.station.listen(self.stationEvent)
         self.currentPort = ' ' 
         self.ports = [' '] # list of serial ports
         self.portsFullName = [' '] # verbose list of serial ports
-        self.connected = False # serial connection state
-        self.serialPort = serial.Serial()
+        self.extraPorts = [] # ports comports() does not list, e.g. a simulated modem
+        self.lostPort = None # port of a modem that was unplugged while connected
+        self.bus = UpdateBus() # GUI updates from the connection thread
+        self.trackBuf = collections.deque() # (address, position, moved) not yet drawn
+        self.rovers = {} # address -> RoverMap, kept after a rover disconnects
+        self.rover = '' # address picked in the rover list
+        self.history = series.Store() # telemetry per rover for the plot, fixed size however long a mission runs
+        self.tileServer = tiles.TileServer(tiles.TileCache('cache/tiles')) # tiles are served from the local cache
+        self.tileServer.start()
+        self.exporters = [] # metrics endpoint and snapshot file, stopped on exit
+        self.startup.mark('station')
         self.setWindowIcon(QtGui.QIcon('images/icon.png'))
         self.setWindowTitle('Ground Station')
-        # create logs folder/files
-        if(not os.path.exists('logs')): os.makedirs('logs')
-        self.coordinatesFile = open('logs/coordinates.txt', 'a')  
-        self.telemetryFile = open('logs/telemetry.txt', 'a')  
-        self.sentFile = open('logs/sent.txt', 'a')  
-        self.receivedFile = open('logs/received.txt', 'a')  
         # Layouts
         self.layout = QtWidgets.QVBoxLayout()
         self.setLayout(self.layout)
         tabs = QtWidgets.QTabWidget()
         tabs.addTab(self.CMTabUI(), 'Controls/Map')
+        self.startup.mark('controls tab')
+        if not lazy: self.createMap()
         tabs.addTab(self.CTabUI(), 'Communication')
+        self.startup.mark('communication tab')
         tabs.addTab(self.STabUI(), 'Settings/Debug')
+        self.startup.mark('settings tab')
         self.layout.addWidget(tabs)
+    # first paint ends the startup profile, the deferred map is built right after it
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.painted:
+            self.painted = True
+            self.startup.mark('first paint')
+            QtCore.QTimer.singleShot(0, self.started)
+    # apply the refresh rate typed in Settings, text that is not a rate puts the current one back
+    def setRefreshRate(self):
+        try:
+            rate = float(self.refreshRate.text())
+        except ValueError:
+            rate = 0
+        if not 1 <= rate <= 240:
+            self.refreshRate.setText(format(self.bus.rate, 'g'))
+            return
+        self.bus.setRate(rate)
+    # run javascript on the map page, counted for the metrics
+    def runJavaScript(self, js):
+        JAVASCRIPT.inc()
+        self.map.runJavaScript(js)
+    # rest of the startup after the window is on screen
+    def started(self):
+        self.createMap()
+        if self.report: print(self.startup.report())
 
     def CMTabUI(self):
-        self.coordinate = [0, 0]
-        self.originalCoordinate = [0, 0]
         self.destinationCoordinate = [0, 0]
         CMTab = QtWidgets.QWidget()
         layout = QtWidgets.QVBoxLayout()
@@ -68,6 +276,9 @@ class Window(QtWidgets.QWidget):
         self.blindDriveLayout = QtWidgets.QGridLayout()
         self.blindDriveLayout.setVerticalSpacing(10)
         self.blindDriveLayout.setHorizontalSpacing(10)
+        self.missionLayout = QtWidgets.QGridLayout()
+        self.missionLayout.setVerticalSpacing(10)
+        self.missionLayout.setHorizontalSpacing(10)
         self.telemetryLayout = QtWidgets.QGridLayout()
         self.telemetryLayout.setVerticalSpacing(10)
         self.telemetryLayout.setHorizontalSpacing(10)
@@ -78,13 +289,21 @@ class Window(QtWidgets.QWidget):
         self.portList = QtWidgets.QComboBox()
         self.portList.addItems(self.portsFullName)
         self.portList.activated.connect(self.switchPort)
-        self.scanPorts() # scan serial ports
+        self.scanPorts(self.lazy) # scan serial ports, in the background while starting up
+        self.portMonitor = ports.PortMonitor(lambda found: self.bus.post('ports', lambda: self.showPorts(found)))
+        self.portMonitor.start() # keeps the list up to date as modems are plugged in and removed
+        self.roverText = QtWidgets.QLabel()
+        self.roverText.setText('Rover')
+        self.roverText.setProperty('class', 'header')
+        self.roverText.setAlignment(QtCore.Qt.AlignCenter)
+        self.roverList = QtWidgets.QComboBox()
+        self.roverList.activated.connect(self.selectRover)
         self.controlText = QtWidgets.QLabel()
         self.controlText.setText('Control Mode')
         self.controlText.setProperty('class', 'header')
         self.controlText.setAlignment(QtCore.Qt.AlignCenter)
         self.controlList = QtWidgets.QComboBox()
-        self.controlList.addItems(['', 'Blind Drive', 'Manual 1', 'Manual 2'])
+        self.controlList.addItems(['', 'Blind Drive', 'Manual 1', 'Manual 2', 'Mission'])
         self.controlList.activated.connect(self.switchControl)
         self.controlList.setDisabled(True)
         self.pointXText = QtWidgets.QLabel()
@@ -201,6 +420,23 @@ class Window(QtWidgets.QWidget):
         self.travel = QtWidgets.QPushButton('Travel')
         self.travel.clicked.connect(lambda: self.buttonPressed('1')) 
         self.travel.setDisabled(True)
+        self.waypoints = [] # mission route clicked on the map
+        self.waypointText = QtWidgets.QLabel()
+        self.waypointText.setText('Waypoints: 0')
+        self.waypointText.setProperty('class', 'font_14')
+        self.waypointText.setAlignment(QtCore.Qt.AlignCenter)
+        self.missionStatus = QtWidgets.QLabel()
+        self.missionStatus.setText('Upload: NA')
+        self.missionStatus.setProperty('class', 'font_14')
+        self.missionStatus.setAlignment(QtCore.Qt.AlignCenter)
+        self.undoWaypoint = QtWidgets.QPushButton('Undo')
+        self.undoWaypoint.clicked.connect(lambda: self.editMission(self.waypoints[:-1]))
+        self.clearMission = QtWidgets.QPushButton('Clear')
+        self.clearMission.clicked.connect(lambda: self.editMission([]))
+        self.uploadMission = QtWidgets.QPushButton('Upload')
+        self.uploadMission.clicked.connect(lambda: self.station.uploadMission(self.waypoints))
+        self.resumeMission = QtWidgets.QPushButton('Resume Upload')
+        self.resumeMission.clicked.connect(lambda: self.station.resumeMission())
         self.stateText = QtWidgets.QLabel()
         self.stateText.setText('State: NA')
         self.stateText.setProperty('class', 'font_14')
@@ -222,17 +458,33 @@ class Window(QtWidgets.QWidget):
         self.altText.setProperty('class', 'font_14')
         self.altText.setAlignment(QtCore.Qt.AlignCenter)
         self.latText = QtWidgets.QLabel()
-        self.latText.setText('Lat: ' + str(self.originalCoordinate[0]))
+        self.latText.setText('Lat: 0')
         self.latText.setProperty('class', 'font_14')
         self.latText.setAlignment(QtCore.Qt.AlignCenter)
         self.longText = QtWidgets.QLabel()
-        self.longText.setText('Long: ' + str(self.originalCoordinate[1]))
+        self.longText.setText('Long: 0')
         self.longText.setProperty('class', 'font_14')
         self.longText.setAlignment(QtCore.Qt.AlignCenter)
         self.distanceText = QtWidgets.QLabel()
         self.distanceText.setText('Distance: 0 m')
         self.distanceText.setProperty('class', 'font_14')
         self.distanceText.setAlignment(QtCore.Qt.AlignCenter)
+        self.climbText = QtWidgets.QLabel()
+        self.climbText.setText('Climb: NA')
+        self.climbText.setProperty('class', 'font_14')
+        self.climbText.setAlignment(QtCore.Qt.AlignCenter)
+        self.pathText = QtWidgets.QLabel()
+        self.pathText.setText('Path: 0 m')
+        self.pathText.setProperty('class', 'font_14')
+        self.pathText.setAlignment(QtCore.Qt.AlignCenter)
+        self.speedText = QtWidgets.QLabel()
+        self.speedText.setText('Speed: NA')
+        self.speedText.setProperty('class', 'font_14')
+        self.speedText.setAlignment(QtCore.Qt.AlignCenter)
+        self.etaText = QtWidgets.QLabel()
+        self.etaText.setText('ETA: NA')
+        self.etaText.setProperty('class', 'font_14')
+        self.etaText.setAlignment(QtCore.Qt.AlignCenter)
         self.starting = QtWidgets.QPushButton('Starting Location')
         self.starting.clicked.connect(lambda: self.panTo('s')) 
         self.current = QtWidgets.QPushButton('Current Location')
@@ -240,8 +492,10 @@ class Window(QtWidgets.QWidget):
         self.toggle = QtWidgets.QPushButton('Toggle Map Style')
         self.toggle.clicked.connect(lambda: self.mapToggle()) 
         self.initLayout.addWidget(self.portText, 0, 0)
+        self.initLayout.addWidget(self.roverText, 0, 1)
         self.initLayout.addWidget(self.controlText, 0, 2)
         self.initLayout.addWidget(self.portList, 1, 0)
+        self.initLayout.addWidget(self.roverList, 1, 1)
         self.initLayout.addWidget(self.controlList, 1, 2)
         self.manualLayout.addWidget(self.pointXText, 0, 1)
         self.manualLayout.addWidget(self.pointYText, 0, 2)
@@ -280,7 +534,14 @@ class Window(QtWidgets.QWidget):
         self.blindDriveLayout.addWidget(self.destLat, 0, 0)
         self.blindDriveLayout.addWidget(self.destLong, 0, 1)
         self.blindDriveLayout.addWidget(self.travel, 0, 2)
+        self.missionLayout.addWidget(self.waypointText, 0, 0)
+        self.missionLayout.addWidget(self.missionStatus, 0, 1, 1, 3)
+        self.missionLayout.addWidget(self.undoWaypoint, 1, 0)
+        self.missionLayout.addWidget(self.clearMission, 1, 1)
+        self.missionLayout.addWidget(self.uploadMission, 1, 2)
+        self.missionLayout.addWidget(self.resumeMission, 1, 3)
         self.telemetryLayout.addWidget(self.stateText, 0, 0)
+        self.telemetryLayout.addWidget(self.climbText, 0, 1)
         self.telemetryLayout.addWidget(self.altText, 0, 2)
         self.telemetryLayout.addWidget(self.posXText, 1, 0)
         self.telemetryLayout.addWidget(self.posYText, 1, 1)
@@ -288,39 +549,13 @@ class Window(QtWidgets.QWidget):
         self.telemetryLayout.addWidget(self.latText, 2, 0)
         self.telemetryLayout.addWidget(self.longText, 2, 1)
         self.telemetryLayout.addWidget(self.distanceText, 2, 2)
-        self.telemetryLayout.addWidget(self.starting, 3, 0)
-        self.telemetryLayout.addWidget(self.current, 3, 1)
-        self.telemetryLayout.addWidget(self.toggle, 3, 2)
-        self.mapLayout = QtWidgets.QVBoxLayout()
-        self.mapWidget = MapWidget()
-        self.map = L.map(self.mapWidget) 
-        self.map.setView(self.originalCoordinate, 18)
-        self.worldMap = 'https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}'
-        self.darkMap = 'https://{s}.basemaps.cartocdn.com/dark_all/{z}/{x}/{y}{r}.png'
-        self.maps = [self.darkMap, self.worldMap]
-        self.currentMap = 0
-        L.tileLayer(self.maps[self.currentMap], {'maxNativeZoom': 19, 'maxZoom': 25, 'noWrap': 'true'}).addTo(self.map)
-        self.marker = L.marker(self.originalCoordinate)
-        self.marker.bindTooltip('Rover Starting Position')
-        self.marker2 = L.marker(self.coordinate)
-        self.marker2.bindTooltip('Rover Current Position')
-        self.destMarker = L.marker(self.originalCoordinate, options = {"opacity": 0})
-        self.layerGroup = L.layerGroup()
-        self.map.runJavaScript(f'{self.layerGroup.jsName}' + \
-            '.addLayer(' + self.marker.jsName + ')' + \
-            '.addLayer(' + self.marker2.jsName + ')' + \
-            '.addLayer(' + self.destMarker.jsName + ')' + \
-            '.addTo(' + self.map.jsName + ');')
-        self.imageDir = os.path.join(os.getcwd(), 'images').replace('\\', '/')
-        self.map.runJavaScript('var markerIcon = L.icon({iconUrl: \"' + self.imageDir + '/start.png\"});')
-        self.map.runJavaScript(f'{self.marker.jsName}.setIcon(markerIcon);')
-        self.map.runJavaScript('var markerIcon2 = L.icon({iconUrl: \"' + self.imageDir + '/rover.png\"});')
-        self.map.runJavaScript(f'{self.marker2.jsName}.setIcon(markerIcon2);')
-        self.map.runJavaScript('var markerIcon3 = L.icon({iconUrl: \"' + self.imageDir + '/marker.png\"});')
-        self.map.runJavaScript('var markerIcon4 = L.icon({iconUrl: \"' + self.imageDir + '/destination.png\"});')
-        self.map.runJavaScript(f'{self.destMarker.jsName}.setIcon(markerIcon3);')
-        self.map.clicked.connect(lambda x: self.setDest(x['latlng']))
-        self.mapLayout.addWidget(self.mapWidget)
+        self.telemetryLayout.addWidget(self.pathText, 3, 0)
+        self.telemetryLayout.addWidget(self.speedText, 3, 1)
+        self.telemetryLayout.addWidget(self.etaText, 3, 2)
+        self.telemetryLayout.addWidget(self.starting, 4, 0)
+        self.telemetryLayout.addWidget(self.current, 4, 1)
+        self.telemetryLayout.addWidget(self.toggle, 4, 2)
+        self.mapLayout = QtWidgets.QVBoxLayout() # map widget is added by createMap
         self.hideControls(True, 'all')
         self.spaceItem = QtWidgets.QSpacerItem(150, 30, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
         self.spaceItem2 = QtWidgets.QSpacerItem(150, 30, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
@@ -329,12 +564,80 @@ class Window(QtWidgets.QWidget):
         layout.addLayout(self.manualLayout)
         layout.addLayout(self.manualLayout2)
         layout.addLayout(self.blindDriveLayout)
+        layout.addLayout(self.missionLayout)
         layout.addItem(self.spaceItem2)
         layout.addLayout(self.telemetryLayout)
         layout.addLayout(self.mapLayout)
         layout.addStretch()
         CMTab.setLayout(layout)
         return CMTab
+    # map with its QtWebEngine page, tile layer and marker icons, built once
+    def createMap(self):
+        if self.map is not None:
+            return
+        self.mapWidget = MapWidget()
+        self.map = L.map(self.mapWidget) 
+        self.map.setView([0, 0], 18)
+        self.worldMap = self.tileServer.url('world')
+        self.darkMap = self.tileServer.url('dark')
+        self.maps = [self.darkMap, self.worldMap]
+        self.currentMap = 0
+        self.tileLayer = L.tileLayer(self.maps[self.currentMap], {'maxNativeZoom': 19, 'maxZoom': 25, 'noWrap': 'true'})
+        self.tileLayer.addTo(self.map)
+        self.destMarker = L.marker([0, 0], options = {"opacity": 0})
+        self.layerGroup = L.layerGroup() # rover markers are added as rovers connect
+        self.imageDir = os.path.join(os.getcwd(), 'images').replace('\\', '/')
+        self.runJavaScript(f'{self.layerGroup.jsName}' + \
+            '.addLayer(' + self.destMarker.jsName + ')' + \
+            '.addTo(' + self.map.jsName + ');' + \
+            'var markerIcon = L.icon({iconUrl: \"' + self.imageDir + '/start.png\"});' + \
+            'var markerIcon2 = L.icon({iconUrl: \"' + self.imageDir + '/rover.png\"});' + \
+            'var markerIcon3 = L.icon({iconUrl: \"' + self.imageDir + '/marker.png\"});' + \
+            'var markerIcon4 = L.icon({iconUrl: \"' + self.imageDir + '/destination.png\"});' + \
+            f'{self.destMarker.jsName}.setIcon(markerIcon3);') # one call instead of six
+        self.map.clicked.connect(lambda x: self.setDest(x['latlng']))
+        self.map.zoom.connect(lambda x: self.bus.post('zoom', lambda: self.map.getZoom(self.zoomTrack)))
+        self.mapLayout.addWidget(self.mapWidget)
+        self.drawFences()
+        self.startup.mark('map')
+    # load keep-out zones and operating boundaries and draw them
+    def loadFences(self):
+        try:
+            self.station.loadFences(self.fenceFile.text())
+        except (OSError, ValueError) as e:
+            self.msgBox('ERROR', 'ERROR: ' + str(e), 'ERROR')
+            return
+        fences = self.station.geofence.fences
+        boundaries = sum(f.kind == 'boundary' for f in fences)
+        self.fenceStatus.setText(str(len(fences) - boundaries) + ' keep-out, ' + str(boundaries) + ' boundary')
+        self.drawFences()
+    # geofences on the map, keep-out zones in red and boundaries as a blue outline, replacing the ones drawn before
+    def drawFences(self):
+        if self.map is None:
+            return
+        self.runJavaScript('if (typeof fenceLayer !== \"undefined\") fenceLayer.remove();' + \
+            'var fenceLayer = L.geoJSON(' + json.dumps(self.station.geofence.geojson()) + ', {' + \
+            'style: function(f) {return f.properties.kind == \"boundary\" ? {color: \"#17a2b8\", fill: false} : {color: \"#dc3545\"};},' + \
+            'onEachFeature: function(f, layer) {layer.bindTooltip(f.properties.name);}}).addTo(' + self.map.jsName + ');')
+    # change the mission route, redraw it and show how it would be uploaded
+    def editMission(self, waypoints):
+        self.waypoints = waypoints
+        self.createMap()
+        self.runJavaScript('if (typeof missionLayer !== \"undefined\") missionLayer.remove();' + \
+            'var missionPoints = ' + json.dumps(waypoints) + ';' + \
+            'var missionLayer = L.layerGroup([L.polyline(missionPoints, {color: \"#ffc107\", dashArray: \"6 6\"})].concat(' + \
+            'missionPoints.map(function(p, i) {return L.circleMarker(p, {radius: 5, color: \"#ffc107\"}).bindTooltip(\"Waypoint \" + (i + 1));})' + \
+            ')).addTo(' + self.map.jsName + ');')
+        self.waypointText.setText('Waypoints: ' + str(len(waypoints)))
+        session = self.station.session(self.rover or None)
+        plan = mission.Mission(waypoints)
+        offered = self.station.settings['codec']
+        plan.pack(session.codec if session else int(offered) if offered.isdigit() else 0)
+        self.missionStatus.setText(self.missionText(plan) if waypoints else 'Upload: NA')
+    # chunks acknowledged and the airtime the rest of a mission upload needs
+    def missionText(self, plan):
+        return 'Upload: ' + str(len(plan.acked)) + '/' + str(len(plan.chunks)) + ' chunks, ' + \
+            format(plan.airtime(self.station.settings), '.1f') + ' s airtime left'
 
     def CTabUI(self):
         CTab = QtWidgets.QWidget()
@@ -385,6 +688,23 @@ class Window(QtWidgets.QWidget):
         self.sentStatus.setText('NA')
         self.sentStatus.setProperty('class', 'header')
         self.sentStatus.setAlignment(QtCore.Qt.AlignLeft)
+        self.timing = QtWidgets.QLabel()
+        self.timing.setText('RTT: NA  RTO: NA  Retransmits: 0')
+        self.timing.setProperty('class', 'font_14')
+        self.timing.setAlignment(QtCore.Qt.AlignLeft)
+        self.airtime = QtWidgets.QLabel()
+        self.airtime.setText('Airtime: NA  Utilisation: 0%')
+        self.airtime.setProperty('class', 'font_14')
+        self.airtime.setAlignment(QtCore.Qt.AlignLeft)
+        self.queueStatus = QtWidgets.QLabel()
+        self.queueStatus.setText('Queue: 0 commands')
+        self.queueStatus.setProperty('class', 'font_14')
+        self.queueStatus.setAlignment(QtCore.Qt.AlignLeft)
+        self.linkQuality = QtWidgets.QLabel()
+        self.linkQuality.setText('Link: NA')
+        self.linkQuality.setProperty('class', 'font_14')
+        self.linkQuality.setAlignment(QtCore.Qt.AlignLeft)
+        self.linkQuality.setWordWrap(True)
         self.closeConnection = QtWidgets.QPushButton('Close Connection')
         self.closeConnection.clicked.connect(lambda: self.close()) 
         self.closeConnection.setDisabled(True)
@@ -396,13 +716,53 @@ class Window(QtWidgets.QWidget):
         self.communicationLayout.addWidget(self.sentText, 2, 0)
         self.communicationLayout.addWidget(self.sent, 2, 1, 1, 2)
         self.communicationLayout.addWidget(self.sentStatus, 3, 0)
+        self.communicationLayout.addWidget(self.timing, 3, 1, 1, 2)
         self.communicationLayout.addWidget(self.receivedText, 4, 0)
         self.communicationLayout.addWidget(self.received, 4, 1, 1, 2)
-        self.communicationLayout.addWidget(self.closeConnection, 5, 1)
+        self.communicationLayout.addWidget(self.airtime, 5, 0, 1, 3)
+        self.communicationLayout.addWidget(self.queueStatus, 6, 0, 1, 3)
+        self.communicationLayout.addWidget(self.linkQuality, 7, 0, 1, 3)
+        self.communicationLayout.addWidget(self.closeConnection, 8, 1)
+        self.seriesList = QtWidgets.QComboBox()
+        self.seriesList.addItems(PLOTS)
+        self.spanList = QtWidgets.QComboBox()
+        self.spanList.addItems(SPANS)
+        self.spanList.setCurrentText('10 min')
+        plotControls = QtWidgets.QHBoxLayout()
+        plotControls.addWidget(QtWidgets.QLabel('Plot:'))
+        plotControls.addWidget(self.seriesList)
+        plotControls.addWidget(self.spanList)
+        plotControls.addStretch()
+        self.plot = pyqtgraph.PlotWidget(background = None)
+        self.plot.setMinimumHeight(200)
+        self.plot.showGrid(x = True, y = True, alpha = 0.3)
+        self.plot.setLabel('bottom', 'seconds ago')
+        self.plot.setMouseEnabled(x = False, y = False)
+        self.plot.hideButtons()
+        self.curve = self.plot.plot(pen = pyqtgraph.mkPen('#1de9b6', width = 1)) # the store already thins to the plot width
+        self.seriesList.currentIndexChanged.connect(self.drawPlot)
+        self.spanList.currentIndexChanged.connect(self.drawPlot)
+        self.plotTimer = QtCore.QTimer(self)
+        self.plotTimer.setInterval(100)
+        self.plotTimer.timeout.connect(self.drawPlot)
+        self.plotTimer.start()
         layout.addLayout(self.communicationLayout)
-        layout.addStretch()
+        layout.addLayout(plotControls)
+        layout.addWidget(self.plot, 1)
         CTab.setLayout(layout)
         return CTab
+    # redraw the picked series of the picked rover, only while the plot is on screen
+    def drawPlot(self):
+        if not self.plot.isVisible():
+            return
+        name = self.seriesList.currentText()
+        span = SPANS[self.spanList.currentText()]
+        now = time.monotonic()
+        address = int(self.rover) if self.rover else None
+        t, v = self.history.window(address, name, None if span is None else now - span, max(100, self.plot.width()))
+        self.curve.setData(t - now, v)
+        axis = self.plot.getAxis('left')
+        axis.setTicks([self.history.ticks()] if name == 'State' else None)
 
     def STabUI(self):
         SHTab = QtWidgets.QWidget()
@@ -414,7 +774,7 @@ class Window(QtWidgets.QWidget):
         loraVLayout = QtWidgets.QVBoxLayout()
         loraOptionsLayout = QtWidgets.QFormLayout()
         self.scanButton = QtWidgets.QPushButton('Scan Ports')
-        self.scanButton.clicked.connect(lambda: self.scanPorts()) 
+        self.scanButton.clicked.connect(lambda: self.scanPorts(True)) 
         self.baudrateText = QtWidgets.QLineEdit()
         self.baudrateText.setAlignment(QtCore.Qt.AlignCenter)
         self.baudrateText.setText('115200')
@@ -475,6 +835,21 @@ class Window(QtWidgets.QWidget):
         self.uart.setText('115200')
         self.uart.setFixedWidth(70)
         self.uart.setProperty('class', 'font_12')
+        self.windowSize = QtWidgets.QLineEdit()
+        self.windowSize.setAlignment(QtCore.Qt.AlignCenter)
+        self.windowSize.setText('1')
+        self.windowSize.setFixedWidth(70)
+        self.windowSize.setProperty('class', 'font_12')
+        self.codecVersion = QtWidgets.QLineEdit()
+        self.codecVersion.setAlignment(QtCore.Qt.AlignCenter)
+        self.codecVersion.setText('1')
+        self.codecVersion.setFixedWidth(70)
+        self.codecVersion.setProperty('class', 'font_12')
+        self.dutyCycle = QtWidgets.QLineEdit()
+        self.dutyCycle.setAlignment(QtCore.Qt.AlignCenter)
+        self.dutyCycle.setText('auto')
+        self.dutyCycle.setFixedWidth(70)
+        self.dutyCycle.setProperty('class', 'font_12')
         portLayout.addRow('Baudrate:', self.baudrateText)
         portLayout.addRow('Bytesize:', self.bytesizeText)
         portLayout.addRow('Timeout:', self.timeoutText)
@@ -487,22 +862,39 @@ class Window(QtWidgets.QWidget):
         loraOptionsLayout.addRow('Network ID:', self.networkID)
         loraOptionsLayout.addRow('Band:', self.band)
         loraOptionsLayout.addRow('Baudrate:', self.uart)
+        loraOptionsLayout.addRow('Window (1 = stop-and-wait):', self.windowSize)
+        loraOptionsLayout.addRow('Codec (0 = text):', self.codecVersion)
+        loraOptionsLayout.addRow('Duty Cycle % (auto = band):', self.dutyCycle)
+        fields = {'baudrate': self.baudrateText, 'bytesize': self.bytesizeText, 'timeout': self.timeoutText,
+            'spreadingFactor': self.spreadingFactor, 'bandwidth': self.bandwidth, 'codingRate': self.codingRate,
+            'preamble': self.preamble, 'gsAddress': self.gsAddress, 'roverAddress': self.roverAddress,
+            'networkID': self.networkID, 'band': self.band, 'uart': self.uart, 'window': self.windowSize,
+            'codec': self.codecVersion, 'dutyCycle': self.dutyCycle}
+        for key, field in fields.items():
+            self.station.settings[key] = field.text()
+            field.textChanged.connect(lambda text, key = key: self.station.settings.__setitem__(key, text))
         self.allSet = QtWidgets.QPushButton('Set All')
-        self.allSet.clicked.connect(lambda: self.setAll()) 
+        self.allSet.clicked.connect(lambda: self.station.setAll()) 
         self.setParameters = QtWidgets.QPushButton('Set Parameters')
-        self.setParameters.clicked.connect(lambda: self.setParams(1)) 
+        self.setParameters.clicked.connect(lambda: self.station.setParams()) 
         self.testLora = QtWidgets.QPushButton('LoRa Info')
-        self.testLora.clicked.connect(lambda: self.loraTest()) 
+        self.testLora.clicked.connect(lambda: self.station.loraTest()) 
         self.customCommand = QtWidgets.QLineEdit()
         self.customCommand.setAlignment(QtCore.Qt.AlignCenter)
         self.customCommand.setText('Enter Command')
         self.customCommand.setFixedWidth(150)
         self.commandButton = QtWidgets.QPushButton('Send Command')
-        self.commandButton.clicked.connect(lambda: self.sendCustomCommand(self.customCommand.text() + '\r\n'))
+        self.commandButton.clicked.connect(lambda: self.station.sendCustomCommand(self.customCommand.text() + '\r\n'))
         self.receivedMsg = QtWidgets.QLineEdit()
         self.receivedMsg.setAlignment(QtCore.Qt.AlignCenter)
         self.receivedMsg.setText('LoRa response')
         self.receivedMsg.setFixedWidth(150)
+        self.loraLog = QtWidgets.QPlainTextEdit() # results of AT commands, they arrive without blocking the window
+        self.loraLog.setReadOnly(True)
+        self.loraLog.setMaximumBlockCount(200)
+        self.loraLog.setFixedWidth(150)
+        self.loraLog.setFixedHeight(90)
+        self.loraLog.setProperty('class', 'font_12')
         loraVLayout.addWidget(self.scanButton)
         loraVLayout.addWidget(self.allSet)
         loraVLayout.addWidget(self.setParameters)
@@ -510,6 +902,7 @@ class Window(QtWidgets.QWidget):
         loraVLayout.addWidget(self.customCommand)
         loraVLayout.addWidget(self.commandButton)
         loraVLayout.addWidget(self.receivedMsg)
+        loraVLayout.addWidget(self.loraLog)
         loraLayout.addLayout(loraOptionsLayout)
         loraLayout.addLayout(loraVLayout)
         loraLayout.addStretch()
@@ -525,14 +918,91 @@ class Window(QtWidgets.QWidget):
         mapOptionsText.setText('Map Options')
         mapOptionsText.setProperty('class', 'header')
         mapOptionsText.setAlignment(QtCore.Qt.AlignLeft)
+        self.reconnect = QtWidgets.QCheckBox('Reconnect when the modem is plugged back in')
+        self.reconnect.setChecked(True)
         self.autoPan = QtWidgets.QCheckBox('Automatically pan to rover\'s location')
         self.autoPan.setChecked(True)
+        refreshLayout = QtWidgets.QFormLayout()
+        self.refreshRate = QtWidgets.QLineEdit()
+        self.refreshRate.setAlignment(QtCore.Qt.AlignCenter)
+        self.refreshRate.setText('20')
+        self.refreshRate.setFixedWidth(70)
+        self.refreshRate.setProperty('class', 'font_12')
+        validator = QtGui.QDoubleValidator(1, 240, 1, self.refreshRate)
+        validator.setNotation(QtGui.QDoubleValidator.StandardNotation)
+        self.refreshRate.setValidator(validator)
+        self.refreshRate.editingFinished.connect(self.setRefreshRate)
+        refreshLayout.addRow('Refresh Rate (Hz):', self.refreshRate)
+        self.prefetchRadius = QtWidgets.QLineEdit()
+        self.prefetchRadius.setAlignment(QtCore.Qt.AlignCenter)
+        self.prefetchRadius.setText('1000')
+        self.prefetchRadius.setFixedWidth(70)
+        validator = QtGui.QDoubleValidator(1, 5000, 0, self.prefetchRadius)
+        validator.setNotation(QtGui.QDoubleValidator.StandardNotation)
+        self.prefetchRadius.setValidator(validator)
+        self.prefetchRadius.setProperty('class', 'font_12')
+        refreshLayout.addRow('Prefetch Radius (m):', self.prefetchRadius)
+        self.prefetchButton = QtWidgets.QPushButton('Prefetch Map Tiles')
+        self.prefetchButton.clicked.connect(lambda: self.prefetchTiles())
+        self.prefetchStatus = QtWidgets.QLabel()
+        self.prefetchStatus.setText('NA')
+        self.prefetchStatus.setProperty('class', 'font_12')
+        refreshLayout.addRow(self.prefetchButton, self.prefetchStatus)
+        fenceOptionsText = QtWidgets.QLabel()
+        fenceOptionsText.setText('Geofence')
+        fenceOptionsText.setProperty('class', 'header')
+        fenceOptionsText.setAlignment(QtCore.Qt.AlignLeft)
+        fenceLayout = QtWidgets.QFormLayout()
+        self.fenceFile = QtWidgets.QLineEdit()
+        self.fenceFile.setText('geofence.geojson')
+        self.fenceFile.setFixedWidth(150)
+        self.fenceFile.setProperty('class', 'font_12')
+        self.fenceAction = QtWidgets.QComboBox()
+        self.fenceAction.addItems(geofence.ACTIONS)
+        self.fenceAction.setCurrentIndex(geofence.ACTIONS.index(self.station.settings['fenceAction']))
+        self.fenceAction.currentTextChanged.connect(lambda text: self.station.settings.__setitem__('fenceAction', text))
+        self.fenceButton = QtWidgets.QPushButton('Load Fences')
+        self.fenceButton.clicked.connect(lambda: self.loadFences())
+        self.fenceStatus = QtWidgets.QLabel()
+        self.fenceStatus.setText('NA')
+        self.fenceStatus.setProperty('class', 'font_12')
+        fenceLayout.addRow('Fences (GeoJSON):', self.fenceFile)
+        fenceLayout.addRow('On Breach:', self.fenceAction)
+        fenceLayout.addRow(self.fenceButton, self.fenceStatus)
+        replayOptionsText = QtWidgets.QLabel()
+        replayOptionsText.setText('Replay')
+        replayOptionsText.setProperty('class', 'header')
+        replayOptionsText.setAlignment(QtCore.Qt.AlignLeft)
+        replayLayout = QtWidgets.QFormLayout()
+        self.replayFile = QtWidgets.QLineEdit()
+        self.replayFile.setText('logs/telemetry.bin')
+        self.replayFile.setFixedWidth(150)
+        self.replayFile.setProperty('class', 'font_12')
+        self.replaySpeed = QtWidgets.QLineEdit()
+        self.replaySpeed.setAlignment(QtCore.Qt.AlignCenter)
+        self.replaySpeed.setText('1')
+        self.replaySpeed.setFixedWidth(70)
+        self.replaySpeed.setProperty('class', 'font_12')
+        self.replayButton = QtWidgets.QPushButton('Start Replay')
+        self.replayButton.clicked.connect(lambda: self.startReplay())
+        self.replayStatus = QtWidgets.QLabel()
+        self.replayStatus.setText('NA')
+        self.replayStatus.setProperty('class', 'font_12')
+        replayLayout.addRow('Recording:', self.replayFile)
+        replayLayout.addRow('Speed (0 = max):', self.replaySpeed)
+        replayLayout.addRow(self.replayButton, self.replayStatus)
         layout.addWidget(portOptionsText)
         layout.addLayout(portLayout)
+        layout.addWidget(self.reconnect)
         layout.addWidget(loraOptionsText)
         layout.addLayout(loraLayout)
         layout.addWidget(mapOptionsText)
         layout.addWidget(self.autoPan)
+        layout.addLayout(refreshLayout)
+        layout.addWidget(fenceOptionsText)
+        layout.addLayout(fenceLayout)
+        layout.addWidget(replayOptionsText)
+        layout.addLayout(replayLayout)
         layout.addStretch()
         SHTab.setLayout(layout)
         return SHTab
@@ -545,180 +1015,306 @@ class Window(QtWidgets.QWidget):
         if b != 'OK':
             msg.setIcon(QtWidgets.QMessageBox.Critical)
         msg.exec_()
-    # scan serial ports
-    def scanPorts(self):
-        self.portList.clear()
-        self.currentPort = ' ' 
-        self.ports = [' '] # list of serial ports
-        self.portsFullName = [' '] # verbose list of serial ports
-        for port, desc, hwid in sorted(serial.tools.list_ports.comports()):
-            self.ports.append(port)
-            self.portsFullName.append(port + ' - ' + hwid)
-        self.portList.addItems(self.portsFullName)
-    # initialize LoRa connection
-    def initLora(self):
-        self.sendCommand(self.loraCommands[0])
-        line = self.readLora()
-        if line != 'Invalid response' and line != 'Timeout':
-            return 1
-        elif line == 'Invalid response':
-            self.msgBox('ERROR', 'Invalid response', 'ERROR')
-        return 0
-    # request information about LoRa
-    def loraTest(self):
-        text = ''
-        if self.connected == True:
-            if self.initLora() == 1:
-                for i in range(len(self.loraCommands) - 1):
-                    self.sendCommand(self.loraCommands[i + 1])
-                    line = self.readLora()
-                    if line == 'Timeout':
-                        return
-                    elif line == 'Invalid response':
-                        self.msgBox('ERROR', 'Invalid response', 'ERROR')
-                    else:
-                        text += line + '\n'
-                self.msgBox('LoRa Info', text, 'OK')
+    # scan serial ports, comports() can take a while so background scans run on a thread and show through the bus
+    def scanPorts(self, background = False):
+        if background:
+            threading.Thread(target = lambda: self.bus.post('ports', lambda found = sorted(serial.tools.list_ports.comports()): \
+                self.showPorts(found)), daemon = True).start()
         else:
-            self.msgBox('ERROR', 'ERROR: Serial connection not established.', 'ERROR')
-    # set LoRa parameters
-    def setParams(self, o):
-        result = self.sendCustomCommand('AT+PARAMETER=' + self.spreadingFactor.text() + \
-            ',' + self.bandwidth.text() + ',' + self.codingRate.text() + ',' + self.preamble.text() + '\r\n')
-        if result and o:
-            self.msgBox(' ', 'Parameters set', 'OK')
-        elif result and not o: 
-            return 1
-        else:  
-            return 0
-    # set all LoRa settings
-    def setAll(self):
-        result = self.setParams(0)
-        if result: result = self.sendCustomCommand('AT+IPR=' + self.uart.text() + '\r\n')
-        else: return
-        if result: result = self.sendCustomCommand('AT+BAND=' + self.band.text() + '\r\n')
-        else: return
-        if result: result = self.sendCustomCommand('AT+NETWORKID=' + self.networkID.text() + '\r\n')
-        else: return
-        if result: result = self.sendCustomCommand('AT+ADDRESS=' + self.gsAddress.text() + '\r\n')
-        else: return
-        self.msgBox(' ', 'Everything set', 'OK')
-    # send command to LoRa 
-    def sendCommand(self, c):
-        print(c)
-        self.writeBuf.put(c)
-    # send custom command to LoRa
-    def sendCustomCommand(self, c):
-        if self.connected == False:
-            self.msgBox('ERROR', 'ERROR: Serial connection not established.', 'ERROR')
-            return
-        self.sendCommand(c)
-        line = self.readLora()
-        if line != 'Invalid response' and line != 'Timeout':
-            self.receivedMsg.setText(line)
-            return 1
-        else:
-            self.receivedMsg.setText('No response')
-            return 0
+            self.showPorts(sorted(serial.tools.list_ports.comports()))
+    # bring the port list up to date with the ports found, items are added and removed in place so the selection stays
+    def showPorts(self, found):
+        listed = [(p, '', '') for p in self.ports[1:] if p not in self.extraPorts]
+        added, removed = ports.diff(listed, found)
+        for port in removed:
+            if port == self.currentPort: self.portLost(port)
+            i = self.ports.index(port)
+            del self.ports[i]
+            del self.portsFullName[i]
+            self.portList.removeItem(i)
+        for port, desc, hwid in added: # sorted, before the extra ones
+            i = next((i for i, p in enumerate(self.ports) if i and (p in self.extraPorts or p > port)), len(self.ports))
+            self.ports.insert(i, port)
+            self.portsFullName.insert(i, port + ' - ' + hwid)
+            self.portList.insertItem(i, port + ' - ' + hwid)
+        for port in self.extraPorts:
+            if port not in self.ports:
+                self.ports.append(port)
+                self.portsFullName.append(port + ' - simulated')
+                self.portList.addItem(port + ' - simulated')
+        if self.lostPort in self.ports and self.reconnect.isChecked() and not self.station.connected:
+            self.loraLog.appendPlainText('Modem is back on ' + self.lostPort + ', reconnecting')
+            self.portList.setCurrentIndex(self.ports.index(self.lostPort))
+            self.switchPort()
+    # the connected modem's port disappeared, disconnect and remember it for reconnecting
+    def portLost(self, port):
+        self.loraLog.appendPlainText('Modem on ' + port + ' disconnected')
+        self.portList.setCurrentIndex(0)
+        self.switchPort()
+        self.lostPort = port
+    # show station events, protocol events arrive on the connection thread and go through the bus
+    # per rover events only reach the labels for the rover picked in the rover list
+    def stationEvent(self, event, *args):
+        if event == 'message':
+            if threading.current_thread() is threading.main_thread():
+                self.msgBox(*args)
+            else:
+                self.bus.post('message', lambda: self.msgBox(*args))
+        elif event == 'response':
+            self.bus.setText(self.receivedMsg, args[0])
+            self.bus.post(object(), lambda: self.loraLog.appendPlainText(args[0]))
+        elif event == 'lora':
+            self.bus.post(object(), lambda: self.loraLog.appendPlainText(args[1].strip()))
+        elif event == 'ready':
+            if not args[0]: self.bus.post('ready', self.portFailed)
+        elif event == 'session':
+            session = args[0]
+            self.bus.post(('session', session.address), lambda: self.addRover(session))
+        elif event == 'state':
+            if self.shown(args[0]) or (args[0] is None and (not self.rover or self.station.session(self.rover) is None)):
+                self.changeState(*args[1:])
+        elif event == 'sent':
+            if self.shown(args[0]): self.bus.setText(self.sent, args[1])
+        elif event == 'status':
+            if self.shown(args[0]): self.bus.post(self.sentStatus, lambda: self.showState(self.sentStatus, *args[1:]))
+        elif event == 'received':
+            msg = args[1]
+            if self.station.replaying:
+                rate = self.station.rxCount / max(1e-9, time.perf_counter() - self.station.rxStart)
+                self.bus.setText(self.replayStatus, str(self.station.rxCount) + '/' + str(self.station.replayTotal) + ' messages, ' + \
+                    str(round(rate, 1)) + ' msg/s')
+            now = time.monotonic()
+            self.history.append(msg.address, 'RSSI', now, float(msg.rssi))
+            self.history.append(msg.address, 'SNR', now, float(msg.snr))
+            if self.shown(args[0]):
+                self.bus.setText(self.received, '+RCV=' + ','.join(str(m) for m in msg))
+                self.bus.setText(self.address, 'Rover\'s Address: ' + str(msg.address))
+                self.bus.setText(self.rssi, 'RSSI: ' + str(msg.rssi) + ' dBm')
+                self.bus.setText(self.snr, 'SNR: ' + str(msg.snr))
+                self.bus.setText(self.queueStatus, self.queueText(args[0])) # refresh the age of waiting commands
+                self.bus.post(self.linkQuality, lambda: self.linkQuality.setText(self.qualityText(args[0])))
+        elif event == 'telemetry':
+            self.record(args[0], args[1])
+            if self.shown(args[0]):
+                data = args[1]
+                self.bus.setText(self.stateText, 'State: ' + data[3])
+                self.bus.setText(self.posXText, 'Pos X: ' + data[4])
+                self.bus.setText(self.posYText, 'Pos Y: ' + data[5])
+                self.bus.setText(self.posZText, 'Pos Z: ' + data[6])
+                self.bus.setText(self.altText, 'Altitude: ' + data[9] + ' m')
+                self.bus.post('track', lambda: self.showTrack(args[0].track))
+        elif event == 'timing':
+            if self.shown(args[0]): self.bus.setText(self.timing, self.timingText(args[0]))
+        elif event == 'queue':
+            if self.shown(args[0]): self.bus.setText(self.queueStatus, self.queueText(args[0]))
+        elif event == 'mission':
+            if self.shown(args[0]): self.bus.setText(self.missionStatus, self.missionText(args[1]))
+        elif event == 'airtime':
+            self.bus.setText(self.airtime, self.airtimeText(args[0]))
+        elif event == 'position':
+            self.update(*args)
+        elif event == 'lock':
+            self.bus.post('settings', lambda: self.lockSettings(True))
+            if self.shown(args[0]): self.bus.post(self.closeConnection, lambda: self.closeConnection.setDisabled(False))
+    # keep the telemetry fields of a rover for the plot
+    def record(self, session, data):
+        now = time.monotonic()
+        self.history.append(session.address, 'State', now, self.history.label(data[3]))
+        for name, i in (('Pos X', 4), ('Pos Y', 5), ('Pos Z', 6), ('Altitude', 9)):
+            try:
+                self.history.append(session.address, name, now, float(data[i]))
+            except ValueError:
+                pass
+    # round trip estimate and retransmissions of a session
+    def timingText(self, session):
+        rtt = 'NA' if session.srtt is None else str(round(session.srtt * 1000)) + ' ms'
+        return 'RTT: ' + rtt + '  RTO: ' + str(round(session.rto * 1000)) + ' ms  Retransmits: ' + str(session.retransmits)
+    # commands waiting for a rover by priority class, how long the oldest has waited and how many were replaced
+    def queueText(self, session):
+        buf = session.commandBuf
+        safety, preempt, drive = buf.counts()
+        text = 'Queue: ' + str(safety + preempt + drive) + ' commands'
+        if safety + preempt + drive:
+            text += ' (' + str(safety) + ' safety, ' + str(preempt) + ' preempt, ' + str(drive) + ' drive), oldest ' + \
+                format(buf.age(), '.1f') + ' s'
+        return text + '  Superseded: ' + str(buf.superseded) + '  Dropped: ' + str(buf.dropped)
+    # link statistics of a session over the last minute and since it connected
+    def qualityText(self, session):
+        now = time.monotonic()
+        return 'Last minute  ' + linkstats.text(session.quality.summary(now, 60, len(session.inflight))) + '\nSession  ' + \
+            linkstats.text(session.quality.summary(now, None, len(session.inflight)))
+    # predicted and measured airtime of the last frame and how much of the duty cycle the radio uses
+    def airtimeText(self, scheduler):
+        predicted, measured = scheduler.last
+        return 'Airtime: ' + str(round(predicted * 1000)) + ' ms predicted, ' + str(round(measured * 1000)) + ' ms measured  ' + \
+            'Utilisation: ' + format(scheduler.utilisation(time.monotonic()) * 100, '.1f') + '% of ' + \
+            format(airtime.dutyCycle(self.station.settings) * 100, '.3g') + '%'
+    # event is for the rover picked in the rover list
+    def shown(self, session):
+        return session is not None and str(session.address) == self.rover
+    # list a newly connected rover, the first one is picked
+    def addRover(self, session):
+        if self.roverList.findText(str(session.address)) == -1:
+            self.roverList.addItem(str(session.address))
+        if not self.rover:
+            self.roverList.setCurrentText(str(session.address))
+            self.selectRover()
+    # show the rover picked in the rover list, commands go to it
+    def selectRover(self):
+        self.rover = self.roverList.currentText()
+        self.roverAddress.setText(self.rover)
+        session = self.station.session(self.rover) if self.rover else None
+        if session:
+            self.showState(self.connStatus, session.connectionState, 'success' if session.connectionState == 'ESTABLISHED' else 'warning')
+            self.address.setText('Rover\'s Address: ' + str(session.address))
+            self.rssi.setText('RSSI: ' + str(session.message.rssi) + ' dBm')
+            self.snr.setText('SNR: ' + str(session.message.snr))
+            self.sent.setText(session.lastMsg or 'NA')
+            self.timing.setText(self.timingText(session))
+            self.queueStatus.setText(self.queueText(session))
+            self.linkQuality.setText(self.qualityText(session))
+        self.closeConnection.setDisabled(session is None)
+        rover = self.rovers.get(int(self.rover)) if self.rover else None
+        if rover: self.showPosition(rover)
     # Handle input from user
     def buttonPressed(self, button):
         if button == '1':
             if self.travelState == 1:
                 data = self.destLat.text() + ' ' + self.destLong.text()
-                self.createTx(data, 1)
+                if not self.station.createTx(data, 1): return # refused, the destination can be changed and sent again
                 self.travelState = 0
-                self.sentFile.write('[' + datetime.now().strftime('%b %d %H:%M:%S') + ']  ' + 'Lat: ' + \
-                    self.destLat.text() + ' Long: ' + self.destLong.text() + '\n') 
                 self.travel.setText('Cancel')
-                self.map.runJavaScript(f'{self.destMarker.jsName}.setIcon(markerIcon4);')
+                self.runJavaScript(f'{self.destMarker.jsName}.setIcon(markerIcon4);')
             else:
                 self.resetM()
         elif button == '2':
             data = self.pointX.text() + ' ' + self.pointY.text() + ' ' + self.pointZ.text() + ' ' + \
                 self.startList.currentText() + ' ' + self.cancelList.currentText() + ' ' + self.shutdownList.currentText() + \
                 ' ' + self.rcPreemptList.currentText() +  ' ' + self.posePreemptList.currentText()
-            self.createTx(data, 2)
-            self.sentFile.write('[' + datetime.now().strftime('%b %d %H:%M:%S') + '] X = ' + self.pointX.text() + \
-                ' Y = ' + self.pointY.text() + ' Z = ' + self.pointZ.text() + ' Start = ' + self.startList.currentText() + \
-                ' Cancel = ' + self.cancelList.currentText() + ' Shutdown = ' + self.shutdownList.currentText() + \
-                ' RC Preempt = ' + self.rcPreemptList.currentText() +  ' Pose Preempt = ' + self.posePreemptList.currentText())
+            self.station.createTx(data, 2)
         elif button == '3':
             data = self.forward.text() + ' ' + self.reverse.text() + ' ' + self.left.text() + ' ' + self.right.text()
-            self.createTx(data, 3)
-            self.sentFile.write('[' + datetime.now().strftime('%b %d %H:%M:%S') + '] Forward: ' + self.forward.text() + \
-                ' Reverse: ' + self.reverse.text() + ' Left: ' + self.left.text() + ' Right: ' + self.right.text())
-        else:
-            self.createTx(button, 4)
+            self.station.createTx(data, 3)
     # switch map style
     def mapToggle(self):
+        self.createMap()
         if self.currentMap: self.currentMap = 0
         else: self.currentMap = 1
-        L.tileLayer(self.maps[self.currentMap], {'maxNativeZoom': 19, 'maxZoom': 25}).addTo(self.map)
+        self.runJavaScript(self.tileLayer.jsName + '.setUrl(\"' + self.maps[self.currentMap] + '\");')
+    # download map tiles around the starting location for offline use, or around the middle of the map with no rover
+    def prefetchTiles(self):
+        try:
+            radius = float(self.prefetchRadius.text())
+        except ValueError:
+            radius = 0
+        if not 1 <= radius <= 5000:
+            self.prefetchStatus.setText('Radius must be 1 to 5000 m')
+            return
+        rover = self.rovers.get(int(self.rover)) if self.rover else None
+        if rover is not None:
+            self.prefetchAround(rover.origin, radius)
+        elif self.map is not None:
+            self.map.getCenter(lambda center: self.prefetchAround([center['lat'], center['lng']], radius))
+        else:
+            self.prefetchStatus.setText('No location to prefetch around')
+    # download map tiles within radius metres of center in the background
+    def prefetchAround(self, center, radius):
+        box = tiles.boundingBox(center[0], center[1], radius)
+        self.prefetchButton.setDisabled(True)
+        def run():
+            total = [0, 0, 0]
+            for layer in ['dark', 'world']:
+                progress = lambda done, count: self.bus.setText(self.prefetchStatus, layer + ': ' + str(done) + '/' + str(count))
+                counts = self.tileServer.prefetch(layer, *box, 12, 19, progress)
+                total = [t + c for t, c in zip(total, counts)]
+            self.bus.setText(self.prefetchStatus, 'Cached: ' + str(total[0]) + ' Fetched: ' + str(total[1]) + ' Failed: ' + str(total[2]))
+            self.bus.post(self.prefetchButton, lambda: self.prefetchButton.setDisabled(False))
+        threading.Thread(target = run, daemon = True).start()
     # pan map to location
     def panTo(self, location):
-        if(location == 's'): self.map.panTo(self.originalCoordinate)
-        else: self.map.panTo(self.coordinate)
+        rover = self.rovers.get(int(self.rover)) if self.rover else None
+        if rover is None: return
+        self.createMap()
+        if(location == 's'): self.map.panTo(rover.origin)
+        else: self.map.panTo(rover.coordinate)
     # listen for keypresses
     #def keyPressEvent(self, event):
-    # update map/logs
-    def update(self, i):
-        self.updateGPS(i)
-        self.log()
     # update map
-    def updateGPS(self, i):
-        lat = round(self.coordinate[0], 6)
-        long = round(self.coordinate[1], 6)
-        self.latText.setText('Lat: ' + str(lat))
-        self.longText.setText('Long: ' + str(long))
-        self.distance = round(self.getDistance(self.originalCoordinate, self.coordinate), 3)
-        self.distanceText.setText('Distance: ' + str(self.distance) + ' m')
-        self.marker2.setLatLng(self.coordinate)
-        if i: 
-           self.map.runJavaScript('polyline.addLatLng([' + str(self.coordinate[0]) + ',' + str(self.coordinate[1]) + '])')
-        else:
-            self.marker.setLatLng(self.originalCoordinate)
-            self.map.runJavaScript('var startCoordinate = [[' + str(self.originalCoordinate[0]) + ',' + str(self.originalCoordinate[1]) + ']]')
-            self.map.runJavaScript("var polyline = L.polyline(startCoordinate, {color: '#0077ff'}).addTo(" + self.map.jsName + ");")
-            self.map.runJavaScript('polyline.bindTooltip(\"Rover\'s Path\");')
-        if self.autoPan.isChecked(): self.map.panTo(self.coordinate)
-    # distance calculation
-    def getDistance(self, start, current):
-        p = pi / 180
-        a = 0.5 - cos((current[0] - start[0]) * p) / 2 + cos(start[0] * p) * cos(current[0] * p) * (1 - cos((current[1] - start[1]) * p)) / 2
-        return 12742 * asin(sqrt(a)) * 1000
-    # log information to file
-    def log(self):
-        self.coordinatesFile.write('[' + datetime.now().strftime('%b %d %H:%M:%S') + ']   Lat: ' + str(self.coordinate[0]) \
-            + '  Long: ' + str(self.coordinate[1]) + '\n')
-        self.telemetryFile.write('[' + datetime.now().strftime('%b %d %H:%M:%S') + ']  ' + self.distanceText.text() + '\n')
+    def update(self, session, i):
+        self.trackBuf.append((session.address, session.coordinate, i))
+        self.bus.post('gps', self.updateGPS)
+    # update map, every rover's fixes since the last frame go out in one javascript call
+    def updateGPS(self):
+        self.createMap()
+        js = ''
+        moved = {}
+        while self.trackBuf:
+            address, point, i = self.trackBuf.popleft()
+            rover = self.rovers.get(address)
+            if rover is None:
+                rover = self.rovers[address] = RoverMap(address, RoverMap.colors[len(self.rovers) % len(RoverMap.colors)])
+                js += rover.create(self.map.jsName, self.layerGroup.jsName)
+            if i:
+                rover.track.add(point)
+            else:
+                js += rover.restart(point)
+            rover.coordinate = point
+            moved[address] = rover
+        for rover in moved.values():
+            js += rover.flush()
+        rover = moved.get(int(self.rover)) if self.rover else None
+        if rover:
+            self.showPosition(rover)
+            if self.autoPan.isChecked(): js += self.map.jsName + '.panTo(' + str(rover.coordinate) + ');'
+        self.runJavaScript(js)
+    # position labels for a rover
+    def showPosition(self, rover):
+        self.latText.setText('Lat: ' + str(round(rover.coordinate[0], 6)))
+        self.longText.setText('Long: ' + str(round(rover.coordinate[1], 6)))
+        self.distanceText.setText('Distance: ' + str(round(analytics.distance(rover.origin, rover.coordinate), 3)) + ' m')
+    # path length, speed, heading, vertical rate and ETA of a rover's track
+    def showTrack(self, track):
+        self.pathText.setText('Path: ' + str(round(track.length, 1)) + ' m')
+        speed = 'NA' if track.speed is None else format(track.speed, '.2f') + ' m/s'
+        self.speedText.setText('Speed: ' + speed + ('' if track.heading is None else ' ' + str(round(track.heading)) + ' deg'))
+        self.climbText.setText('Climb: ' + ('NA' if track.climb is None else format(track.climb, '.2f') + ' m/s'))
+        eta = track.eta()
+        self.etaText.setText('ETA: ' + ('NA' if eta is None else str(int(eta // 60)) + ':' + format(int(eta % 60), '02d')))
+    # match track detail to the map zoom
+    def zoomTrack(self, zoom):
+        if zoom is None or self.map is None:
+            return
+        js = ''
+        for rover in self.rovers.values():
+            if rover.track.points:
+                rover.track.setZoom(zoom)
+                js += rover.track.flush(rover.line)
+        if js: self.runJavaScript(js)
     # reset map and communication
     def resetMC(self, p):
         self.resetM()
-        self.connected = False
-        self.changeState('CLOSED', 'danger')
-        self.seqNum = 0;
-        self.ackNum = 0;
+        self.station.stop()
+        self.bus.clear() # connection thread is gone, drop its pending updates
+        self.trackBuf.clear()
+        self.roverList.clear()
+        self.rover = ''
         self.controlList.setCurrentIndex(0)
         self.address.setText('Rover\'s Address: NA')
         self.received.setText('NA')
         self.sent.setText('NA')
         self.rssi.setText('RSSI: NA')
         self.snr.setText('SNR: NA')
-        self.connectionThread.join()
-        self.writeThread.join()
+        self.linkQuality.setText('Link: NA')
         self.currentPort = p
-        self.serialPort.close()
-        self.allSet.setDisabled(False)
-        self.setParameters.setDisabled(False)
-        self.testLora.setDisabled(False)
-        self.commandButton.setDisabled(False)
+        self.lockSettings(False)
     # reset map
     def resetM(self):
         data = 'Cancel'
         #self.sendCommand('AT+SEND=' + self.roverAddress.text() + ',' + str(len(data)) + ',' + data + '\r\n')
-        self.map.runJavaScript(f'{self.destMarker.jsName}.setOpacity(0)')
-        self.map.runJavaScript(f'{self.destMarker.jsName}.setIcon(markerIcon3);')
-        self.destMarker.unbindTooltip()
+        if self.map is not None:
+            self.runJavaScript(f'{self.destMarker.jsName}.setOpacity(0)')
+            self.runJavaScript(f'{self.destMarker.jsName}.setIcon(markerIcon3);')
+            self.destMarker.unbindTooltip()
         self.destLat.setText('')
         self.destLong.setText('')
         self.travel.setText('Travel')
@@ -727,8 +1323,9 @@ class Window(QtWidgets.QWidget):
     # handle port switches
     def switchPort(self):
         p = self.ports[self.portList.currentIndex()]
+        self.lostPort = None # picking a port stops waiting for a lost one
         if p == ' ':
-            if self.connected == True: 
+            if self.station.connected == True: 
                 self.controlList.setDisabled(True)
                 self.hideControls(True, 'all')
                 self.resetMC(p)
@@ -741,24 +1338,34 @@ class Window(QtWidgets.QWidget):
             return
         else: 
             self.currentPort = p
-        if self.connected == True:
+        if self.station.connected == True:
             self.hideControls(True, 'all')
             self.resetMC(p)
             window.resize(700,670)
-        self.serialPort = serial.Serial(port = p, baudrate = int(self.baudrateText.text()), bytesize = int(self.bytesizeText.text()), \
-            timeout = int(self.timeoutText.text()), stopbits = serial.STOPBITS_ONE)
-        self.connectionThread = threading.Thread(target = self.connection, args = [self.serialPort], daemon = True)
-        self.writeThread = threading.Thread(target = self.write, args = [self.serialPort], daemon = True)
-        self.changeState('LISTEN', 'warning')
         self.controlList.setDisabled(False)
-        self.connected = True
-        self.writeThread.start()
-        if self.initLora() == 0:
+        try:
+            self.station.openSerial(p) # LoRa answers later, a 'ready' event for False calls portFailed
+        except (serial.SerialException, ValueError) as e:
+            self.msgBox('ERROR', 'ERROR: ' + str(e), 'ERROR')
+            self.portFailed()
+    # LoRa did not answer on the port, or it would not open
+    def portFailed(self):
+        if self.station.connected: self.station.stop()
+        self.currentPort = ' '
+        self.controlList.setDisabled(True)
+        self.portList.setCurrentIndex(0)
+    # play a recording back through the connection state machine
+    def startReplay(self):
+        if self.station.connected == True:
             self.portList.setCurrentIndex(0)
             self.switchPort()
-        else:
-            self.setAll()
-        self.connectionThread.start()
+        try:
+            self.station.openReplay(self.replayFile.text(), float(self.replaySpeed.text()))
+        except (OSError, ValueError) as e:
+            self.msgBox('ERROR', 'ERROR: ' + str(e), 'ERROR')
+            return
+        self.controlList.setDisabled(False)
+        self.currentPort = 'replay:' + self.replayFile.text()
     # handle control switches
     def switchControl(self):
         if self.controlList.currentIndex() == 0: 
@@ -768,20 +1375,28 @@ class Window(QtWidgets.QWidget):
         elif self.controlList.currentIndex() == 1: 
             self.hideControls(True, 'manual 1')
             self.hideControls(True, 'manual 2')
+            self.hideControls(True, 'mission')
             self.hideControls(False, 'blind')
             window.resize(700,700)
         elif self.controlList.currentIndex() == 2: 
             self.hideControls(True, 'blind')
             self.hideControls(True, 'manual 2')
+            self.hideControls(True, 'mission')
             self.hideControls(False, 'manual 1')
             self.resetM()
             window.resize(700,870)
-        else:
+        elif self.controlList.currentIndex() == 3: 
             self.hideControls(True, 'blind')
             self.hideControls(True, 'manual 1')
+            self.hideControls(True, 'mission')
             self.hideControls(False, 'manual 2')
             self.resetM()
             window.resize(700,850)
+        else:
+            self.hideControls(True, 'all')
+            self.hideControls(False, 'mission')
+            self.resetM()
+            window.resize(700,720)
     # show/hide controls 
     def hideControls(self, h, o):
         if o == 'all':
@@ -814,6 +1429,7 @@ class Window(QtWidgets.QWidget):
             self.destLat.setHidden(h)
             self.destLong.setHidden(h)
             self.travel.setHidden(h)
+            self.hideControls(h, 'mission')
         elif o == 'manual 1':
             self.pointXText.setHidden(h)
             self.pointX.setHidden(h)
@@ -842,6 +1458,13 @@ class Window(QtWidgets.QWidget):
             self.rightText.setHidden(h)
             self.right.setHidden(h)
             self.manualButton2.setHidden(h)
+        elif o == 'mission':
+            self.waypointText.setHidden(h)
+            self.missionStatus.setHidden(h)
+            self.undoWaypoint.setHidden(h)
+            self.clearMission.setHidden(h)
+            self.uploadMission.setHidden(h)
+            self.resumeMission.setHidden(h)
         else: 
             self.destLat.setHidden(h)
             self.destLong.setHidden(h)
@@ -850,178 +1473,69 @@ class Window(QtWidgets.QWidget):
     def setDest(self, dest):
         if self.travelState == 0:
             return
-        if self.controlList.currentIndex() == 1:
+        if self.controlList.currentIndex() in (1, 4):
+            breached = self.station.geofence.check([dest['lat'], dest['lng']])
+            if breached:
+                self.msgBox('ERROR', 'ERROR: Destination breaches geofence ' + ', '.join(sorted({f.name for f in breached})) + '.', 'ERROR')
+                return
+        if self.controlList.currentIndex() == 4:
+            self.editMission(self.waypoints + [[dest['lat'], dest['lng']]])
+        elif self.controlList.currentIndex() == 1:
             self.destLat.setText(str(dest['lat']))
             self.destLong.setText(str(dest['lng']))
             self.destMarker.setLatLng([dest['lat'], dest['lng']])
             self.travel.setDisabled(False)
-            self.map.runJavaScript(f'{self.destMarker.jsName}.setOpacity(1)')
+            self.runJavaScript(f'{self.destMarker.jsName}.setOpacity(1)')
             self.destMarker.bindTooltip('Destination')
-    # write to serial port
-    def write(self, ser):
-        while self.connected:
-            if not self.writeBuf.empty():
-                ser.write(self.writeBuf.get().encode('Ascii'))
-    # read from serial port
-    def read(self):
-        if self.serialPort.in_waiting > 0:
-            return self.serialPort.readline().decode()
-    # create tx msg
-    def createTx(self, data, option):
-        if option == 1:
-            msg = 'CMD BD ' + data
-        elif option == 2:
-            msg = 'CMD MAN1 ' + data
-        elif option == 3:
-            msg = 'CMD MAN2 ' + data
-        self.commandBuf.put(msg)
-    # command tx format
-    def cmdTx(self):
-        msg = self.commandBuf.get()
-        msg = str(self.seqNum) + ' ' + str(self.ackNum) + ' ' + msg
-        msg = 'AT+SEND=' + self.roverAddress.text() + ',' + str(len(msg)) + ',' + msg + '\r\n'
-        self.lastMsg = msg
-        self.sent.setText(msg)
-        self.sendCommand(msg)
-    # msg tx format 
-    def msgTx(self, c):
-        msg = str(self.seqNum) + ' ' + str(self.ackNum) + ' ' + c
-        msg = 'AT+SEND=' + self.roverAddress.text() + ',' + str(len(msg)) + ',' + msg + '\r\n'
-        self.lastMsg = msg
-        self.sent.setText(msg)
-        self.sendCommand(msg)
-    # msg rx format 
-    def msgRx(self, msg):
-        if msg and msg[:5] == '+RCV=':
-            self.received.setText(msg)
-            msg = msg[5:]
-            self.message = msg.split(',')
-            self.address.setText('Rover\'s Address: ' + self.message[0])
-            self.receivedFile.write('[' + datetime.now().strftime('%b %d %H:%M:%S') + ']  ' + self.message[2] + '\n') 
-            self.rssi.setText('RSSI: ' + self.message[3] + ' dBm')
-            self.snr.setText('SNR: ' + self.message[4])
-            return self.message[2]
-    # parse rx message
-    def parseMsg(self):
-        data = self.msgRx(self.read())
-        if data and (' ' in data):
-            data = data.split(' ')
-            return data
-    # change state
+    # show connection state
     def changeState(self, s, c):
-        self.connectionState = s
-        self.connStatus.setText(s)
-        self.connStatus.setProperty('class', c)
-        self.style().unpolish(self.connStatus)
-        self.style().polish(self.connStatus)
-    # communication state machine
-    def connection(self, ser):
-        while self.connected:
-            if self.connectionState == 'LISTEN':
-                data = self.parseMsg()
-                if data and data[2] == 'SYN':
-                    self.ackNum = int(data[0]) + 1
-                    self.allSet.setDisabled(True)
-                    self.setParameters.setDisabled(True)
-                    self.testLora.setDisabled(True)
-                    self.commandButton.setDisabled(True)
-                    self.msgTx('SYN')
-                    self.changeState('SYN-RECEIVED', 'warning')
-                    self.closeConnection.setDisabled(False)
-            elif self.connectionState == 'SYN-RECEIVED':
-                data = self.parseMsg()
-                if data and data[2] == 'ACK':
-                    self.seqNum = int(data[1])
-                    self.msgTx('ACK')
-                    self.changeState('ESTABLISHED', 'success')
-            elif self.connectionState == 'ESTABLISHED':
-                data = self.parseMsg()
-                if data and data[2] == 'ACK':
-                    print(data)
-                    print(data[0] + ' ' + str(self.ackNum))
-                    if int(data[0]) != self.ackNum: 
-                        self.sent.setText(self.lastMsg)
-                        self.sentStatus.setText("Sequence Error: Retransmitting")
-                        self.sentStatus.setProperty('class', 'danger')
-                        self.sendCommand(self.lastMsg)
-                    else:
-                        print(len(data))
-                        self.sentStatus.setText("Message sent successfully")
-                        self.sentStatus.setProperty('class', 'success')
-                        self.seqNum = int(data[1])
-                        if len(data) > 3:
-                            self.stateText.setText('State: ' + data[3])
-                            self.posXText.setText('Pos X: ' + data[4])
-                            self.posYText.setText('Pos Y: ' + data[5])
-                            self.posZText.setText('Pos Z: ' + data[6])
-                            self.coordinate = [float(data[7]), float(data[8])]
-                            if self.originalCoordinate == [0,0]:
-                                self.originalCoordinate = [float(data[7]), float(data[8])]
-                                self.update(False)
-                            else :
-                                self.update(True)
-                            self.altText.setText('Altitude: ' + data[9] + ' m')
-                        if self.closeFlag: 
-                            self.msgTx('FIN')
-                            self.changeState('FIN-WAIT', 'warning')
-                            self.closeFlag = 0
-                        elif not self.commandBuf.empty(): 
-                            self.ackNum = int(data[0]) + 1
-                            self.cmdTx()
-                        else:
-                            self.ackNum = int(data[0]) + 1
-                            self.msgTx('ACK')
-            elif self.connectionState == 'FIN-WAIT':
-                data = self.parseMsg()
-                if data and data[2] == 'FIN':
-                    self.seqNum = int(data[1])
-                    self.ackNum = int(data[0]) + 1
-                    self.changeState('TIME-WAIT', 'warning')
-            elif self.connectionState == 'TIME-WAIT':
-                self.msgTx('ACK')
-                self.seqNum = 0
-                self.ackNum = 0
-                self.changeState('CLOSED', 'danger')
-                self.scanPorts()
-                time.sleep(3)
-    # wait/read LoRa response
-    def readLora(self):
-        start = time.time()
-        while self.connected and (time.time() - start) < 5.0:
-            line = self.read()
-            if line:
-                print(line)
-                if line[0] == '+':
-                    return line[1:]
-                return 'Invalid response'
-        self.msgBox('ERROR', 'ERROR: No response from LoRa after 5 seconds.', 'ERROR')
-        return 'Timeout'
+        if threading.current_thread() is threading.main_thread():
+            self.showState(self.connStatus, s, c)
+        else:
+            self.bus.post(self.connStatus, lambda: self.showState(self.connStatus, s, c))
+    # set label text and style class
+    def showState(self, label, s, c):
+        label.setText(s)
+        label.setProperty('class', c)
+        self.style().unpolish(label)
+        self.style().polish(label)
+    # enable/disable LoRa settings
+    def lockSettings(self, d):
+        self.allSet.setDisabled(d)
+        self.setParameters.setDisabled(d)
+        self.testLora.setDisabled(d)
+        self.commandButton.setDisabled(d)
     # close connnection
     def close(self):
-        self.closeFlag = 1
+        self.station.close(self.rover or None)
         self.closeConnection.setDisabled(True)
     # handle exit request
     def closeEvent(self, event):
-        if self.connected == True:
+        if self.station.connected == True:
             self.portList.setCurrentIndex(0)
             self.switchPort()
         msg = 'Are you sure you want to exit the program?'
         reply = QtWidgets.QMessageBox.question(self, 'Exit', msg, QtWidgets.QMessageBox.Yes, QtWidgets.QMessageBox.No)
         if reply == QtWidgets.QMessageBox.Yes:
-            self.coordinatesFile.close()
-            self.telemetryFile.close()
-            self.sentFile.close()
-            self.receivedFile.close()
-            self.serialPort.close()
+            self.station.shutdown()
+            self.tileServer.stop()
+            self.portMonitor.stop()
+            for exporter in self.exporters:
+                exporter.stop()
             event.accept()
         else:
             event.ignore()
         
 if __name__ == "__main__":
     import sys
-    app = QtWidgets.QApplication(sys.argv)
-    window = Window()
-    window.resize(700,670)
+    import argparse
+    parser = argparse.ArgumentParser(prog = 'python gui.py', description = 'Ground station GUI')
+    parser.add_argument('--simulate', action = 'store_true', help = 'add a simulated modem and rover on a pty to the ports')
+    parser.add_argument('--startup-report', action = 'store_true', help = 'print the startup profile once the map is up')
+    parser.add_argument('--metrics', metavar = 'PORT', type = int, help = 'serve Prometheus metrics on 127.0.0.1:PORT/metrics')
+    parser.add_argument('--metrics-file', metavar = 'JSON', help = 'write a metrics snapshot to this file every 10 s')
+    args, rest = parser.parse_known_args() # the rest is for Qt, e.g. -platform
+    app = QtWidgets.QApplication(sys.argv[:1] + rest)
     extra = {
         # Button colors
         'red': '#dc3545',
@@ -1030,9 +1544,29 @@ if __name__ == "__main__":
         # Font
         'font_family': 'Roboto',
     }
-    apply_stylesheet(app, theme='themes/colors.xml', extra=extra)
-    stylesheet = app.styleSheet()
+    profile = StartupProfile()
+    profile.mark('imports')
+    cached = theme.apply(app, 'themes/colors.xml', extra) # before any widget exists so nothing is styled twice
     with open('themes/custom.css') as file:
-        app.setStyleSheet(stylesheet + file.read().format(**os.environ))
+        app.setStyleSheet(app.styleSheet() + file.read().format(**os.environ))
+    profile.mark('stylesheet' + (' (cached)' if cached else ''))
+    window = Window(lazy = True, startup = profile)
+    window.report = args.startup_report
+    if args.metrics is not None: # Prometheus endpoint on a local port
+        server = metrics.MetricsServer(port = args.metrics)
+        server.start()
+        window.exporters.append(server)
+    if args.metrics_file: # JSON snapshot every 10 s
+        snapshot = metrics.Snapshot(args.metrics_file)
+        snapshot.start()
+        window.exporters.append(snapshot)
+    window.resize(700,670)
+    if args.simulate: # simulated modem and rover on a pty
+        from core import simulator
+        sim = simulator.Simulator()
+        window.extraPorts.append(sim.start())
+        window.scanPorts(True)
+    window.startup.mark('window')
     window.show()
+    window.startup.mark('show')
     sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,16 @@
+import pytest
+from core.station import Station, Session
+
+# a station recording into the test's temporary directory, shut down after the test
+@pytest.fixture
+def station(tmp_path):
+    station = Station(str(tmp_path / 'telemetry.bin'))
+    yield station
+    station.shutdown()
+
+# rover 102 in ESTABLISHED on that station
+@pytest.fixture
+def session(station):
+    session = station.sessions[102] = Session(102)
+    session.connectionState = 'ESTABLISHED'
+    return session
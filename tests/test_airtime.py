@@ -0,0 +1,36 @@
+import pytest
+from core import airtime
+
+# time on air matches the Semtech calculator, low data rate optimisation on at SF12 125 kHz
+def testTimeOnAir():
+    assert airtime.timeOnAir(10, 7, 125000, 1, 8) == pytest.approx(0.041216)
+    assert airtime.timeOnAir(10, 12, 125000, 1, 8) == pytest.approx(0.991232)
+    assert airtime.timeOnAir(50, 9, 125000, 4, 12) == pytest.approx(0.492544)
+    assert airtime.frameTime({'spreadingFactor': '7', 'bandwidth': '7', 'codingRate': '1', 'preamble': '8'}, 10) == \
+        pytest.approx(0.041216)
+    assert airtime.frameTime({'spreadingFactor': '7', 'bandwidth': '12', 'codingRate': '1', 'preamble': '8'}, 10) == 0.0
+
+# the duty cycle follows the setting in percent or the band for auto
+def testDutyCycle():
+    assert airtime.dutyCycle({'dutyCycle': 'auto', 'band': '868100000'}) == 0.01
+    assert airtime.dutyCycle({'dutyCycle': 'auto', 'band': '869525000'}) == 0.1
+    assert airtime.dutyCycle({'dutyCycle': 'auto', 'band': '915000000'}) == 1.0
+    assert airtime.dutyCycle({'dutyCycle': '5', 'band': '868100000'}) == 0.05
+    assert airtime.dutyCycle({'dutyCycle': 'x', 'band': '868100000'}) == 1.0
+
+# one frame on the air at a time, and past the budget of the period a frame waits for the oldest to age out
+def testScheduler():
+    scheduler = airtime.Scheduler(period = 100)
+    scheduler.started = 0
+    assert scheduler.wait(0.4, 0.01, 0) == 0
+    scheduler.sent(0.4, 0)
+    assert scheduler.wait(0.4, 0.01, 0.5) == pytest.approx(1.3) # unanswered, 2 airtimes and a second
+    scheduler.done(0.45)
+    assert scheduler.last == (0.4, 0.45)
+    assert scheduler.wait(0.4, 0.01, 1) == 0
+    scheduler.sent(0.4, 1)
+    scheduler.done(0.4)
+    assert scheduler.wait(0.4, 0.01, 2) == pytest.approx(98)
+    assert scheduler.wait(0.4, 1.0, 2) == 0
+    assert scheduler.wait(0.4, 0.01, 100) == 0
+    assert scheduler.utilisation(100) == pytest.approx(0.004)
@@ -0,0 +1,30 @@
+from math import cos, sin, pi
+import pytest
+from core import analytics
+
+# a circle of radius 50 m walked in 5 cm steps, one fix every 0.05 s at 1 m/s
+def circle(steps = 6283):
+    origin = [28.6024, -81.2001]
+    for i in range(steps + 1):
+        a = i * 2 * pi / steps
+        x, y = 50 * cos(a), 50 * sin(a)
+        yield i * 0.05, [origin[0] + y / 111320.0, origin[1] + x / (111320.0 * cos(origin[0] * pi / 180))]
+
+# sub-metre legs add up to the length of the path instead of rounding to zero
+def testShortStepsSumToPathLength():
+    track = analytics.TrackStats()
+    for t, point in circle():
+        track.add(t, point, 12.0)
+    assert track.length == pytest.approx(2 * pi * 50, rel = 0.01)
+    assert track.speed == pytest.approx(1.0, rel = 0.02)
+    assert analytics.distance([28.6024, -81.2001], [28.6024 + 0.05 / 111320.0, -81.2001]) == pytest.approx(0.05, rel = 0.01)
+
+# the numpy path gives the same length
+def testBatchShortSteps():
+    numpy = pytest.importorskip('numpy')
+    fixes = list(circle())
+    t = numpy.array([f[0] for f in fixes])
+    lat = numpy.array([f[1][0] for f in fixes])
+    long = numpy.array([f[1][1] for f in fixes])
+    result = analytics.batch(t, lat, long, numpy.full(len(t), 12.0))
+    assert result['length'][-1] == pytest.approx(2 * pi * 50, rel = 0.01)
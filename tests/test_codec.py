@@ -0,0 +1,16 @@
+from core import codec
+
+# a destination or drive value the compact codec can not carry goes out as text instead of raising
+def testOutOfRangeFallsBackToText():
+    for text in ['1 2 CMD BD 300 -81.2', '1 2 CMD BD 1e300 0', '1 2 CMD MAN2 inf 0 0 0', '1 2 CMD MAN2 nan 0 0 0']:
+        assert codec.pack(text, 1) == text
+    assert codec.pack('1 2 CMD BD 28.6 -81.2', 1)[:1] == codec.MARKER
+
+# the station queues the text frame for an out-of-range blind drive on a codec session
+def testStationSendsOutOfRangeCommand(station, session):
+    session.codec = 1
+    station.createTx('300 -81.2', 1, 102)
+    station.cmdTx(session)
+    station.createTx('inf 0 0 0', 3, 102)
+    station.cmdTx(session)
+    assert [msg.split(',', 2)[2] for msg in session.outbox] == ['0 0 CMD BD 300 -81.2\r\n', '0 0 CMD MAN2 inf 0 0 0\r\n']
@@ -0,0 +1,55 @@
+from core import commands
+
+# MAN1 x y z start cancel shutdown rc pose
+def man1(cancel = False, shutdown = False, rc = False, pose = False):
+    return 'CMD MAN1 1 2 0 False ' + ' '.join(str(flag) for flag in [cancel, shutdown, rc, pose])
+
+# everything of a queue in the order it goes out
+def drain(queue):
+    out = []
+    while not queue.empty():
+        out.append(queue.get())
+    return out
+
+# safety before preempt before drive, first in first out within a class
+def testPriority():
+    queue = commands.CommandQueue()
+    for msg in [man1(cancel = True), man1(shutdown = True), 'CMD BD 1 2', man1(rc = True),
+            'CMD MAN1 3 4 0 True False False False False', man1(pose = True)]:
+        queue.put(msg)
+    assert queue.counts() == [2, 2, 2]
+    assert drain(queue) == [man1(cancel = True), man1(shutdown = True), man1(rc = True), man1(pose = True), 'CMD BD 1 2',
+        'CMD MAN1 3 4 0 True False False False False']
+    assert queue.get() is None and queue.age() == 0.0
+
+# a newer BD or MAN2 replaces the waiting one of its kind and keeps its place at the end, other kinds stay
+def testSupersession():
+    queue = commands.CommandQueue()
+    for msg in ['CMD BD 1 2', 'CMD MAN2 1 0 0 0', 'CMD MAN1 3 4 0 True False False False False', 'CMD BD 5 6',
+            'CMD MAN2 2 0 0 0']:
+        queue.put(msg)
+    assert queue.superseded == 2
+    assert drain(queue) == ['CMD MAN1 3 4 0 True False False False False', 'CMD BD 5 6', 'CMD MAN2 2 0 0 0']
+
+# a cancel or shutdown drops the drive commands still waiting but not a preempting one
+def testSafetyClearsDrive():
+    queue = commands.CommandQueue()
+    for msg in ['CMD BD 1 2', 'CMD MAN1 3 4 0 True False False False False', man1(rc = True), man1(shutdown = True),
+            'CMD BD 5 6']:
+        queue.put(msg)
+    assert queue.dropped == 2
+    assert drain(queue) == [man1(shutdown = True), man1(rc = True), 'CMD BD 5 6']
+
+# drop removes one kind of drive command and clear everything, age is that of the oldest command
+def testDropClearAge():
+    queue = commands.CommandQueue()
+    queue.put('CMD BD 1 2')
+    start = queue.queues[commands.DRIVE][0].time
+    queue.put('CMD WP 1')
+    queue.put('CMD WP 2')
+    queue.put(man1(rc = True))
+    assert queue.age(start + 5) == 5
+    assert queue.drop('WP') == 2
+    assert queue.qsize() == 2
+    assert queue.clear() == 2
+    assert queue.empty()
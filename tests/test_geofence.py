@@ -0,0 +1,52 @@
+import json
+import random
+import pytest
+from core import geofence
+
+# GeoJSON square of side size degrees with its south west corner at lat, long
+def square(lat, long, size):
+    return [[long, lat], [long + size, lat], [long + size, lat + size], [long, lat + size], [long, lat]]
+
+# GeoJSON feature
+def feature(kind, name, *polygons):
+    if len(polygons) == 1:
+        geometry = {'type': 'Polygon', 'coordinates': polygons[0]}
+    else:
+        geometry = {'type': 'MultiPolygon', 'coordinates': list(polygons)}
+    return {'type': 'Feature', 'geometry': geometry, 'properties': {'kind': kind, 'name': name}}
+
+# a keep-out zone is breached inside and not in its hole, outside the boundaries every boundary is breached
+def testInsideOutside():
+    fence = geofence.Geofence(geofence.fences({'type': 'FeatureCollection', 'features': [
+        feature('keepout', 'pond', [square(28.60, -81.20, 0.01), square(28.604, -81.196, 0.002)]),
+        feature('boundary', 'site', [square(28.59, -81.21, 0.03)], [square(28.70, -81.21, 0.01)])]}))
+    assert [f.name for f in fence.check((28.601, -81.199))] == ['pond']
+    assert fence.check((28.605, -81.195)) == [] # in the hole
+    assert fence.check((28.615, -81.185)) == []
+    assert fence.check((28.705, -81.205)) == [] # in the second part of the boundary
+    assert [f.name for f in fence.check((28.65, -81.20))] == ['site', 'site']
+    assert geofence.Geofence().check((0, 0)) == []
+
+# the grid gives the same answer as testing every fence, from far fewer candidates
+def testGrid():
+    rng = random.Random(1)
+    features = [feature('keepout', str(i), [square(28 + rng.random(), -82 + rng.random(), 0.005)]) for i in range(400)]
+    features.append(feature('boundary', 'site', [square(27.99, -82.01, 1.02)]))
+    fence = geofence.Geofence(geofence.fences({'type': 'FeatureCollection', 'features': features}))
+    assert len(fence.grid) > 1
+    for i in range(2000):
+        lat, long = 27.9 + rng.random() * 1.2, -82.1 + rng.random() * 1.2
+        everything = [f for f in fence.fences if f.kind == 'keepout' and f.contains(lat, long)]
+        if not any(f.kind == 'boundary' and f.contains(lat, long) for f in fence.fences):
+            everything += [f for f in fence.fences if f.kind == 'boundary']
+        assert fence.check((lat, long)) == everything
+        assert len(fence.candidates(lat, long)) < 20
+
+# anything but polygon features of a known kind is rejected
+def testLoadRejects(tmp_path):
+    for data in [{'type': 'LineString', 'coordinates': [[0, 0], [1, 1]]}, feature('parking', 'p', [square(0, 0, 1)]),
+            {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 1]]]}, {'type': 'Polygon'}]:
+        path = tmp_path / 'fence.json'
+        path.write_text(json.dumps(data))
+        with pytest.raises(ValueError):
+            geofence.load(str(path))
@@ -0,0 +1,87 @@
+import serial
+from core.link import Link, LinkError, LoraMessage, Request, SendDone
+
+# commands written to the modem in order, as the writer does
+def written(link, *commands):
+    futures = []
+    for c in commands:
+        if c[:8] == 'AT+SEND=':
+            link.pending.append((c, 0.0))
+        else:
+            request = Request(c, 5.0)
+            link.pending.append((c, request))
+            futures.append(request.future)
+    return futures
+
+# a malformed line and an answer after the timeout are reported on the read queue instead of printed
+def testLinkProblemsAreQueued():
+    link = Link()
+    link.frame('+RCV=102,9,x')
+    timedOut, = written(link, 'AT\r\n')
+    timedOut.set_exception(TimeoutError())
+    link.frame('+OK')
+    assert link.receive(0) == LinkError('Malformed message: +RCV=102,9,x')
+    assert link.receive(0) == LinkError('Unexpected line: +OK')
+    assert link.receive(0) is None
+
+# a failed serial write stops the writer, cancels the commands it held and is reported on the read queue
+def testWriteFailureIsReported():
+    class Unplugged:
+        def write(self, data):
+            raise serial.SerialException('device disconnected')
+    link = Link()
+    future = link.command('AT\r\n')
+    link.write(Unplugged())
+    assert future.cancelled()
+    assert link.receive(0) == LinkError('Serial write failed: device disconnected')
+
+# a line between two answers that no command waits for, e.g. +READY after a modem reset, is reported and does not shift
+# the answers of the commands after it
+def testUnsolicitedLineBetweenCommands():
+    link = Link()
+    version, uid = written(link, 'AT+VER?\r\n', 'AT+UID?\r\n')
+    link.frame('+VERSION=RYLR89C_V1.2.7')
+    link.frame('+READY')
+    link.frame('+UID=000000000000000000000000')
+    assert version.result(0) == '+VERSION=RYLR89C_V1.2.7'
+    assert uid.result(0) == '+UID=000000000000000000000000'
+    assert link.receive(0) == LinkError('Unexpected line: +READY')
+    assert not link.pending
+
+# a command whose answer was lost or timed out does not take the answers of the commands after it
+def testLostAnswerDoesNotShiftLaterAnswers():
+    link = Link()
+    band, network = written(link, 'AT+BAND?\r\n', 'AT+NETWORKID?\r\n')
+    timedOut, ok = written(link, 'AT+ADDRESS=101\r\n', 'AT\r\n')
+    written(link, 'AT+SEND=102,5,:LP0?\r\n') # a compact payload can end in '?' like a query
+    link.frame('+NETWORKID=5') # the answer to AT+BAND? never came
+    timedOut.set_exception(TimeoutError())
+    link.frame('+OK')
+    link.frame('+OK')
+    assert isinstance(band.exception(0), TimeoutError)
+    assert network.result(0) == '+NETWORKID=5'
+    assert ok.result(0) == '+OK'
+    assert isinstance(link.receive(0), SendDone)
+    assert not link.pending
+
+# a port that hands the reader one chunk per read and stops the link after the last
+class Chunks:
+    def __init__(self, link, *chunks):
+        self.link = link
+        self.chunks = list(chunks)
+        self.in_waiting = 0
+    def read(self, size):
+        if len(self.chunks) == 1:
+            self.link.running = False
+        return self.chunks.pop(0)
+
+# the reader frames lines across read boundaries, a burst of lines in one read is split and a partial line at the end
+# of a read waits for the rest, a payload with commas is cut out by its length
+def testReadFramesSplitLines():
+    link = Link()
+    link.running = True
+    link.read(Chunks(link, b'+RCV=102,7,1 2 A', b'CK,-40,9\r\n+RCV=102,7,a,b,c d,-41,8\r\n+RC', b'V=103,1,x,-42', b',7\r', b'\n+RCV=10'))
+    assert link.receive(0) == LoraMessage(102, 7, '1 2 ACK', -40, 9)
+    assert link.receive(0) == LoraMessage(102, 7, 'a,b,c d', -41, 8)
+    assert link.receive(0) == LoraMessage(103, 1, 'x', -42, 7)
+    assert link.receive(0) is None
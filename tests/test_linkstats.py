@@ -0,0 +1,50 @@
+import pytest
+from core import linkstats
+
+# log buckets give percentiles within their step of the exact value, linear ones give integers back whole
+def testHistogramPercentiles():
+    rtt = linkstats.Histogram(0.001, 600.0, 0.02, log = True)
+    for ms in range(1, 1001):
+        rtt.add(ms / 1000)
+    for q in [0.001, 0.5, 0.9, 0.99, 1]:
+        assert rtt.percentile(q) == pytest.approx(q, rel = 0.02)
+    rssi = linkstats.Histogram(-164, 0, 1)
+    for v in [-90, -80, -80, -70, -60]:
+        rssi.add(v)
+    assert [rssi.percentile(q) for q in [0.1, 0.5, 0.9]] == [-90, -80, -60]
+    assert rssi.mean() == -76
+    rssi.add(-200) # out of range, counted in the first bucket and kept as the minimum
+    assert rssi.percentile(0.1) == -164 and rssi.min == -200
+    assert linkstats.Histogram(-32, 32, 1).percentile(0.5) is None
+
+# the sliding window holds the slots of the last span seconds, the total holds everything
+def testWindows():
+    stats = linkstats.LinkStats(slot = 10, slots = 6)
+    for t in range(0, 120, 2):
+        stats.sent(t)
+        stats.received(t, -80 if t < 100 else -40, 8)
+        if t % 4 == 0: stats.delivered(t, 1)
+        else: stats.retransmitted(t)
+        stats.roundTrip(t, 0.1 if t < 100 else 1.0)
+    last = stats.summary(119, 20)
+    assert (last['sent'], last['received'], last['delivered'], last['retransmits']) == (10, 10, 5, 5)
+    assert last['rssi']['p50'] == -40 and last['rtt']['p50'] == pytest.approx(1.0, rel = 0.02)
+    assert last['delivery'] == pytest.approx(1 / 3) and last['retransmitRate'] == pytest.approx(1 / 3) # of 15 transmissions
+    total = stats.summary(119)
+    assert (total['sent'], total['received'], total['delivered']) == (60, 60, 30)
+    assert total['rssi']['p50'] == -80 and total['rtt']['max'] == 1.0
+    assert stats.summary(119, 60)['sent'] == 30 # the ring holds 60 s
+    assert stats.summary(200, 20)['sent'] == 0 and stats.summary(200, 20)['delivery'] is None
+    assert stats.summary(119, 20, pending = 5)['delivery'] == 0.5 # frames still unacknowledged are not lost yet
+
+# percentiles in ms and dBm, NA for what was not measured
+def testText():
+    stats = linkstats.LinkStats()
+    assert linkstats.text(stats.summary(0)) == 'Delivery: NA  Retransmits: NA  RTT p50/p90/p99: NA/NA/NA ms  ' + \
+        'RSSI p10/p50/p90: NA/NA/NA dBm  SNR p10/p50/p90: NA/NA/NA dB'
+    stats.sent(0)
+    stats.delivered(0, 1)
+    stats.roundTrip(0, 0.25)
+    stats.received(0, -70, 9)
+    assert linkstats.text(stats.summary(0)) == 'Delivery: 100.0%  Retransmits: 0.0%  RTT p50/p90/p99: 250/250/250 ms  ' + \
+        'RSSI p10/p50/p90: -70/-70/-70 dBm  SNR p10/p50/p90: 9/9/9 dB'
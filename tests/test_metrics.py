@@ -0,0 +1,56 @@
+import json
+import urllib.request
+from core import metrics
+
+# a registry of its own so the station's metrics stay out of the expected text
+def registry():
+    r = metrics.Registry()
+    r.counter('test_frames_total', 'Frames', ['direction']).inc(2, 'out')
+    r.counter('test_frames_total', 'Ignored, already registered').inc(1, 'in')
+    r.gauge('test_depth', 'Queue depth', ['rover'], lambda: {('102',): 3, ('a"b\\c\n',): 0})
+    r.gauge('test_ready', 'Ready').set(1)
+    h = r.histogram('test_seconds', 'Latency', [0.1, 1])
+    for v in [0.05, 0.1, 0.5, 2]:
+        h.observe(v)
+    return r
+
+# help and type per metric sorted by name, escaped label values and cumulative histogram buckets ending in +Inf
+def testText():
+    assert registry().text() == '\n'.join([
+        '# HELP test_depth Queue depth',
+        '# TYPE test_depth gauge',
+        'test_depth{rover="102"} 3',
+        'test_depth{rover="a\\"b\\\\c\\n"} 0',
+        '# HELP test_frames_total Frames',
+        '# TYPE test_frames_total counter',
+        'test_frames_total{direction="out"} 2',
+        'test_frames_total{direction="in"} 1',
+        '# HELP test_ready Ready',
+        '# TYPE test_ready gauge',
+        'test_ready 1',
+        '# HELP test_seconds Latency',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{le="0.1"} 2',
+        'test_seconds_bucket{le="1"} 3',
+        'test_seconds_bucket{le="+Inf"} 4',
+        'test_seconds_sum 2.65',
+        'test_seconds_count 4']) + '\n'
+
+# the scrape endpoint serves the text and the snapshot file holds the same values as JSON
+def testExporters(tmp_path):
+    r = registry()
+    server = metrics.MetricsServer(r)
+    server.start()
+    try:
+        with urllib.request.urlopen(server.url()) as response:
+            assert response.read().decode('utf-8') == r.text()
+            assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+    finally:
+        server.stop()
+    snapshot = metrics.Snapshot(str(tmp_path / 'metrics.json'), r)
+    snapshot.write()
+    with open(str(tmp_path / 'metrics.json')) as file:
+        found = json.load(file)['metrics']
+    assert found['test_frames_total']['values'] == [{'labels': {'direction': 'out'}, 'value': 2},
+        {'labels': {'direction': 'in'}, 'value': 1}]
+    assert found['test_seconds']['buckets'] == [[0.1, 2], [1, 3], ['+Inf', 4]] and found['test_seconds']['count'] == 4
@@ -0,0 +1,47 @@
+from core import mission, codec
+
+# a route of n points around the test field
+def route(n):
+    return [(28.6 + i * 1e-4, -81.2 - i * 1e-4) for i in range(n)]
+
+# every chunk with the room for seq and ack fits a frame in either codec, and the chunks hold the route in order
+def testChunksFitAFrame():
+    for version in [0, 1]:
+        plan = mission.Mission(route(150), 7)
+        chunks = plan.pack(version)
+        assert len(chunks) > 1
+        points = []
+        for i, chunk in enumerate(chunks):
+            assert len(codec.pack(mission.HEADER + chunk, version)) <= mission.PAYLOAD
+            data = chunk.split(' ')
+            assert data[:4] == ['WP', '7', str(i), str(len(chunks))]
+            points += [(float(data[j]), float(data[j + 1])) for j in range(4, len(data), 2)]
+        assert points == [(round(lat, 7), round(long, 7)) for lat, long in route(150)]
+
+# acknowledged chunks are not sent again, packing for the same codec keeps them and another mission's chunk is not one
+def testResume():
+    plan = mission.Mission(route(150), 7)
+    chunks = plan.pack(0)
+    assert plan.ack(chunks[0]) and plan.ack(chunks[2])
+    assert not plan.ack('WP 8 1 ' + str(len(chunks)) + ' 28.6 -81.2')
+    assert plan.pending() == [c for i, c in enumerate(chunks) if i not in (0, 2)]
+    assert plan.pack(0) == chunks and plan.pending() == [c for i, c in enumerate(chunks) if i not in (0, 2)]
+    settings = {'spreadingFactor': '7', 'bandwidth': '7', 'codingRate': '1', 'preamble': '8'}
+    fresh = mission.Mission(route(150), 7)
+    fresh.pack(0)
+    assert 0 < plan.airtime(settings) < fresh.airtime(settings)
+    for chunk in chunks:
+        plan.ack(chunk)
+    assert plan.done() and plan.pending() == []
+
+# after the link drops the station queues only the chunks the rover has not acknowledged
+def testStationResumesUpload(station, session):
+    plan = station.uploadMission(route(150))
+    queued = []
+    while not session.commandBuf.empty():
+        queued.append(session.commandBuf.get())
+    assert queued == ['CMD ' + c for c in plan.chunks]
+    plan.ack(plan.chunks[0])
+    station.resumeMission(102)
+    assert session.commandBuf.qsize() == len(plan.chunks) - 1
+    assert session.commandBuf.get() == 'CMD ' + plan.chunks[1]
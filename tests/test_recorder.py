@@ -0,0 +1,43 @@
+import struct
+import itertools
+import math
+from core import recorder
+
+# every field of a record comes back as written, notes go to their own file and a reopened log drops a torn record
+def testRoundTrip(tmp_path):
+    path = str(tmp_path / 'telemetry.bin')
+    log = recorder.Recorder(path)
+    log.record(recorder.RX, '102', '5 6 ACK RUNNING 1.5 2.5 3.5 28.6 -81.2 12.5', -40, 9)
+    log.record(recorder.TX, 102, '6 6 CMD BD 28.6 -81.2')
+    log.note('link', {'loss': 0.25})
+    log.close()
+    with open(path, 'ab') as file:
+        file.write(b'torn')
+    log = recorder.Recorder(path)
+    log.record(recorder.RX, 'gone', 'not a frame')
+    log.close()
+    rx, tx, other = recorder.read(path)
+    assert rx[1:] == (recorder.RX, 2, 102, 5, 6, -40, 9, 28.6, -81.2, 12.5, 1.5, 2.5, 3.5, 'RUNNING',
+        '5 6 ACK RUNNING 1.5 2.5 3.5 28.6 -81.2 12.5')
+    assert (tx.direction, tx.kind, tx.seq, tx.ack, tx.payload) == (recorder.TX, 4, 6, 6, '6 6 CMD BD 28.6 -81.2')
+    assert math.isnan(tx.lat) and tx.state == ''
+    assert (other.address, other.kind, other.payload) == (0, 0, 'not a frame')
+    assert rx.time <= tx.time <= other.time
+    assert [(note['kind'], note['loss']) for note in recorder.notes(path)] == [('link', 0.25)]
+
+# a time range is read from the index entry before its start, the records before that entry are never looked at
+def testTimeSlice(tmp_path):
+    path = str(tmp_path / 'telemetry.bin')
+    log = recorder.Recorder(path, every = 4)
+    log.clock.now = itertools.count(1000).__next__
+    for i in range(40):
+        log.record(recorder.RX, 102, str(i) + ' 0 ACK')
+    log.close()
+    assert [r.seq for r in recorder.read(path, 1010, 1020)] == list(range(10, 20))
+    assert [r.seq for r in recorder.read(path, 1035)] == list(range(35, 40))
+    assert [r.seq for r in recorder.read(path, end = 1003)] == [0, 1, 2]
+    with open(path, 'r+b') as file: # a scan from the first record would stop at once
+        file.seek(recorder.HEADER.size)
+        file.write(struct.pack('<q', 2 ** 62))
+    assert [r.seq for r in recorder.read(path, 1010, 1020)] == list(range(10, 20))
+    assert list(recorder.read(path, end = 1020)) == []
@@ -0,0 +1,81 @@
+import time
+import itertools
+from core import recorder, replay, simulator
+from core.station import Station
+
+# a recording of rover frames 200 ms apart with the station's own frames between them
+def recording(path):
+    log = recorder.Recorder(path)
+    log.clock.now = itertools.count(0, 100000000).__next__
+    for i in range(4):
+        log.record(recorder.RX, 102, str(i) + ' ' + str(i) + ' ACK', -40 - i, 9)
+        log.record(recorder.TX, 102, str(i) + ' ' + str(i + 1) + ' ACK')
+    log.close()
+
+# read from the port until it has nothing more for a second
+def readAll(port):
+    data = b''
+    while True:
+        chunk = port.read(1024)
+        if not chunk:
+            return data
+        data += chunk
+
+# only the received frames come back, as +RCV= lines within the time range, and every AT command written gets +OK
+def testPortPlaysBack(tmp_path):
+    path = str(tmp_path / 'telemetry.bin')
+    recording(path)
+    port = replay.ReplayPort(path, 0, timeout = 1)
+    assert readAll(port) == b'+RCV=102,7,0 0 ACK,-40,9\r\n+RCV=102,7,1 1 ACK,-41,9\r\n+RCV=102,7,2 2 ACK,-42,9\r\n' + \
+        b'+RCV=102,7,3 3 ACK,-43,9\r\n'
+    port.write(b'AT\r\nAT+SEND=102,7,4 4 ACK\r\n')
+    assert readAll(port) == b'+OK\r\n+OK\r\n'
+    port.close()
+    port = replay.ReplayPort(path, 0, start = 200000000, end = 600000000, timeout = 1)
+    assert readAll(port) == b'+RCV=102,7,1 1 ACK,-41,9\r\n+RCV=102,7,2 2 ACK,-42,9\r\n'
+    port.close()
+
+# at twice real time the frames come 100 ms apart and closing the port stops the playback
+def testPacedPlayback(tmp_path):
+    path = str(tmp_path / 'telemetry.bin')
+    recording(path)
+    port = replay.ReplayPort(path, 2, timeout = 1)
+    start = time.monotonic()
+    assert port.read(26) == b'+RCV=102,7,0 0 ACK,-40,9\r\n'
+    assert port.read(26) == b'+RCV=102,7,1 1 ACK,-41,9\r\n'
+    assert time.monotonic() - start >= 0.09
+    port.close()
+    fed = port.fed
+    time.sleep(0.3)
+    assert port.fed == fed < 4
+
+# a session recorded against the simulator replays through the state machine to the same handshake, logged apart
+def testStationReplaysSession(tmp_path):
+    live = Station(str(tmp_path / 'telemetry.bin'))
+    sim = simulator.Simulator(airtime = 0.05, delay = 0.01, seed = 1)
+    live.openSerial(sim.start(), False)
+    try:
+        end = time.monotonic() + 10
+        while not (live.session(102) and live.session(102).connectionState == 'ESTABLISHED'):
+            assert time.monotonic() < end
+            time.sleep(0.01)
+        live.createTx('28.6 -81.2', 1)
+        time.sleep(0.5)
+    finally:
+        live.shutdown()
+        sim.stop()
+    received = [r for r in recorder.read(live.logPath) if r.direction == recorder.RX]
+    replayed = Station(str(tmp_path / 'replay' / 'telemetry.bin'))
+    try:
+        assert replayed.openReplay(live.logPath, 0).result(5)
+        end = time.monotonic() + 10
+        while replayed.rxCount < len(received):
+            assert time.monotonic() < end
+            time.sleep(0.01)
+        assert replayed.replayTotal == len(received)
+        assert replayed.session(102).connectionState == 'ESTABLISHED'
+    finally:
+        replayed.shutdown()
+    assert [r.payload for r in recorder.read(str(tmp_path / 'replay' / 'replay.bin')) if r.direction == recorder.RX] == \
+        [r.payload for r in received]
+    assert list(recorder.read(str(tmp_path / 'replay' / 'telemetry.bin'))) == []
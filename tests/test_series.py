@@ -0,0 +1,57 @@
+import threading
+import numpy
+from core import series
+
+# past capacity the oldest samples are overwritten and the rest come back oldest first, one at a time or in bulk
+def testRingWraparound():
+    ring = series.Ring(5)
+    for i in range(3):
+        ring.append(i, i * 10)
+    t, v = ring.arrays()
+    assert list(t) == [0, 1, 2] and list(v) == [0, 10, 20]
+    for i in range(3, 8):
+        ring.append(i, i * 10)
+    t, v = ring.arrays()
+    assert list(t) == [3, 4, 5, 6, 7] and list(v) == [30, 40, 50, 60, 70]
+    assert (ring.count, ring.total, ring.head) == (5, 8, 3)
+    assert list(ring.arrays(5.5)[0]) == [6, 7]
+    ring.extend([8, 9, 10], [80, 90, 100]) # across the end of the arrays
+    assert list(ring.arrays()[0]) == [6, 7, 8, 9, 10]
+    ring.extend(numpy.arange(11, 24), numpy.arange(110, 240, 10)) # more than fits
+    t, v = ring.arrays()
+    assert list(t) == [19, 20, 21, 22, 23] and list(v) == [190, 200, 210, 220, 230]
+    assert ring.total == 24
+
+# a copy is returned, later samples do not change it
+def testRingArraysAreCopies():
+    ring = series.Ring(3)
+    for i in range(4):
+        ring.append(i, i)
+    t, v = ring.arrays()
+    ring.append(4, 4)
+    assert list(t) == [1, 2, 3]
+
+# downsampling keeps the lowest and highest sample of every bucket
+def testDownsampleKeepsSpikes():
+    t = numpy.arange(1000.0)
+    v = numpy.zeros(1000, numpy.float32)
+    v[501] = 50
+    v[502] = -50
+    ts, vs = series.downsample(t, v, 10)
+    assert len(ts) == 20 and vs.max() == 50 and vs.min() == -50
+    assert len(series.downsample(t[:15], v[:15], 10)[0]) == 15 # short enough already
+
+# state names get indexes in the order first seen, from any thread, and the ticks name them
+def testLabels():
+    store = series.Store()
+    threads = [threading.Thread(target = lambda: [store.label(str(i % 7)) for i in range(1000)]) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(name for i, name in store.ticks()) == [str(i) for i in range(7)]
+    assert [store.label(name) for i, name in store.ticks()] == list(range(7))
+    store.append(102, 'State', 1.0, store.label('DRIVING'))
+    assert list(store.window(102, 'State')[1]) == [7]
+    store.clear()
+    assert store.ticks() == [] and store.label('IDLE') == 0
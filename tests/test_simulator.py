@@ -0,0 +1,58 @@
+import time
+import pytest
+from core import simulator
+
+# simulated modem and rover with 50 ms frames, stopped after the station
+@pytest.fixture
+def sim():
+    sim = simulator.Simulator(airtime = 0.05, delay = 0.01, seed = 1)
+    yield sim
+    if sim.running: sim.stop()
+
+# wait up to timeout seconds for done() to hold
+def waitFor(done, timeout = 30):
+    end = time.monotonic() + timeout
+    while not done():
+        assert time.monotonic() < end, 'timed out'
+        time.sleep(0.01)
+
+# connect the station to the simulator's pty and wait for the handshake with the rover
+def connect(sim, station):
+    assert station.openSerial(sim.start(), False).result(5)
+    waitFor(lambda: station.session(102) and station.session(102).connectionState == 'ESTABLISHED')
+    return station.session(102)
+
+# queue ten MAN1 commands and wait for the rover to have each, a frame sent again may deliver one twice
+def drive(sim, station):
+    goals = ['MAN1 ' + str(i) + ' 0 0 False False False False False' for i in range(10)]
+    for goal in goals:
+        station.createTx(goal[5:], 2)
+    waitFor(lambda: len(set(sim.rover.commands)) == len(goals))
+    assert list(dict.fromkeys(sim.rover.commands)) == goals
+
+# the station opens a session with the rover over the pty and a queued blind drive reaches it
+def testHandshakeAndCommand(sim, station):
+    connect(sim, station)
+    assert station.createTx('28.6 -81.2', 1)
+    waitFor(lambda: 'BD 28.6 -81.2' in sim.rover.commands)
+
+# over a link that loses and reorders frames the station times out, sends again and every command arrives in order
+def testLossyLink(sim, station):
+    sim.loss = 0.1
+    sim.reorder = 0.2
+    session = connect(sim, station)
+    drive(sim, station)
+    assert session.timeouts > 0
+
+# a reply held back past the RTO gets a second one after the frame is sent again, stop-and-wait against this rover never
+# has a real gap so neither reply may be taken for one and set off another round of resends
+def testLateReplyIsNotAGap(sim, station):
+    sim.reorder = 0.05
+    errors = []
+    station.listen(lambda event, *args: errors.append(args[1]) if event == 'status' and 'Sequence Error' in args[1] else None)
+    session = connect(sim, station)
+    drive(sim, station)
+    waitFor(lambda: session.timeouts > 0)
+    sent = sim.stats['sent']
+    waitFor(lambda: sim.stats['sent'] > sent + 20)
+    assert errors == []
@@ -0,0 +1,80 @@
+import pytest
+from core.link import LoraMessage
+from core import geofence
+
+# malformed seq, ack, options and telemetry are dropped without raising, and a later good frame still goes through
+def testMalformedFramesAreDropped(station, session):
+    for payload in ['x 1 ACK', '1 y ACK', '0 1 SYN +Wz', '0 1 SYN +Cq', '1 1 ACK +S1,a', '1 1 ACK DRIVING 1 2 3 lat long alt',
+            '1 1 ACK DRIVING 1 2']:
+        station.dispatch(LoraMessage(102, len(payload), payload, -40, 9))
+        station.dispatch(LoraMessage(103, len(payload), payload, -40, 9))
+    assert 103 not in station.sessions
+    session.ackNum = 5
+    station.dispatch(LoraMessage(102, 0, '5 1 ACK DRIVING 1 2 0 28.6 -81.2 12', -40, 9))
+    assert session.coordinate == [28.6, -81.2]
+
+# the rover's second reply to a frame sent again too early is dropped, only a gap in its seqs resends what is in flight
+def testDuplicateAckIsNotResent(station, session):
+    resent = []
+    station.resend = lambda session, frame, reason: resent.append(reason)
+    session.ackNum = 5
+    station.createTx('28.6 -81.2', 1, 102)
+    station.cmdTx(session)
+    station.dispatch(LoraMessage(102, 0, '5 1 ACK', -40, 9))
+    assert session.ackNum == 6 and len(session.inflight) == 1
+    station.dispatch(LoraMessage(102, 0, '5 1 ACK', -40, 9))
+    assert resent == [] and session.ackNum == 6
+    station.dispatch(LoraMessage(102, 0, '7 1 ACK', -40, 9))
+    assert resent == ['Sequence Error']
+
+# a sliding window reply acknowledges up to its cumulative ack and the seqs in +S, resends a frame a later one overtook,
+# and a reordered older reply does not move the ack for the rover's seqs back
+def testWindowAck(station, session):
+    resent = []
+    station.resend = lambda session, frame, reason: resent.append((frame.command, reason))
+    session.window = 4
+    session.ackNum = 10
+    for goal in ['1', '2', '3']:
+        station.createTx(goal + ' 0 0 False False False False False', 2, 102)
+        station.cmdTx(session)
+    assert sorted(session.inflight) == [0, 1, 2]
+    station.dispatch(LoraMessage(102, 0, '10 1 ACK +S2', -40, 9))
+    assert sorted(session.inflight) == [1]
+    assert resent == [('CMD MAN1 2 0 0 False False False False False', 'Selective Ack')]
+    assert session.ackNum == 11
+    station.dispatch(LoraMessage(102, 0, '9 1 ACK', -40, 9))
+    assert session.ackNum == 11
+    station.createTx('4 0 0 False False False False False', 2, 102)
+    station.cmdTx(session)
+    assert session.lastMsg.split(',', 2)[2].split(' ')[:2] == ['3', '11']
+
+# a rover given up after its retries has nothing left to send
+def testLostRoverIsPurged(station, session):
+    station.settings['retries'] = '0'
+    station.createTx('28.6 -81.2', 1, 102)
+    station.createTx('1 0 0 0', 3, 102)
+    station.cmdTx(session)
+    for frame in session.inflight.values():
+        frame.deadline = 0
+    station.expire()
+    assert 102 not in station.sessions
+    assert not station.ready and not session.outbox and session.commandBuf.empty()
+    sent = []
+    station.sendCommand = sent.append
+    station.transmit()
+    assert sent == []
+
+# a destination inside a keep-out zone is refused and not queued, one outside it is
+def testRefusedDestinationIsNotQueued(station, session):
+    station.geofence = geofence.Geofence(geofence.fences({'type': 'Polygon',
+        'coordinates': [[[-81.3, 28.5], [-81.1, 28.5], [-81.1, 28.7], [-81.3, 28.7]]]}))
+    assert station.createTx('28.6 -81.2', 1, 102) is False
+    assert session.commandBuf.empty()
+    assert station.createTx('28.8 -81.2', 1, 102) is True
+    assert session.commandBuf.qsize() == 1
+
+# an unknown command option raises instead of queueing nothing or a command from an unbound message
+def testUnknownOptionRaises(station, session):
+    with pytest.raises(ValueError):
+        station.createTx('x', 4, 102)
+    assert session.commandBuf.empty()
@@ -0,0 +1,79 @@
+import os
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+import tiles
+
+# stand-in upstream tile server on a local port, a tile is its own z/x/y as PNG bytes and zoom 15 is missing
+@pytest.fixture
+def upstream():
+    requested = []
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requested.append(self.path)
+            if self.path.startswith('/15/'):
+                self.send_error(404)
+                return
+            data = b'\x89PNG' + self.path.encode('Ascii')
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        def log_message(self, format, *args):
+            pass
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    server.requested = requested
+    server.template = 'http://127.0.0.1:' + str(server.server_address[1]) + '/{z}/{x}/{y}'
+    yield server
+    server.shutdown()
+    server.server_close()
+
+# a miss is fetched upstream once and then served from the cache, also through the local endpoint
+def testCacheHitAndMiss(tmp_path, upstream):
+    cache = tiles.TileCache(str(tmp_path))
+    server = tiles.TileServer(cache, {'test': upstream.template})
+    assert cache.get('test', 12, 1, 2) is None
+    assert server.tile('test', 12, 1, 2) == b'\x89PNG/12/1/2'
+    assert server.tile('test', 12, 1, 2) == b'\x89PNG/12/1/2'
+    assert upstream.requested == ['/12/1/2']
+    server.start()
+    try:
+        with urllib.request.urlopen(server.url('test').format(z = 12, x = 1, y = 2)) as response:
+            assert response.read() == b'\x89PNG/12/1/2'
+            assert response.headers['Content-Type'] == 'image/png'
+    finally:
+        server.stop()
+    assert upstream.requested == ['/12/1/2']
+    assert server.tile('test', 15, 1, 2) is None # missing upstream
+    assert not cache.has('test', 15, 1, 2)
+
+# past maxBytes the least recently used tiles go, from the index and the disk, and a new cache finds the rest
+def testEviction(tmp_path):
+    cache = tiles.TileCache(str(tmp_path), maxBytes = 300)
+    for x in range(3):
+        cache.put('test', 12, x, 0, bytes(100))
+    assert cache.get('test', 12, 0, 0) == bytes(100) # 0 is now newer than 1
+    cache.put('test', 12, 3, 0, bytes(100))
+    assert not cache.has('test', 12, 1, 0) and not os.path.exists(cache.path('test', 12, 1, 0))
+    assert all(cache.has('test', 12, x, 0) for x in [0, 2, 3])
+    assert cache.size == 300
+    reopened = tiles.TileCache(str(tmp_path), maxBytes = 300)
+    assert sorted(reopened.entries) == sorted(cache.entries) and reopened.size == 300
+
+# prefetch counts tiles already cached, fetched and failed, and a second run fetches nothing
+def testPrefetch(tmp_path, upstream):
+    server = tiles.TileServer(tiles.TileCache(str(tmp_path)), {'test': upstream.template})
+    box = tiles.boundingBox(28.6024, -81.2001, 200)
+    def count(z):
+        x0, y0 = tiles.tileXY(box[2], box[1], z)
+        x1, y1 = tiles.tileXY(box[0], box[3], z)
+        return (x1 - x0 + 1) * (y1 - y0 + 1)
+    fetched, missing = count(13) + count(14), count(15)
+    progress = []
+    assert server.prefetch('test', *box, 13, 15, lambda done, total: progress.append((done, total))) == (0, fetched, missing)
+    assert sorted(progress) == [(i, fetched + missing) for i in range(1, fetched + missing + 1)]
+    del upstream.requested[:]
+    assert server.prefetch('test', *box, 13, 15) == (fetched, 0, missing)
+    assert len(upstream.requested) == missing
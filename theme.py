@@ -0,0 +1,43 @@
+from PyQt5 import QtCore, QtGui
+import qt_material
+import os
+import json
+import hashlib
+
+# qt_material renders its stylesheet template and rewrites its icon files on every start; the result only depends on
+# the theme file, the extra values and the qt_material install, so it is saved to a cache file and reused from there
+
+# cache key of a theme
+def key(theme, extra):
+    with open(theme, 'rb') as file:
+        data = file.read()
+    install = qt_material.__file__ + str(os.path.getmtime(qt_material.__file__))
+    return hashlib.sha1(data + repr(sorted(extra.items())).encode('utf-8') + install.encode('utf-8')).hexdigest()
+
+# style app with a qt_material theme, returns True if it came from the cache
+def apply(app, theme, extra, cache = 'cache/theme.json'):
+    k = key(theme, extra)
+    try:
+        with open(cache) as file:
+            cached = json.load(file)
+    except (OSError, ValueError):
+        cached = {}
+    if cached.get('key') == k and all(os.path.isdir(path) for paths in cached['paths'].values() for path in paths):
+        qt_material.add_fonts()
+        qt_material.get_theme(theme) # sets the QTMATERIAL_* environment variables custom.css is formatted with
+        for prefix, paths in cached['paths'].items():
+            for path in paths:
+                QtCore.QDir.addSearchPath(prefix, path) # icons the stylesheet refers to, generated by the first run
+        palette = QtGui.QGuiApplication.palette()
+        palette.setColor(QtGui.QPalette.PlaceholderText, QtGui.QColor(cached['placeholder']))
+        QtGui.QGuiApplication.setPalette(palette)
+        app.setStyleSheet(cached['stylesheet'])
+        return True
+    qt_material.apply_stylesheet(app, theme = theme, extra = extra)
+    cached = {'key': k, 'stylesheet': app.styleSheet(),
+        'paths': {prefix: QtCore.QDir.searchPaths(prefix) for prefix in ['icon', 'qt_material']},
+        'placeholder': QtGui.QGuiApplication.palette().color(QtGui.QPalette.PlaceholderText).name(QtGui.QColor.HexArgb)}
+    if os.path.dirname(cache): os.makedirs(os.path.dirname(cache), exist_ok = True)
+    with open(cache, 'w') as file:
+        json.dump(cached, file)
+    return False
@@ -0,0 +1,172 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+from math import cos, log, tan, pi
+import os
+import threading
+import collections
+import urllib.request
+
+# upstream tile servers, {s} is a subdomain and {r} the retina suffix
+LAYERS = {
+    'dark': 'https://{s}.basemaps.cartocdn.com/dark_all/{z}/{x}/{y}{r}.png',
+    'world': 'https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}',
+}
+
+# tile x/y containing a coordinate at a zoom level
+def tileXY(lat, long, zoom):
+    n = 2 ** zoom
+    lat = max(-85.0511, min(85.0511, lat))
+    x = int((long + 180) / 360 * n)
+    y = int((1 - log(tan(lat * pi / 180) + 1 / cos(lat * pi / 180)) / pi) / 2 * n)
+    return min(n - 1, max(0, x)), min(n - 1, max(0, y))
+
+# south, west, north, east of a square around a coordinate
+def boundingBox(lat, long, radius):
+    dLat = radius / 111320.0
+    dLong = radius / (111320.0 * max(0.01, cos(lat * pi / 180)))
+    return lat - dLat, long - dLong, lat + dLat, long + dLong
+
+# disk tile store, least recently used tiles are removed once it grows past maxBytes
+class TileCache:
+    def __init__(self, directory, maxBytes = 500 * 2 ** 20):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict() # path -> size, least recently used first
+        self.size = 0
+        files = []
+        for root, dirs, names in os.walk(directory):
+            for name in names:
+                path = os.path.join(root, name)
+                st = os.stat(path)
+                files.append((st.st_mtime, path, st.st_size))
+        for mtime, path, size in sorted(files): # mtime carries recency across restarts
+            self.entries[path] = size
+            self.size += size
+    # file for a tile
+    def path(self, layer, z, x, y):
+        return os.path.join(self.directory, layer, str(z), str(x), str(y))
+    # check for a tile without touching its recency
+    def has(self, layer, z, x, y):
+        return self.path(layer, z, x, y) in self.entries
+    # cached tile or None
+    def get(self, layer, z, x, y):
+        path = self.path(layer, z, x, y)
+        with self.lock:
+            if path not in self.entries:
+                return None
+            self.entries.move_to_end(path)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+            os.utime(path)
+        except OSError:
+            with self.lock:
+                self.size -= self.entries.pop(path, 0)
+            return None
+        return data
+    # store a tile and evict old ones
+    def put(self, layer, z, x, y, data):
+        path = self.path(layer, z, x, y)
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        temp = path + '.' + str(threading.get_ident())
+        with open(temp, 'wb') as file:
+            file.write(data)
+        os.replace(temp, path)
+        evicted = []
+        with self.lock:
+            self.size += len(data) - self.entries.pop(path, 0)
+            self.entries[path] = len(data)
+            while self.size > self.maxBytes and len(self.entries) > 1:
+                old, size = self.entries.popitem(last = False)
+                self.size -= size
+                evicted.append(old)
+        for old in evicted:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+# local http endpoint serving tiles from the cache, fetching misses upstream when online
+class TileServer:
+    def __init__(self, cache, layers = LAYERS, host = '127.0.0.1', port = 0, timeout = 10):
+        self.cache = cache
+        self.layers = dict(layers)
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.server = None
+        self.thread = threading.Thread()
+    # leaflet url template for a layer
+    def url(self, layer):
+        return 'http://' + self.host + ':' + str(self.port) + '/' + layer + '/{z}/{x}/{y}'
+    # tile from the cache or upstream, None when neither has it
+    def tile(self, layer, z, x, y):
+        data = self.cache.get(layer, z, x, y)
+        if data is not None:
+            return data
+        url = self.layers[layer].format(s = 'abc'[(x + y) % 3], z = z, x = x, y = y, r = '')
+        try:
+            request = urllib.request.Request(url, headers = {'User-Agent': 'sd_ground_station'})
+            with urllib.request.urlopen(request, timeout = self.timeout) as response:
+                data = response.read()
+        except (OSError, ValueError):
+            return None # offline
+        self.cache.put(layer, z, x, y, data)
+        return data
+    # serve in a background thread
+    def start(self):
+        tiles = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parts = self.path.split('?')[0].strip('/').split('/')
+                data = None
+                if len(parts) == 4 and parts[0] in tiles.layers:
+                    try:
+                        z, x, y = int(parts[1]), int(parts[2]), int(parts[3].split('.')[0])
+                        data = tiles.tile(parts[0], z, x, y)
+                    except ValueError:
+                        pass
+                if data is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'image/png' if data[:4] == b'\x89PNG' else 'image/jpeg')
+                self.send_header('Content-Length', str(len(data)))
+                self.send_header('Access-Control-Allow-Origin', '*')
+                self.end_headers()
+                self.wfile.write(data)
+            def log_message(self, format, *args):
+                pass
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target = self.server.serve_forever, daemon = True)
+        self.thread.start()
+    # stop serving
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+    # download every tile in a bounding box over a zoom range, returns (cached, fetched, failed)
+    def prefetch(self, layer, south, west, north, east, minZoom, maxZoom, progress = None, workers = 4):
+        jobs = []
+        for z in range(minZoom, maxZoom + 1):
+            x0, y0 = tileXY(north, west, z)
+            x1, y1 = tileXY(south, east, z)
+            jobs += [(z, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+        counts = [0, 0, 0]
+        lock = threading.Lock()
+        def fetch(job):
+            if self.cache.has(layer, *job):
+                i = 0
+            else:
+                i = 1 if self.tile(layer, *job) is not None else 2
+            with lock:
+                counts[i] += 1
+                done = sum(counts)
+            if progress: progress(done, len(jobs))
+        with ThreadPoolExecutor(workers) as pool:
+            list(pool.map(fetch, jobs))
+        return tuple(counts)